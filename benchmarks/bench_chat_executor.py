@@ -0,0 +1,80 @@
+"""Show that ChatGPT calls no longer hold Home Assistant's executor threads.
+
+Runs concurrent async_create_dalle_prompt calls against the local fake API
+while a probe keeps submitting no-op executor jobs and measures how long each
+waits for a free thread. The legacy mode wraps a blocking HTTP call in the
+executor, as the openai.ChatCompletion based code did.
+
+    python benchmarks/bench_chat_executor.py [--concurrency 16] [--latency 1.0]
+"""
+import argparse
+import asyncio
+import concurrent.futures
+import json
+import tempfile
+import time
+
+import requests
+
+from harness import async_create_hass, async_close_hass, entry_data, summarize
+from fake_openai import FakeOpenAI
+
+from weathercanvasai.weather_processing import async_create_dalle_prompt
+
+EXECUTOR_THREADS = 4
+
+
+async def _probe(hass, stop, waits):
+    """Measure how long a trivial executor job waits for a thread."""
+    while not stop.is_set():
+        start = time.perf_counter()
+        await hass.async_add_executor_job(lambda: None)
+        waits.append(time.perf_counter() - start)
+        await asyncio.sleep(0.02)
+
+
+async def _legacy_prompt(hass, chatgpt_in, config_data):
+    def make_api_call():
+        return requests.post(
+            config_data["http_client"].url("/chat/completions"),
+            json={"model": config_data["gpt_model_name"], "messages": [{"role": "user", "content": chatgpt_in}]},
+            timeout=60,
+        ).json()
+
+    return await hass.async_add_executor_job(make_api_call)
+
+
+async def run(mode, concurrency, latency):
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(concurrent.futures.ThreadPoolExecutor(max_workers=EXECUTOR_THREADS))
+    server = await FakeOpenAI(latency=latency).start()
+    # All calls in flight at once, like the legacy mode
+    hass = await async_create_hass(tempfile.mkdtemp(), server.api_base, max_concurrency=concurrency)
+    config_data = entry_data(hass)
+    create_prompt = async_create_dalle_prompt if mode == "async" else _legacy_prompt
+
+    stop = asyncio.Event()
+    waits = []
+    probe = asyncio.create_task(_probe(hass, stop, waits))
+    start = time.perf_counter()
+    await asyncio.gather(*(create_prompt(hass, "In Ghent, it is noon in Autumn.", config_data) for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await probe
+
+    await async_close_hass(hass)
+    await server.stop()
+    return {"mode": mode, "calls": concurrency, "wall_s": round(elapsed, 2), "executor_wait": summarize(waits)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--latency", type=float, default=1.0, help="seconds the fake ChatGPT takes to answer")
+    args = parser.parse_args()
+    for mode in ("async", "executor"):
+        print(json.dumps(asyncio.run(run(mode, args.concurrency, args.latency))))
+
+
+if __name__ == "__main__":
+    main()
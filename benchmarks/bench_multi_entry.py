@@ -0,0 +1,87 @@
+"""Scene generations of several entries at once: one shared client and scheduler vs one per entry.
+
+Every entry runs `--scenes` generate_scene pipelines at the same time. With
+one client and scheduler per entry, as with separate single location
+installs, connections and calls in flight grow with the number of entries;
+shared, they stay within the pool and the global concurrency limit, and the
+entries' generations interleave.
+
+    python benchmarks/bench_multi_entry.py [--entries 10] [--scenes 2] [--latency 0.2]
+"""
+import argparse
+import asyncio
+import json
+import tempfile
+import time
+
+from fake_openai import FakeOpenAI
+from harness import async_create_hass, async_add_entry, async_close_hass, summarize, BENCHMARK_ENTRY_ID, DOMAIN
+
+from weathercanvasai.http_client import WeathercanvasaiHttpClient
+from weathercanvasai.scheduler import RequestScheduler
+from weathercanvasai.pipeline import async_generate_scene
+
+
+async def run(mode, entries, scenes, latency):
+    fake = await FakeOpenAI(latency=latency, cdn_latency=latency / 2, image_size=256 * 1024).start()
+    hass = await async_create_hass(tempfile.mkdtemp(), fake.api_base)
+    entry_ids = [BENCHMARK_ENTRY_ID] + [f"entry_{index}" for index in range(1, entries)]
+    for entry_id in entry_ids[1:]:
+        await async_add_entry(hass, entry_id)
+    clients = []
+    if mode == "per entry":
+        for entry_id in entry_ids:
+            http_client = WeathercanvasaiHttpClient(hass, fake.api_base)
+            clients.append(http_client)
+            hass.data[DOMAIN][entry_id]["http_client"] = http_client
+            # As many slots as a single entry gets, per entry
+            hass.data[DOMAIN][entry_id]["request_scheduler"] = RequestScheduler(http_client)
+
+    latencies = {entry_id: [] for entry_id in entry_ids}
+    failed = 0
+
+    async def generate(entry_id):
+        nonlocal failed
+        start = time.monotonic()
+        result = await async_generate_scene(hass, hass.data[DOMAIN][entry_id], refresh=True)
+        if result["image_url"] is None:
+            failed += 1
+        latencies[entry_id].append(time.monotonic() - start)
+
+    start = time.monotonic()
+    await asyncio.gather(*(generate(entry_id) for entry_id in entry_ids for _ in range(scenes)))
+    elapsed = time.monotonic() - start
+    await hass.async_block_till_done()
+
+    all_latencies = [seconds for samples in latencies.values() for seconds in samples]
+    result = {
+        "mode": mode,
+        "entries": entries,
+        "scenes": entries * scenes,
+        "failed": failed,
+        "elapsed_s": round(elapsed, 2),
+        "connections": len(fake.clients),
+        "peak_api_calls_in_flight": fake.peak_in_flight,
+        "scene_latency": summarize(all_latencies),
+        # Spread of the entries' slowest scene, low when the entries interleave
+        "entry_max_latency": summarize([max(samples) for samples in latencies.values()]),
+    }
+    for http_client in clients:
+        await http_client.async_close()
+    await async_close_hass(hass)
+    await fake.stop()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entries", type=int, default=10)
+    parser.add_argument("--scenes", type=int, default=2, help="concurrent scenes per entry")
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds each fake API call takes")
+    args = parser.parse_args()
+    for mode in ("per entry", "shared"):
+        print(json.dumps(asyncio.run(run(mode, args.entries, args.scenes, args.latency))))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""Streamed against non-streamed chat completions in the generate_scene pipeline.
+
+Runs `--count` scenes one after the other against the fake API, whose ChatGPT
+answers after `--latency` and then takes `--token-interval` per word, once
+with the stream_prompts option off and once with it on. Reports:
+
+- first_update: from the call until the prompts sensor is first updated,
+  with the whole prompt or its first words
+- prompt / ttft: the prompt stage, and its time to the first token
+- sensor_updates: prompt updates per scene, partial ones included, as the
+  stream subscribers get them; the sensor writes its state at most twice
+- handoff: from the prompt until the image request, the pipeline's own overhead
+
+    python benchmarks/bench_prompt_stream.py [--count 10] [--latency 0.3] [--token-interval 0.05]
+"""
+import argparse
+import asyncio
+import json
+import tempfile
+import time
+
+from homeassistant.helpers.dispatcher import async_dispatcher_connect
+
+from harness import async_create_hass, async_close_hass, entry_data, summarize, BENCHMARK_ENTRY_ID
+from fake_openai import FakeOpenAI
+
+from weathercanvasai.const import SIGNAL_PROMPTS_UPDATED, SIGNAL_PROMPTS_STREAMING
+from weathercanvasai.metrics import STAGE_PROMPT_TTFT
+from weathercanvasai.pipeline import async_generate_scene
+
+
+async def run(stream, count, latency, token_interval):
+    server = await FakeOpenAI(latency=latency, cdn_latency=0.01, image_size=50_000, token_interval=token_interval).start()
+    hass = await async_create_hass(tempfile.mkdtemp(), server.api_base, stream_prompts=stream)
+    config_data = entry_data(hass)
+
+    updates = []
+    for signal in (SIGNAL_PROMPTS_UPDATED, SIGNAL_PROMPTS_STREAMING):
+        async_dispatcher_connect(hass, signal.format(BENCHMARK_ENTRY_ID), lambda data: updates.append(time.perf_counter()))
+
+    first_update, prompt, handoff, sensor_updates = [], [], [], []
+    for _ in range(count):
+        updates.clear()
+        start = time.perf_counter()
+        result = await async_generate_scene(hass, config_data, model="dall-e-2", size="256x256", refresh=True)
+        timings = result["timings"]
+        first_update.append(updates[0] - start)
+        prompt.append(timings["prompt_s"])
+        handoff.append(max(0.0, timings["total_s"] - timings["scene_s"] - timings["prompt_s"] - timings["image_s"]))
+        sensor_updates.append(len(updates))
+    await hass.async_block_till_done()
+
+    ttft = config_data["metrics"].histogram(STAGE_PROMPT_TTFT)
+    report = {
+        "stream_prompts": stream,
+        "scenes": count,
+        "first_update": summarize(first_update),
+        "prompt": summarize(prompt),
+        "ttft": ttft.as_dict() if ttft else None,
+        "sensor_updates_per_scene": round(sum(sensor_updates) / count, 1),
+        "handoff": summarize(handoff),
+        "tokens": config_data["metrics"].tokens.as_dict(),
+    }
+    await async_close_hass(hass)
+    await server.stop()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.3, help="seconds until the fake ChatGPT's first word")
+    parser.add_argument("--token-interval", type=float, default=0.05, help="seconds per word after that")
+    args = parser.parse_args()
+    for stream in (False, True):
+        print(json.dumps(asyncio.run(run(stream, args.count, args.latency, args.token_interval))))
+
+
+if __name__ == "__main__":
+    main()
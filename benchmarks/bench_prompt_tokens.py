@@ -0,0 +1,131 @@
+"""Tokens of the ChatGPT call: the compiled request against the one sent before.
+
+- request: the input tokens (estimated by the prompt compiler and counted by
+  the fake API, about four characters per token) and max_tokens of a sweep of
+  scenes, with the verbose scene sentence and fixed max_tokens=256 of before
+  and with the compact scene and the compiled instruction.
+- calls: `--count` async_get_dalle_prompt calls against the fake API, and the
+  token usage the integration records for them.
+- compile: the cost of building chatgpt_in and the messages for one call.
+
+    python benchmarks/bench_prompt_tokens.py [--count 20] [--latency 0.2]
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import tempfile
+import time
+
+from harness import async_create_hass, async_close_hass, entry_data
+from fake_openai import FakeOpenAI
+
+from weathercanvasai.const import DEFAULT_SYSTEM_INSTRUCTION
+from weathercanvasai.prompt_compiler import PromptCompiler, compact_scene
+from weathercanvasai.weather_processing import async_build_scene, async_get_dalle_prompt
+
+LOCATION = "Ghent, East Flanders, Flanders, Belgium"
+CONDITIONS = ["sunny", "partlycloudy", "cloudy", "rainy", "lightning-rainy", "snowy", "fog", "clear-night"]
+SEGMENTS = ["sunrise", "late morning", "early afternoon", "dusk", "deep night"]
+
+# The scene sentence sent before
+CLOUDINESS = {
+    0: "The sky is completely clear.",
+    10: "A few wisps of clouds dot the sky.",
+    20: "Scattered clouds gently float by.",
+    30: "A patchwork of clouds adorns the sky.",
+    40: "Partly cloudy with blue sky peeking through.",
+    50: "A balanced mix of sun and clouds.",
+    60: "More clouds than sun overhead.",
+    70: "The sky is mostly cloudy.",
+    80: "Thick clouds blanket most of the sky.",
+    90: "The sky is grey and heavily clouded.",
+    100: "Clouds completely cover the sky.",
+}
+
+
+def legacy_scene(location_name, day_segment, season, weather):
+    cloudiness = CLOUDINESS[min(CLOUDINESS, key=lambda k: abs(k - weather["cloud_coverage"]))]
+    return (
+        f"In {location_name}, it is {day_segment} in {season}. "
+        f"It's a {weather['condition']} day with a temperature of {weather['temperature']}°C. {cloudiness}"
+    )
+
+
+def scenes():
+    for index, (condition, segment) in enumerate((c, s) for c in CONDITIONS for s in SEGMENTS):
+        weather = {"condition": condition, "temperature": round(-5 + index * 0.75, 1), "cloud_coverage": (index * 13) % 101}
+        yield LOCATION, segment, "Autumn", weather
+
+
+def api_tokens(messages):
+    """Input tokens as the fake API counts them."""
+    return sum(len(message["content"]) for message in messages) // 4
+
+
+def measure_requests():
+    compiler = PromptCompiler(DEFAULT_SYSTEM_INSTRUCTION)
+    legacy, compiled = [], []
+    for scene in scenes():
+        legacy.append(api_tokens([
+            {"role": "system", "content": DEFAULT_SYSTEM_INSTRUCTION},
+            {"role": "user", "content": legacy_scene(*scene)},
+        ]))
+        compiled.append(api_tokens(compiler.messages(compact_scene(*scene))))
+    chatgpt_in = compact_scene(*next(scenes()))
+    return {
+        "scenes": len(legacy),
+        "example_chatgpt_in": {"before": legacy_scene(*next(scenes())), "after": chatgpt_in},
+        "input_tokens_before": round(statistics.mean(legacy), 1),
+        "input_tokens_after": round(statistics.mean(compiled), 1),
+        "user_message_tokens_before": round(statistics.mean(len(legacy_scene(*scene)) // 4 for scene in scenes()), 1),
+        "user_message_tokens_after": round(statistics.mean(len(compact_scene(*scene)) // 4 for scene in scenes()), 1),
+        "compiler_estimate": compiler.prompt_tokens(chatgpt_in),
+        "max_tokens_before": 256,
+        "max_tokens_after": compiler.max_tokens,
+        "scheduler_reservation_before": (len(DEFAULT_SYSTEM_INSTRUCTION) + len(legacy_scene(*next(scenes())))) // 4 + 256,
+        "scheduler_reservation_after": compiler.prompt_tokens(chatgpt_in) + compiler.max_tokens,
+    }
+
+
+def measure_compile(runs=2000):
+    compiler = PromptCompiler(DEFAULT_SYSTEM_INSTRUCTION)
+    scene = next(scenes())
+    start = time.perf_counter()
+    for _ in range(runs):
+        chatgpt_in = compact_scene(*scene)
+        compiler.messages(chatgpt_in)
+        compiler.prompt_tokens(chatgpt_in)
+    per_call = (time.perf_counter() - start) / runs
+    start = time.perf_counter()
+    for _ in range(runs // 10):
+        PromptCompiler(DEFAULT_SYSTEM_INSTRUCTION)
+    return {"per_call_us": round(per_call * 1e6, 1), "per_options_change_us": round((time.perf_counter() - start) / (runs // 10) * 1e6, 1)}
+
+
+async def measure_calls(count, latency):
+    server = await FakeOpenAI(latency=latency).start()
+    hass = await async_create_hass(tempfile.mkdtemp(), server.api_base)
+    config_data = entry_data(hass)
+    for _ in range(count):
+        scene = await async_build_scene(hass, config_data)
+        await async_get_dalle_prompt(hass, config_data, scene, refresh=True)
+    tokens = config_data["metrics"].tokens.as_dict()
+    max_tokens = {payload["max_tokens"] for payload in server.chat_payloads}
+    await async_close_hass(hass)
+    await server.stop()
+    return {"calls": count, "max_tokens_sent": sorted(max_tokens), "recorded": tokens}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds the fake ChatGPT takes to answer")
+    args = parser.parse_args()
+    print(json.dumps({"request": measure_requests()}, ensure_ascii=False))
+    print(json.dumps({"calls": asyncio.run(measure_calls(args.count, args.latency))}))
+    print(json.dumps({"compile": measure_compile()}))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Burst of prompt calls against a throttling fake API, with and without retries.
+
+Without the scheduler's retries every call over the limit is a failed automation;
+with them the burst completes at the fake account's rate, and the token bucket
+keeps the number of 429 responses low.
+
+    python benchmarks/bench_scheduler.py [--calls 30] [--limit 10] [--window 2]
+"""
+import argparse
+import asyncio
+import json
+import tempfile
+import time
+
+from fake_openai import FakeOpenAI
+from harness import async_create_hass, async_close_hass, entry_data, summarize
+
+from weathercanvasai.scheduler import RequestScheduler, PRIORITY_USER, PRIORITY_BACKGROUND
+from weathercanvasai.weather_processing import async_create_dalle_prompt
+
+
+async def run(mode, calls, limit, window):
+    fake = await FakeOpenAI(latency=0.05, request_limit=limit, limit_window=window).start()
+    hass = await async_create_hass(tempfile.mkdtemp(), fake.api_base)
+    config_data = entry_data(hass)
+    config_data["request_scheduler"] = RequestScheduler(
+        config_data["http_client"], max_attempts=1 if mode == "single attempt" else 8, backoff_max=window
+    )
+    latencies = {PRIORITY_USER: [], PRIORITY_BACKGROUND: []}
+    failed = 0
+
+    async def call(index):
+        nonlocal failed
+        # One in five calls is a user call, the rest background work
+        priority = PRIORITY_USER if index % 5 == 0 else PRIORITY_BACKGROUND
+        start = time.monotonic()
+        result = await async_create_dalle_prompt(hass, f"scene {index}", config_data, priority)
+        if result.startswith("Error"):
+            failed += 1
+        else:
+            latencies[priority].append(time.monotonic() - start)
+
+    start = time.monotonic()
+    await asyncio.gather(*(call(index) for index in range(calls)))
+    elapsed = time.monotonic() - start
+    result = {
+        "mode": mode,
+        "succeeded": calls - failed,
+        "failed": failed,
+        "elapsed_s": round(elapsed, 2),
+        "throttled_responses": fake.requests["throttled"],
+        "user_latency": summarize(latencies[PRIORITY_USER]),
+        "background_latency": summarize(latencies[PRIORITY_BACKGROUND]),
+        "scheduler": config_data["request_scheduler"].as_dict(),
+    }
+    await async_close_hass(hass)
+    await fake.stop()
+    return result
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=30)
+    parser.add_argument("--limit", type=int, default=10, help="requests per window")
+    parser.add_argument("--window", type=float, default=2.0, help="seconds")
+    args = parser.parse_args()
+    for mode in ("single attempt", "scheduled"):
+        print(json.dumps(await run(mode, args.calls, args.limit, args.window), indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
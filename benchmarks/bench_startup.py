@@ -0,0 +1,178 @@
+"""Cold start cost: importing the integration and setting up its config entries.
+
+- import: `import weathercanvasai` in a fresh interpreter, after the Home
+  Assistant modules it builds on (core, http, sensor, camera, ...) are
+  loaded, as they are in a running instance. Reports the median over
+  `--runs` interpreters and the modules the import pulls in besides the
+  integration's own, so a heavy dependency loaded at import time shows up.
+- setup: async_setup_entry of `--entries` config entries on a Home Assistant
+  core with config entries, sensor and camera platforms and the http server,
+  first with no storage files (a new install), then again after unloading
+  them (a restart). With `--images` each entry's directory starts with that
+  many images, which the first setup indexes.
+
+    python benchmarks/bench_startup.py [--runs 5] [--entries 3] [--images 0]
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from harness import summarize, DOMAIN
+
+REPOSITORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Loaded by Home Assistant before any integration is set up
+HOME_ASSISTANT_MODULES = [
+    "homeassistant.core",
+    "homeassistant.config_entries",
+    "homeassistant.helpers.entity",
+    "homeassistant.helpers.event",
+    "homeassistant.helpers.storage",
+    "homeassistant.helpers.network",
+    "homeassistant.helpers.aiohttp_client",
+    "homeassistant.helpers.config_validation",
+    "homeassistant.components.http",
+    "homeassistant.components.sensor",
+    "homeassistant.components.camera",
+    "homeassistant.components.diagnostics",
+]
+
+IMPORT_SCRIPT = """
+import importlib, json, sys, time
+sys.path.insert(0, {custom_components!r})
+for name in {modules!r}:
+    importlib.import_module(name)
+before = set(sys.modules)
+start = time.perf_counter()
+import weathercanvasai
+elapsed = time.perf_counter() - start
+loaded = sorted({{name.split(".")[0] for name in set(sys.modules) - before}} - {{"weathercanvasai"}})
+print(json.dumps({{"seconds": elapsed, "modules": loaded}}))
+"""
+
+
+def measure_import(runs):
+    script = IMPORT_SCRIPT.format(custom_components=os.path.join(REPOSITORY, "custom_components"), modules=HOME_ASSISTANT_MODULES)
+    # A first run writes the bytecode caches, so the timed runs don't compile
+    environment = {name: value for name, value in os.environ.items() if name != "PYTHONDONTWRITEBYTECODE"}
+    subprocess.run([sys.executable, "-c", script], check=True, capture_output=True, env=environment)
+    samples = []
+    modules = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, "-c", script], check=True, capture_output=True, text=True).stdout
+        result = json.loads(output)
+        samples.append(result["seconds"])
+        modules = result["modules"]
+    return {"import_ms": round(statistics.median(samples) * 1000, 1), "runs": runs, "modules_loaded": modules}
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def async_create_core(config_dir):
+    """Home Assistant with config entries and the http server, loading the integration from config_dir."""
+    from homeassistant import bootstrap, config_entries, loader
+    from homeassistant.auth import auth_manager_from_config
+    from homeassistant.core import HomeAssistant
+    from homeassistant.setup import async_setup_component
+
+    os.symlink(os.path.join(REPOSITORY, "custom_components"), os.path.join(config_dir, "custom_components"))
+    hass = HomeAssistant(config_dir)
+    hass.config.skip_pip = True
+    loader.async_setup(hass)
+    hass.config_entries = config_entries.ConfigEntries(hass, {})
+    await bootstrap.async_load_base_functionality(hass)
+    hass.auth = await auth_manager_from_config(hass, [{"type": "homeassistant"}], [])
+    await async_setup_component(hass, "http", {"http": {"server_host": "127.0.0.1", "server_port": _free_port()}})
+    hass.states.async_set("sun.sun", "above_horizon", {
+        "next_rising": "2026-10-19T06:15:00+00:00",
+        "next_setting": "2026-10-18T17:05:00+00:00",
+    })
+    hass.states.async_set("weather.forecast_home", "cloudy", {"temperature": 12.5, "cloud_coverage": 70})
+    await hass.async_start()
+    return hass
+
+
+def _write_images(directory, count):
+    os.makedirs(directory, exist_ok=True)
+    for index in range(count):
+        with open(os.path.join(directory, f"dalle_20260101{index:06d}.png"), "wb") as file:
+            file.write(b"\x89PNG" + os.urandom(1024))
+
+
+async def async_measure_setup(entries, images):
+    from homeassistant import config_entries
+
+    config_dir = tempfile.mkdtemp()
+    hass = await async_create_core(config_dir)
+    data = {
+        "openai_api_key": "sk-benchmark",
+        "googlemaps_api_key": "benchmark",
+        "gpt_model_name": "gpt-3.5-turbo",
+        "max_images_retained": 5,
+        "system_instruction": "",
+        "follow_home": False,
+    }
+    config_entries_added = []
+    for index in range(entries):
+        entry = config_entries.ConfigEntry(
+            version=2, minor_version=1, domain=DOMAIN, title=f"Location {index}",
+            data={**data, "location_name": f"Location {index}"}, source="user", options={},
+        )
+        _write_images(hass.config.path("www", "weathercanvasai", entry.entry_id), images)
+        config_entries_added.append(entry)
+
+    async def setup_all():
+        samples = []
+        for entry in config_entries_added:
+            start = time.perf_counter()
+            if hass.config_entries.async_get_entry(entry.entry_id):
+                await hass.config_entries.async_setup(entry.entry_id)
+            else:
+                await hass.config_entries.async_add(entry)
+            samples.append(time.perf_counter() - start)
+            if entry.state is not config_entries.ConfigEntryState.LOADED:
+                raise RuntimeError(f"Entry {entry.title} didn't load: {entry.state}")
+        return samples
+
+    # The first entry also sets up the component: the image view, shared client, scheduler and services
+    new_install = await setup_all()
+    await hass.async_block_till_done()
+    for entry in reversed(config_entries_added):
+        await hass.config_entries.async_unload(entry.entry_id)
+    restart = await setup_all()
+
+    result = {
+        "entries": entries,
+        "images_per_entry": images,
+        "new_install_first_entry_ms": round(new_install[0] * 1000, 1),
+        "new_install_other_entries": summarize(new_install[1:]),
+        "restart_first_entry_ms": round(restart[0] * 1000, 1),
+        "restart_other_entries": summarize(restart[1:]),
+    }
+    await hass.async_stop(force=True)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="interpreters timing the import")
+    parser.add_argument("--entries", type=int, default=3)
+    parser.add_argument("--images", type=int, default=0, help="images in each entry's directory before the first setup")
+    args = parser.parse_args()
+    print(json.dumps(measure_import(args.runs)))
+    print(json.dumps(asyncio.run(async_measure_setup(args.entries, args.images))))
+
+
+if __name__ == "__main__":
+    main()
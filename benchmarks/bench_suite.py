@@ -0,0 +1,304 @@
+"""Offline benchmark suite: the integration's hot paths against the local fake OpenAI server.
+
+Each scenario runs `--count` operations, `--concurrency` at a time, on a bare
+Home Assistant core, and reports latency percentiles, throughput, the longest
+event loop block and the peak RSS of the process:
+
+- prompt:      async_create_dalle_prompt
+- image_url:   post_request_and_save_image, image downloaded from the fake CDN
+- image_b64:   post_request_and_save_image, image inline as b64_json
+- clean_up:    clean_up_images removing the oldest of `--count` images beyond 5
+- camera:      the camera entity reading a new image, then a 320px thumbnail
+- scene:       the whole generate_scene pipeline, as concurrent service calls
+
+    python benchmarks/bench_suite.py [--count 20] [--concurrency 4] [--latency 0.2]
+        [--image-kb 1500] [--error-rate 0.0] [--only prompt,scene]
+        [--save report.json] [--baseline report.json --tolerance 0.25]
+
+With --baseline the p95 latencies and loop blocks are compared to a saved report
+and the exit status is 1 when any got worse by more than the tolerance.
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+
+from fake_openai import FakeOpenAI
+from harness import async_create_hass, async_close_hass, entry_data, summarize, BENCHMARK_ENTRY_ID, DOMAIN
+
+from weathercanvasai.camera import weathercanvasaiCamera
+from weathercanvasai.pipeline import async_generate_scene
+from weathercanvasai.weather_processing import (
+    async_create_dalle_prompt,
+    post_request_and_save_image,
+    clean_up_images,
+)
+
+LOOP_PROBE_INTERVAL = 0.005  # seconds
+
+
+class LoopMonitor:
+    """Measures how late the event loop wakes up a task that sleeps LOOP_PROBE_INTERVAL."""
+
+    def __init__(self):
+        self.lags = []
+        self._task = None
+
+    async def _run(self):
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(LOOP_PROBE_INTERVAL)
+            self.lags.append(max(0.0, time.perf_counter() - start - LOOP_PROBE_INTERVAL))
+
+    def __enter__(self):
+        self._task = asyncio.ensure_future(self._run())
+        return self
+
+    def __exit__(self, *exc):
+        self._task.cancel()
+
+    def as_dict(self):
+        blocked = [lag for lag in self.lags if lag > 0.01]
+        return {
+            "max_block_ms": round(max(self.lags, default=0) * 1000, 1),
+            "blocks_over_10ms": len(blocked),
+            "blocked_total_ms": round(sum(blocked) * 1000, 1),
+        }
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+async def run_scenario(name, operation, count, concurrency):
+    """Run operation(index) count times, concurrency at a time, and report on it."""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    failures = 0
+
+    async def one(index):
+        nonlocal failures
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                ok = await operation(index)
+            except Exception as err:  # The report should show failures, not abort
+                print(f"{name} #{index} raised {err!r}", file=sys.stderr)
+                ok = False
+            if ok is False:
+                failures += 1
+            else:
+                latencies.append(time.perf_counter() - start)
+
+    with LoopMonitor() as monitor:
+        start = time.perf_counter()
+        await asyncio.gather(*(one(index) for index in range(count)))
+        elapsed = time.perf_counter() - start
+    return {
+        "scenario": name,
+        "latency": summarize(latencies),
+        "failures": failures,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_per_s": round(len(latencies) / elapsed, 2) if elapsed else None,
+        "event_loop": monitor.as_dict(),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def image_payload(response_format, index):
+    return {
+        "prompt": f"benchmark image {index}",
+        "n": 1,
+        "model": "dall-e-3",
+        "size": "1024x1024",
+        "quality": "standard",
+        "style": "vivid",
+        "response_format": response_format,
+    }
+
+
+async def scenario_prompt(hass, args):
+    config_data = entry_data(hass)
+
+    async def operation(index):
+        result = await async_create_dalle_prompt(hass, f"In Ghent it is noon, scene {index}", config_data)
+        return not result.startswith("Error")
+
+    return await run_scenario("prompt", operation, args.count, args.concurrency)
+
+
+async def scenario_image(hass, args, response_format):
+    async def operation(index):
+        return await post_request_and_save_image(hass, entry_data(hass), image_payload(response_format, index)) is not None
+
+    result = await run_scenario(f"image_{response_format.split('_')[0]}", operation, args.count, args.concurrency)
+    await hass.async_block_till_done()
+    return result
+
+
+async def scenario_clean_up(hass, args):
+    config_data = entry_data(hass)
+    image_index = config_data["image_index"]
+    image = os.urandom(args.image_kb * 1024)
+    www = config_data["image_directory"]
+
+    async def operation(index):
+        # Add one batch of images beyond the retention, then time removing them
+        def write_batch():
+            os.makedirs(www, exist_ok=True)
+            paths = []
+            for number in range(10):
+                path = os.path.join(www, f"dalle_bench{index:04d}{number:02d}.png")
+                with open(path, "wb") as file:
+                    file.write(image)
+                paths.append(path)
+            return paths
+
+        for path in await hass.async_add_executor_job(write_batch):
+            image_index.async_add(path, len(image), "benchmark")
+        await clean_up_images(hass, config_data, 5)
+        return image_index.count == 5
+
+    # The batches share the index, so they run one after the other
+    return await run_scenario("clean_up", operation, args.count, 1)
+
+
+async def scenario_camera(hass, args):
+    # A new image per iteration; the camera reads it once, then a dashboard tile asks for 320px
+    await post_request_and_save_image(hass, entry_data(hass), image_payload("b64_json", "camera"))
+    await hass.async_block_till_done()
+    source = entry_data(hass)["latest_image_path"]
+
+    def copy_images():
+        paths = []
+        for index in range(args.count):
+            path = os.path.join(os.path.dirname(source), f"camera_{index:04d}.png")
+            shutil.copyfile(source, path)
+            paths.append(path)
+        return paths
+
+    paths = await hass.async_add_executor_job(copy_images)
+    camera = weathercanvasaiCamera(hass, BENCHMARK_ENTRY_ID, "Image")
+
+    async def operation(index):
+        camera._image_path = paths[index]
+        full = await camera.async_camera_image()
+        thumbnail = await camera.async_camera_image(width=320)
+        return bool(full) and bool(thumbnail)
+
+    return await run_scenario("camera", operation, args.count, 1)
+
+
+async def scenario_scene(hass, args):
+    async def operation(index):
+        result = await async_generate_scene(hass, entry_data(hass), refresh=True)
+        return result["image_url"] is not None
+
+    result = await run_scenario("scene", operation, args.count, args.concurrency)
+    await hass.async_block_till_done()
+    return result
+
+
+SCENARIOS = ["prompt", "image_url", "image_b64", "clean_up", "camera", "scene"]
+
+
+async def run_suite(args):
+    fake = await FakeOpenAI(
+        latency=args.latency, cdn_latency=args.latency / 2, image_size=args.image_kb * 1024, error_rate=args.error_rate
+    ).start()
+    results = []
+    try:
+        for name in args.only:
+            # A fresh core and config directory per scenario, so they don't share caches or files
+            with tempfile.TemporaryDirectory() as config_dir:
+                hass = await async_create_hass(config_dir, fake.api_base)
+                # Keep retries quick; the fake's errors aren't rate limits
+                hass.data[DOMAIN]["request_scheduler"].backoff_base = 0.05
+                try:
+                    if name == "prompt":
+                        result = await scenario_prompt(hass, args)
+                    elif name in ("image_url", "image_b64"):
+                        result = await scenario_image(hass, args, "url" if name == "image_url" else "b64_json")
+                    elif name == "clean_up":
+                        result = await scenario_clean_up(hass, args)
+                    elif name == "camera":
+                        result = await scenario_camera(hass, args)
+                    else:
+                        result = await scenario_scene(hass, args)
+                    result["metrics"] = entry_data(hass)["metrics"].as_dict()["counters"]
+                finally:
+                    await async_close_hass(hass)
+            print(json.dumps({key: value for key, value in result.items() if key != "metrics"}))
+            results.append(result)
+    finally:
+        await fake.stop()
+    return {
+        "settings": {
+            "count": args.count,
+            "concurrency": args.concurrency,
+            "latency_s": args.latency,
+            "image_kb": args.image_kb,
+            "error_rate": args.error_rate,
+        },
+        "scenarios": results,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def compare(report, baseline, tolerance):
+    """Return the regressions of report against baseline, as readable lines."""
+    previous = {result["scenario"]: result for result in baseline["scenarios"]}
+    regressions = []
+    for result in report["scenarios"]:
+        before = previous.get(result["scenario"])
+        if not before:
+            continue
+        for label, now, then in (
+            ("p95 latency", result["latency"]["p95_ms"], before["latency"]["p95_ms"]),
+            ("max loop block", result["event_loop"]["max_block_ms"], before["event_loop"]["max_block_ms"]),
+        ):
+            # Ignore sub-10ms noise
+            if now is not None and then is not None and now > max(then * (1 + tolerance), then + 10):
+                regressions.append(f"{result['scenario']}: {label} {then} ms -> {now} ms")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--count", type=int, default=20, help="operations per scenario")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds per fake API call")
+    parser.add_argument("--image-kb", type=int, default=1500, help="size of the generated image")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of API calls failing with a 500")
+    parser.add_argument("--only", default=",".join(SCENARIOS), help="comma separated scenarios")
+    parser.add_argument("--save", help="write the report to this JSON file")
+    parser.add_argument("--baseline", help="compare to a report saved with --save")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative regression")
+    args = parser.parse_args()
+    args.only = [name for name in args.only.split(",") if name]
+    unknown = set(args.only) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    report = asyncio.run(run_suite(args))
+    print(f"peak RSS: {report['peak_rss_mb']} MB")
+    if args.save:
+        with open(args.save, "w") as file:
+            json.dump(report, file, indent=2)
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = compare(report, json.load(file), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
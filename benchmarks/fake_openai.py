@@ -0,0 +1,199 @@
+"""Local stand-in for the OpenAI API and its image CDN, used by the benchmarks."""
+import asyncio
+import base64
+import io
+import json
+import math
+import os
+import random
+import time
+
+from aiohttp import web
+from PIL import Image
+
+
+def noise_png(size):
+    """Return a PNG of random noise; noise doesn't compress, so it is about `size` bytes."""
+    side = max(1, int(math.sqrt(size / 3)))
+    output = io.BytesIO()
+    Image.frombytes("RGB", (side, side), os.urandom(side * side * 3)).save(output, format="PNG", compress_level=1)
+    return output.getvalue()
+
+
+class FakeOpenAI:
+    """aiohttp server faking /v1/chat/completions, /v1/images/generations and the image CDN.
+
+    latency: seconds each API call takes, cdn_latency: seconds before the CDN answers,
+    image_size: bytes of the generated "image".
+    request_limit: API calls allowed per limit_window seconds, beyond which it answers
+    429 with retry-after; all API responses then carry x-ratelimit-* headers.
+    server_errors: number of API calls answered 503 first.
+    error_rate: fraction of the other API calls answered 500 at random.
+    token_interval: seconds the fake ChatGPT takes per word after `latency`; a
+    streamed ("stream": true) chat completion sends each word as it is "written".
+    """
+
+    def __init__(self, latency=0.5, cdn_latency=0.1, image_size=3 * 1024 * 1024,
+                 request_limit=None, limit_window=60.0, server_errors=0, error_rate=0.0, token_interval=0.0):
+        self.latency = latency
+        self.token_interval = token_interval
+        self.cdn_latency = cdn_latency
+        self.image = noise_png(image_size)
+        # Encoded once, so the fake's own work doesn't show up as event loop blocking
+        self._b64_image = base64.b64encode(self.image).decode()
+        self.request_limit = request_limit
+        self.limit_window = limit_window
+        self.server_errors = server_errors
+        self.error_rate = error_rate
+        self._accepted = []  # monotonic times of the calls within the window
+        self.chat_payloads = []  # request bodies of the chat completions
+        self.requests = {"chat": 0, "images": 0, "cdn": 0, "throttled": 0, "server_errors": 0}
+        self.in_flight = 0  # API calls being answered
+        self.peak_in_flight = 0
+        self.clients = set()  # client (host, port) pairs, one per connection
+        self._runner = None
+        self.port = None
+
+    @property
+    def api_base(self):
+        return f"http://127.0.0.1:{self.port}/v1"
+
+    async def start(self):
+        app = web.Application(middlewares=[self._track])
+        app.router.add_post("/v1/chat/completions", self._chat_completions)
+        app.router.add_post("/v1/images/generations", self._images_generations)
+        app.router.add_get("/cdn/{name}", self._cdn)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+
+    @web.middleware
+    async def _track(self, request, handler):
+        self.clients.add(request.transport.get_extra_info("peername"))
+        if not request.path.startswith("/v1/"):
+            return await handler(request)
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            return await handler(request)
+        finally:
+            self.in_flight -= 1
+
+    def _throttle(self):
+        """Return (error response or None, x-ratelimit headers) for an API call."""
+        if self.server_errors > 0:
+            self.server_errors -= 1
+            self.requests["server_errors"] += 1
+            return web.json_response({"error": {"message": "The server is overloaded"}}, status=503), {}
+        if self.error_rate and random.random() < self.error_rate:
+            self.requests["server_errors"] += 1
+            return web.json_response({"error": {"message": "The server had an error"}}, status=500), {}
+        if self.request_limit is None:
+            return None, {}
+        now = time.monotonic()
+        self._accepted = [t for t in self._accepted if now - t < self.limit_window]
+        if len(self._accepted) >= self.request_limit:
+            reset = self.limit_window - (now - self._accepted[0])
+            self.requests["throttled"] += 1
+            headers = self._limit_headers(0, reset)
+            headers["retry-after"] = str(max(1, math.ceil(reset)))
+            return web.json_response(
+                {"error": {"message": "Rate limit reached for requests", "code": "rate_limit_exceeded"}},
+                status=429, headers=headers,
+            ), {}
+        self._accepted.append(now)
+        reset = self.limit_window - (now - self._accepted[0])
+        return None, self._limit_headers(self.request_limit - len(self._accepted), reset)
+
+    def _limit_headers(self, remaining, reset):
+        return {
+            "x-ratelimit-limit-requests": str(self.request_limit),
+            "x-ratelimit-remaining-requests": str(remaining),
+            "x-ratelimit-reset-requests": f"{int(reset * 1000)}ms",
+        }
+
+    async def _chat_completions(self, request):
+        payload = await request.json()
+        error, headers = self._throttle()
+        if error is not None:
+            return error
+        self.requests["chat"] += 1
+        self.chat_payloads.append(payload)
+        start = time.monotonic()
+        await asyncio.sleep(self.latency)
+        # Numbered, so concurrent scenes don't all coalesce into one image
+        content = f"A misty autumn afternoon over the old town, oil painting, variation {self.requests['chat']}."
+        # About four characters per token, like the real API's English text
+        prompt_tokens = sum(len(message.get("content") or "") for message in payload.get("messages", [])) // 4
+        completion_tokens = len(content) // 4
+        if payload.get("stream"):
+            return await self._stream_chat_completion(request, payload, headers, content, prompt_tokens, completion_tokens)
+        await asyncio.sleep(self.token_interval * len(content.split(" ")))
+        headers["openai-processing-ms"] = str(int((time.monotonic() - start) * 1000))
+        return web.json_response(headers=headers, data={
+            "id": "chatcmpl-fake",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens},
+        })
+
+    async def _stream_chat_completion(self, request, payload, headers, content, prompt_tokens, completion_tokens):
+        """Answer as server-sent events: a chunk per word, token_interval apart, then the usage and [DONE]."""
+        response = web.StreamResponse(headers={**headers, "Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
+        await response.prepare(request)
+
+        async def send(data):
+            await response.write(f"data: {json.dumps(data)}\n\n".encode())
+
+        chunk = {"id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": int(time.time())}
+        try:
+            await send({**chunk, "choices": [{"index": 0, "delta": {"role": "assistant", "content": ""}, "finish_reason": None}]})
+            words = content.split(" ")
+            for index, word in enumerate(words):
+                await send({**chunk, "choices": [{"index": 0, "delta": {"content": word if index == 0 else f" {word}"}, "finish_reason": None}]})
+                await asyncio.sleep(self.token_interval)
+            await send({**chunk, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+            if (payload.get("stream_options") or {}).get("include_usage"):
+                await send({**chunk, "choices": [], "usage": {
+                    "prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens,
+                }})
+            await response.write(b"data: [DONE]\n\n")
+            await response.write_eof()
+        except ConnectionResetError:
+            pass  # The client aborted the stream
+        return response
+
+    async def _images_generations(self, request):
+        payload = await request.json()
+        error, headers = self._throttle()
+        if error is not None:
+            return error
+        self.requests["images"] += 1
+        await asyncio.sleep(self.latency)
+        if payload.get("response_format") == "b64_json":
+            body = json.dumps({
+                "created": int(time.time()),
+                "data": [{"b64_json": self._b64_image}],
+            })
+            return web.Response(body=body, content_type="application/json", headers=headers)
+        return web.json_response(headers=headers, data={
+            "created": int(time.time()),
+            "data": [{"url": f"http://127.0.0.1:{self.port}/cdn/image.png"}],
+        })
+
+    async def _cdn(self, request):
+        self.requests["cdn"] += 1
+        await asyncio.sleep(self.cdn_latency)
+        return web.Response(body=self.image, content_type="image/png")
@@ -0,0 +1,94 @@
+"""Helpers to run the integration's code paths against a bare Home Assistant core."""
+import os
+import sys
+import statistics
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "custom_components"))
+
+from homeassistant.core import HomeAssistant  # noqa: E402
+
+from weathercanvasai import async_create_config_data  # noqa: E402
+from weathercanvasai.const import (  # noqa: E402
+    DOMAIN,
+    SCHEDULER_MAX_CONCURRENCY,
+    CONF_PROMPT_CACHE_TTL_HOURS,
+    CONF_IMAGE_REUSE_DAYS,
+    CONF_GENERATION_COOLDOWN,
+)
+from weathercanvasai.http_client import WeathercanvasaiHttpClient  # noqa: E402
+from weathercanvasai.thumbnails import ThumbnailCache  # noqa: E402
+from weathercanvasai.scheduler import RequestScheduler  # noqa: E402
+from weathercanvasai.encoding import ImageEncoder  # noqa: E402
+
+BENCHMARK_ENTRY_ID = "benchmark"
+BENCHMARK_DATA = {
+    "openai_api_key": "sk-benchmark",
+    "googlemaps_api_key": "benchmark",
+    "location_name": "Ghent, East Flanders, Flanders, Belgium",
+}
+# The caches are off, so every call reaches the fake API
+BENCHMARK_OPTIONS = {
+    CONF_PROMPT_CACHE_TTL_HOURS: 0,
+    CONF_IMAGE_REUSE_DAYS: 0,
+    CONF_GENERATION_COOLDOWN: 0,
+}
+
+
+async def async_create_hass(config_dir, api_base, max_concurrency=SCHEDULER_MAX_CONCURRENCY, **options):
+    """Return a Home Assistant core with the integration's runtime data in place.
+
+    Sets up what async_setup_entry stores in hass.data: the shared client,
+    scheduler, thumbnail cache and image encoder, and one entry under
+    BENCHMARK_ENTRY_ID, with BENCHMARK_OPTIONS and then `options` as its
+    options. No config entry, platforms or services are loaded. sun.sun and
+    the weather entity get plausible states.
+    """
+    os.makedirs(config_dir, exist_ok=True)
+    hass = HomeAssistant(config_dir)
+    hass.states.async_set("sun.sun", "above_horizon", {
+        "next_rising": "2026-10-19T06:15:00+00:00",
+        "next_setting": "2026-10-18T17:05:00+00:00",
+    })
+    hass.states.async_set("weather.forecast_home", "cloudy", {"temperature": 12.5, "cloud_coverage": 70})
+    http_client = WeathercanvasaiHttpClient(hass, api_base)
+    hass.data[DOMAIN] = {
+        "http_client": http_client,
+        "request_scheduler": RequestScheduler(http_client, max_concurrency=max_concurrency),
+        "thumbnail_cache": ThumbnailCache(hass),
+        "image_encoder": ImageEncoder(hass),
+    }
+    await async_add_entry(hass, BENCHMARK_ENTRY_ID, **options)
+    return hass
+
+
+async def async_add_entry(hass, entry_id, **options):
+    """Add the runtime data of another entry, sharing the client and scheduler, and return it.
+
+    Built by the integration's own async_create_config_data, like a config entry's.
+    """
+    config_data = await async_create_config_data(hass, entry_id, BENCHMARK_DATA, {**BENCHMARK_OPTIONS, **options})
+    hass.data[DOMAIN][entry_id] = config_data
+    return config_data
+
+
+def entry_data(hass, entry_id=BENCHMARK_ENTRY_ID):
+    return hass.data[DOMAIN][entry_id]
+
+
+async def async_close_hass(hass):
+    await hass.data[DOMAIN]["http_client"].async_close()
+    await hass.data[DOMAIN]["image_encoder"].async_close()
+    await hass.async_stop(force=True)
+
+
+def summarize(samples):
+    """Return p50/p95/max of a list of seconds, in milliseconds."""
+    if not samples:
+        return {"n": 0, "p50_ms": None, "p95_ms": None, "max_ms": None}
+    ordered = sorted(samples)
+    return {
+        "n": len(ordered),
+        "p50_ms": round(statistics.median(ordered) * 1000, 1),
+        "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 1),
+        "max_ms": round(ordered[-1] * 1000, 1),
+    }
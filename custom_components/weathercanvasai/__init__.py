@@ -1,105 +1,302 @@
 import logging
-import datetime
 import asyncio
-from homeassistant.core import HomeAssistant
+import os
+from homeassistant.core import HomeAssistant, SupportsResponse, callback
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.helpers.dispatcher import async_dispatcher_send
+from homeassistant.exceptions import HomeAssistantError
 from .weather_processing import (
-    async_calculate_day_segment, 
-    get_season, 
-    async_get_weather_conditions, 
-    async_create_dalle_prompt
-)
-from homeassistant.const import (
-    CONF_ID,
-    CONF_LATITUDE,
-    CONF_LONGITUDE,
-    CONF_NAME
+    async_build_scene,
+    async_get_dalle_prompt,
+    async_publish_prompts,
+    async_restore_latest_image,
 )
+from homeassistant.const import EVENT_CORE_CONFIG_UPDATE
 import voluptuous as vol
 from homeassistant.helpers import config_validation as cv
-from .sensor import weathercanvasaiPromptsSensor
+from homeassistant.helpers.dispatcher import async_dispatcher_connect
+from homeassistant.components import websocket_api
 from .weather_processing import (generate_dalle2_image, generate_dalle3_image)
+from .http_client import WeathercanvasaiHttpClient
+from .scheduler import RequestScheduler, account_id
+from .api_util import location_key, test_googlemaps_api
+from .metrics import Metrics
+from .thumbnails import ThumbnailCache
+from .encoding import ImageEncoder
+from .image_view import WeathercanvasaiImageView
+from .image_index import ImageIndex
+from .prompt_cache import PromptCache
+from .prompt_history import PromptHistory
+from .prompt_compiler import PromptCompiler
+from .image_store import ImageStore
+from .coalesce import SingleFlight
+from .day_segments import DaySegmentTracker
+from .triggers import SceneTrigger
+from .pipeline import async_generate_scene
 
 from .const import (
     DOMAIN,
     CONF_MAX_IMAGES_RETAINED,
     DEFAULT_MAX_IMAGES_RETAINED,
+    CONF_MAX_IMAGES_MEGABYTES,
+    DEFAULT_MAX_IMAGES_MEGABYTES,
+    CONF_PROMPT_CACHE_TTL_HOURS,
+    DEFAULT_PROMPT_CACHE_TTL_HOURS,
+    CONF_PROMPT_CACHE_VARIANTS,
+    DEFAULT_PROMPT_CACHE_VARIANTS,
+    CONF_IMAGE_REUSE_DAYS,
+    DEFAULT_IMAGE_REUSE_DAYS,
+    CONF_IMAGE_REUSE_VARIANTS,
+    DEFAULT_IMAGE_REUSE_VARIANTS,
+    CONF_IMAGE_STORE_MEGABYTES,
+    DEFAULT_IMAGE_STORE_MEGABYTES,
+    IMAGE_STORE_DIRECTORY,
+    IMAGE_STORE_SUBDIRECTORY,
+    CONF_GENERATION_COOLDOWN,
+    DEFAULT_GENERATION_COOLDOWN,
+    CONF_AUTO_GENERATE,
+    DEFAULT_AUTO_GENERATE,
+    CONF_AUTO_GENERATE_DEBOUNCE,
+    DEFAULT_AUTO_GENERATE_DEBOUNCE,
+    CONF_AUTO_GENERATE_MIN_INTERVAL,
+    DEFAULT_AUTO_GENERATE_MIN_INTERVAL,
+    CONF_WEATHER_ENTITY,
+    DEFAULT_WEATHER_ENTITY,
+    CONF_SUN_ENTITY,
+    DEFAULT_SUN_ENTITY,
+    CONF_OUTPUT_FORMAT,
+    DEFAULT_OUTPUT_FORMAT,
+    CONF_OUTPUT_QUALITY,
+    DEFAULT_OUTPUT_QUALITY,
+    CONF_KEEP_PNG_MASTER,
+    DEFAULT_KEEP_PNG_MASTER,
+    CONF_STREAM_PROMPTS,
+    DEFAULT_STREAM_PROMPTS,
+    CONF_PROMPT_HISTORY_SIZE,
+    DEFAULT_PROMPT_HISTORY_SIZE,
     CONF_GPT_MODEL_NAME,
     DEFAULT_GPT_MODEL_NAME,
     CONF_SYSTEM_INSTRUCTION,
     DEFAULT_SYSTEM_INSTRUCTION,
-
+    CONF_RESPONSE_FORMAT,
+    DEFAULT_RESPONSE_FORMAT,
+    RESPONSE_FORMATS,
+    SIGNAL_PROMPTS_STREAMING,
 )
 
 _LOGGER = logging.getLogger(__name__)
 
 PLATFORMS = ["sensor", "camera"] # Define the platforms that this integration supports
 
+SERVICES = ['create_chatgpt_prompt', 'create_dalle2_image', 'create_dalle3_image', 'generate_scene', 'get_prompt_history']
+
 async def async_setup(hass: HomeAssistant, config: dict):
     """Set up the weathercanvasai component."""
+    # Serves the images of all entries, with long lived caching and ETags
+    hass.http.register_view(WeathercanvasaiImageView())
+    websocket_api.async_register_command(hass, websocket_prompt_history)
+    websocket_api.async_register_command(hass, websocket_subscribe_prompt_stream)
     return True
 
-async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry):
-    """Set up weathercanvasai from a config entry."""
-    _LOGGER.debug("Entering async_step_setup_entry")
-    
-    # Check if the integration is already fully set up
-    if DOMAIN in hass.data and hass.data[DOMAIN].get('setup_complete'):
-        _LOGGER.error("Weather Image Generator integration already configured and setup completed")
-        return False
-
-    # Extract configuration data from the entry
-    config_data = entry.data
-    # Retrieve values for entry options or use a default value
-    max_images_retained = entry.options.get(CONF_MAX_IMAGES_RETAINED, DEFAULT_MAX_IMAGES_RETAINED)
-    gpt_model_name = entry.options.get(CONF_GPT_MODEL_NAME, DEFAULT_GPT_MODEL_NAME)
-    system_instruction = entry.options.get(CONF_SYSTEM_INSTRUCTION, DEFAULT_SYSTEM_INSTRUCTION)
+async def async_create_config_data(hass: HomeAssistant, entry_id, data, options) -> dict:
+    """Build the runtime data of an entry from its data and options, with its storage loaded.
 
-    # Check if a temporary location name was stored during the config flow
-    if 'temporary_location_name' in hass.data:
-        location_name = hass.data.pop('temporary_location_name')
-    else:
-        location_name = config_data.get("location_name", "Unknown Location")
+    The shared client, scheduler, thumbnail cache and encoder have to be in
+    hass.data[DOMAIN] already. Storing the result there, the trackers and the
+    platforms are left to the caller; the benchmarks use it without a config entry.
+    """
+    # Retrieve values for entry options or use a default value
+    max_images_retained = options.get(CONF_MAX_IMAGES_RETAINED, DEFAULT_MAX_IMAGES_RETAINED)
+    max_images_megabytes = options.get(CONF_MAX_IMAGES_MEGABYTES, DEFAULT_MAX_IMAGES_MEGABYTES)
+    gpt_model_name = options.get(CONF_GPT_MODEL_NAME, DEFAULT_GPT_MODEL_NAME)
+    system_instruction = options.get(CONF_SYSTEM_INSTRUCTION, DEFAULT_SYSTEM_INSTRUCTION)
+    response_format = options.get(CONF_RESPONSE_FORMAT, DEFAULT_RESPONSE_FORMAT)
 
-    _LOGGER.debug("Initial configuration data: %s", config_data)
     _LOGGER.debug("Options being set: max_images_retained=%s, gpt_model_name=%s, system_instruction=%s", max_images_retained, gpt_model_name, system_instruction)
 
-    # Store the configuration data in hass.data for the domain
-    hass.data[DOMAIN] = {
-        "openai_api_key": config_data["openai_api_key"],
+    if data.get("legacy_storage"):
+        # Entries from before multiple locations keep their images in www and their storage files
+        image_directory = hass.config.path("www")
+        store_directory = hass.config.path("www", IMAGE_STORE_DIRECTORY)
+        storage_suffix = ""
+    else:
+        image_directory = hass.config.path("www", IMAGE_STORE_DIRECTORY, entry_id)
+        store_directory = os.path.join(image_directory, IMAGE_STORE_SUBDIRECTORY)
+        storage_suffix = f".{entry_id}"
+
+    domain_data = hass.data[DOMAIN]
+    metrics = Metrics(hass)
+    config_data = {
+        "entry_id": entry_id,
+        "openai_api_key": data["openai_api_key"],
+        # Entries with the same API key share its rate limits in the scheduler
+        "account": account_id(data["openai_api_key"]),
         "gpt_model_name": gpt_model_name,
-        "location_name": location_name,
+        "location_name": data.get("location_name", "Unknown Location"),
+        "weather_entity": options.get(CONF_WEATHER_ENTITY, DEFAULT_WEATHER_ENTITY),
+        "sun_entity": options.get(CONF_SUN_ENTITY, DEFAULT_SUN_ENTITY),
+        "image_directory": image_directory,
         "max_images_retained": max_images_retained,  # Use the value from options
-        "system_instruction": system_instruction
+        "max_images_bytes": max_images_megabytes * 1024 * 1024,
+        "system_instruction": system_instruction,
+        # Chat completion messages and max_tokens, compiled from the system instruction
+        "prompt_compiler": PromptCompiler(system_instruction),
+        "stream_prompts": options.get(CONF_STREAM_PROMPTS, DEFAULT_STREAM_PROMPTS),
+        "response_format": response_format,
+        "output_format": options.get(CONF_OUTPUT_FORMAT, DEFAULT_OUTPUT_FORMAT),
+        "output_quality": options.get(CONF_OUTPUT_QUALITY, DEFAULT_OUTPUT_QUALITY),
+        "keep_png_master": options.get(CONF_KEEP_PNG_MASTER, DEFAULT_KEEP_PNG_MASTER),
+        "http_client": domain_data["http_client"],
+        "request_scheduler": domain_data["request_scheduler"],
+        "thumbnail_cache": domain_data["thumbnail_cache"],
+        "image_encoder": domain_data["image_encoder"],
+        # Stage latencies and counters, for diagnostics and the diagnostic sensors
+        "metrics": metrics,
+        # Coalesces identical image generations triggered at the same time
+        "image_flights": SingleFlight(options.get(CONF_GENERATION_COOLDOWN, DEFAULT_GENERATION_COOLDOWN)),
     }
 
-    _LOGGER.debug(f"{DOMAIN} configuration data set up: {hass.data[DOMAIN]}")
-    
-    # reload the configuration and options data
-    entry.add_update_listener(options_update_listener)
+    # Manifest of the generated images, used for retention
+    image_index = ImageIndex(hass, image_directory, f"{DOMAIN}.image_index{storage_suffix}", metrics)
+    config_data["image_index"] = image_index
 
-    # Forward the setup to the sensor platform
-    for platform in PLATFORMS:
-        hass.async_create_task(
-            hass.config_entries.async_forward_entry_setup(entry, platform)
+    # Generated prompts, reused for repeated scenes
+    prompt_cache = PromptCache(
+        hass,
+        ttl=options.get(CONF_PROMPT_CACHE_TTL_HOURS, DEFAULT_PROMPT_CACHE_TTL_HOURS) * 3600,
+        variants=options.get(CONF_PROMPT_CACHE_VARIANTS, DEFAULT_PROMPT_CACHE_VARIANTS),
+        storage_key=f"{DOMAIN}.prompt_cache{storage_suffix}",
+    )
+    config_data["prompt_cache"] = prompt_cache
+
+    # Generated images, reused for repeated scenes
+    image_store = ImageStore(
+        hass,
+        store_directory,
+        max_age=options.get(CONF_IMAGE_REUSE_DAYS, DEFAULT_IMAGE_REUSE_DAYS) * 86400,
+        variants=options.get(CONF_IMAGE_REUSE_VARIANTS, DEFAULT_IMAGE_REUSE_VARIANTS),
+        max_bytes=options.get(CONF_IMAGE_STORE_MEGABYTES, DEFAULT_IMAGE_STORE_MEGABYTES) * 1024 * 1024,
+        storage_key=f"{DOMAIN}.image_store{storage_suffix}",
+        metrics=metrics,
+    )
+    config_data["image_store"] = image_store
+
+    # The last prompts, kept out of the recorder by the prompts sensor
+    prompt_history = PromptHistory(
+        hass,
+        size=options.get(CONF_PROMPT_HISTORY_SIZE, DEFAULT_PROMPT_HISTORY_SIZE),
+        storage_key=f"{DOMAIN}.prompt_history{storage_suffix}",
+    )
+    config_data["prompt_history"] = prompt_history
+
+    # The storage files load side by side, not one after the other
+    await asyncio.gather(
+        image_index.async_load(), prompt_cache.async_load(), image_store.async_load(), prompt_history.async_load()
+    )
+    # The camera and image sensor start with the image shown before the restart
+    await async_restore_latest_image(hass, config_data)
+    return config_data
+
+async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry):
+    """Set up weathercanvasai from a config entry, one per location."""
+    _LOGGER.debug("Entering async_step_setup_entry")
+    _LOGGER.debug("Initial configuration data: %s", entry.data)
+
+    # Shared by all entries: one pooled client and one scheduler, so every location's
+    # OpenAI calls share the connections and the concurrency and rate budget
+    domain_data = hass.data.setdefault(DOMAIN, {})
+    if "http_client" not in domain_data:
+        http_client = WeathercanvasaiHttpClient(hass)
+        domain_data["http_client"] = http_client
+        # Rate limits, retries and priorities of the OpenAI API calls
+        domain_data["request_scheduler"] = RequestScheduler(http_client)
+        # Resized camera images for dashboard tiles
+        domain_data["thumbnail_cache"] = ThumbnailCache(hass)
+        # Worker processes transcoding images to the compact output formats
+        domain_data["image_encoder"] = ImageEncoder(hass)
+        async_register_services(hass)
+
+    # Store this entry's configuration and runtime data in hass.data[DOMAIN][entry_id]
+    config_data = await async_create_config_data(hass, entry.entry_id, entry.data, entry.options)
+    domain_data[entry.entry_id] = config_data
+
+    # Day segment boundaries, announced at each transition
+    day_segments = DaySegmentTracker(hass, entry.entry_id, config_data["sun_entity"])
+    day_segments.async_start()
+    config_data["day_segments"] = day_segments
+
+    # Built-in regeneration on scene changes, instead of time pattern automations
+    if entry.options.get(CONF_AUTO_GENERATE, DEFAULT_AUTO_GENERATE):
+        scene_trigger = SceneTrigger(
+            hass,
+            config_data,
+            debounce=entry.options.get(CONF_AUTO_GENERATE_DEBOUNCE, DEFAULT_AUTO_GENERATE_DEBOUNCE),
+            min_interval=entry.options.get(CONF_AUTO_GENERATE_MIN_INTERVAL, DEFAULT_AUTO_GENERATE_MIN_INTERVAL) * 60,
         )
+        scene_trigger.async_start()
+        config_data["scene_trigger"] = scene_trigger
 
-    # Define the create gpt prompt service handler
-    async def create_gpt_prompt_service(call):
-        # Get daypart and season
-        day_segment = await async_calculate_day_segment(hass)
-        now = datetime.datetime.now()
-        season = get_season(now)
-    
-        # Retrieve the stored location name from the configuration
-        location_name = hass.data[DOMAIN].get('location_name', 'Unknown Location')
+    _LOGGER.debug(f"{DOMAIN} configuration data set up for {config_data['location_name']}: {config_data}")
+
+    # reload the configuration and options data
+    entry.async_on_unload(entry.add_update_listener(options_update_listener))
 
-        # Get weather conditions
-        weather_prompt = await async_get_weather_conditions(hass)
+    # Entries named after the home location look the name up again, in the background,
+    # only when the home location moves
+    if entry.data.get("follow_home", True):
+        config_data["location_key"] = location_key(hass.config.latitude, hass.config.longitude)
 
-        # Combine the information into chatgpt_in, to be sent to chatgpt next and receive chatgpt_out
-        chatgpt_in = f"In {location_name}, it is {day_segment} in {season}. {weather_prompt}"
+        @callback
+        def core_config_updated(event):
+            new_location_key = location_key(hass.config.latitude, hass.config.longitude)
+            if new_location_key == config_data.get("location_key"):
+                return
+            config_data["location_key"] = new_location_key
+            hass.async_create_task(async_refresh_location_name(hass, entry))
+
+        entry.async_on_unload(hass.bus.async_listen(EVENT_CORE_CONFIG_UPDATE, core_config_updated))
+
+    # Set up the sensor and camera platforms together
+    await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
+
+    _LOGGER.debug("Integration setup completed successfully.")
+
+    return True
+
+def _loaded_entry_ids(hass: HomeAssistant):
+    """Return the ids of the set up entries, in the order they were added."""
+    domain_data = hass.data.get(DOMAIN, {})
+    return [entry.entry_id for entry in hass.config_entries.async_entries(DOMAIN) if entry.entry_id in domain_data]
+
+def _service_config_data(hass: HomeAssistant, call) -> dict:
+    """Return the data of the entry a service call is for.
+
+    Without an entry_id the first entry is used, so single location setups
+    don't need one.
+    """
+    return _entry_config_data(hass, call.data.get("entry_id"))
+
+def _entry_config_data(hass: HomeAssistant, entry_id) -> dict:
+    """Return the data of an entry, or of the first entry without an entry_id."""
+    if entry_id is None:
+        entry_ids = _loaded_entry_ids(hass)
+        if not entry_ids:
+            raise HomeAssistantError(f"No {DOMAIN} entry is set up")
+        entry_id = entry_ids[0]
+    config_data = hass.data.get(DOMAIN, {}).get(entry_id)
+    if config_data is None:
+        raise HomeAssistantError(f"No {DOMAIN} entry with id {entry_id} is set up")
+    return config_data
+
+@callback
+def async_register_services(hass: HomeAssistant):
+    """Register the services once, for all entries; calls pick an entry with entry_id."""
+
+    # Define the create gpt prompt service handler
+    async def create_gpt_prompt_service(call):
+        config_data = _service_config_data(hass, call)
+        # Collect location, daypart, season and weather into chatgpt_in
+        scene = await async_build_scene(hass, config_data)
+        chatgpt_in = scene["chatgpt_in"]
 
         # Log the combined information
         #_LOGGER.debug(chatgpt_in)
@@ -109,139 +306,256 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry):
             _LOGGER.error("No input string provided for DALL-E prompt creation.")
             return
 
-        # Log the data stored under DOMAIN
-        #_LOGGER.debug(f"{DOMAIN} data: {hass.data[DOMAIN]}")
         try:
-            config_data = hass.data[DOMAIN]  # Accessing the configuration data
-            chatgpt_out = await async_create_dalle_prompt(hass, chatgpt_in, config_data)
+            # Identical scenes are served from the prompt cache, unless a refresh is asked for
+            chatgpt_out, scene_key, cache_hit = await async_get_dalle_prompt(
+                hass, config_data, scene, refresh=call.data.get("refresh", False)
+            )
             # Use chatgpt_out for further processing or return it
-            _LOGGER.debug(f"DALL-E Prompt: {chatgpt_out}")
-            # Dispatch the update to the sensor with new data
-            async_dispatcher_send(hass, "update_weathercanvasai_sensor", {
+            _LOGGER.debug(f"DALL-E Prompt (cache hit: {cache_hit}): {chatgpt_out}")
+            # Keep the prompt for the image services and update the entry's prompts sensor
+            async_publish_prompts(hass, config_data, {
                 "chatgpt_in": chatgpt_in,
                 "chatgpt_out": chatgpt_out,
+                "scene_key": scene_key,
+                "cache_hit": cache_hit,
             })
         except Exception as e:
             _LOGGER.error(f"Error creating DALL-E prompt: {e}")
 
-    # Register the gpt prompt service
-    hass.services.async_register(DOMAIN, 'create_chatgpt_prompt', create_gpt_prompt_service)
-
     # Define the "create dalle2 image" service handler
     async def create_dalle2_image_service(call):
-        # Define the entity ID of the weathercanvasaiPromptsSensor
-        entity_id = "sensor.weathercanvasai_prompts"
-
-        # Retrieve the state of the weathercanvasaiPromptsSensor
-        sensor_state = hass.states.get(entity_id)
+        config_data = _service_config_data(hass, call)
         # Retrieve additional parameters from the service call
         size = call.data.get("size", "1024x1024")  # Default to 1024x1024 if not provided
+        response_format = call.data.get("response_format")  # Falls back to the configured option
 
-        if sensor_state is None:
-            _LOGGER.error(f"Entity {entity_id} not found")
-            return
-
-        # Retrieve the 'chatgpt_out' attribute from the sensor's state
-        prompt = sensor_state.attributes.get("chatgpt_out")
+        # The prompt created last for this entry
+        prompt = config_data.get("chatgpt_out")
 
         if not prompt:
             _LOGGER.error("No 'chatgpt_out' prompt found for DALL-E image generation")
             return
 
         try:
-            image_url = await generate_dalle2_image(hass, prompt, size)
+            # Repeated scenes are served from the image store, keyed by the prompt's scene fingerprint
+            image_url = await generate_dalle2_image(
+                hass, config_data, prompt, size, response_format,
+                scene_key=config_data.get("scene_key"), refresh=call.data.get("refresh", False)
+            )
             if image_url:
+                # The camera and image sensor were updated when the image was saved
                 _LOGGER.info(f"DALL-E-2 image generated: {image_url}")
-                # Dispatch the update to the camera with the real image URL
-                async_dispatcher_send(hass, "update_weathercanvasai_camera")
             else:
                 _LOGGER.error("Failed to generate DALL-E-2 image or invalid URL received")
         except Exception as e:
             _LOGGER.error(f"Error generating DALL-E image: {e}")
 
-    # Register the "create dalle2 image" service
-    hass.services.async_register(DOMAIN, 'create_dalle2_image', create_dalle2_image_service)
-
     # Define the "create dalle3 image" service handler
     async def create_dalle3_image_service(call):
-        # Define the entity ID of the weathercanvasaiPromptsSensor
-        entity_id = "sensor.weathercanvasai_prompts"
-
-        # Retrieve the state of the weathercanvasaiPromptsSensor
-        sensor_state = hass.states.get(entity_id)
+        config_data = _service_config_data(hass, call)
         # Retrieve additional parameters from the service call
         size = call.data.get("size", "1024x1024")  # Default to 1024x1024 if not provided
         quality = call.data.get("quality", "standard")  # Default to 'standard' if not provided
         style = call.data.get("style", "vivid")  # Default to 'vivid' if not provided
+        response_format = call.data.get("response_format")  # Falls back to the configured option
 
-        if sensor_state is None:
-            _LOGGER.error(f"Entity {entity_id} not found")
-            return
-
-        # Retrieve the 'chatgpt_out' attribute from the sensor's state
-        prompt = sensor_state.attributes.get("chatgpt_out")
+        # The prompt created last for this entry
+        prompt = config_data.get("chatgpt_out")
 
         if not prompt:
             _LOGGER.error("No 'chatgpt_out' prompt found for DALL-E image generation")
             return
 
         try:
-            image_url = await generate_dalle3_image(hass, prompt, size, quality, style)
+            # Repeated scenes are served from the image store, keyed by the prompt's scene fingerprint
+            image_url = await generate_dalle3_image(
+                hass, config_data, prompt, size, quality, style, response_format,
+                scene_key=config_data.get("scene_key"), refresh=call.data.get("refresh", False)
+            )
 
             if image_url:
+                # The camera and image sensor were updated when the image was saved
                 _LOGGER.info(f"DALL-E-3 image generated: {image_url}")
-                # Dispatch the update to the camera with the real image URL
-                async_dispatcher_send(hass, "update_weathercanvasai_camera")
             else:
                 _LOGGER.error("Failed to generate DALL-E-3 image or invalid URL received")
         except Exception as e:
             _LOGGER.error(f"Error generating DALL-E image: {e}")
-            
-    # Register the "create dalle3 image" service
-    hass.services.async_register(DOMAIN, 'create_dalle3_image', create_dalle3_image_service)
+
+    # Define the "get prompt history" service handler, the prompts the sensor doesn't record
+    async def get_prompt_history_service(call):
+        config_data = _service_config_data(hass, call)
+        since = call.data.get("since")
+        prompts = config_data["prompt_history"].async_get(
+            limit=call.data.get("limit"), since=since.timestamp() if since else None
+        )
+        return {"prompts": prompts}
+
+    # Define the "generate scene" service handler, prompt and image in one go
+    async def generate_scene_service(call):
+        return await async_generate_scene(
+            hass,
+            _service_config_data(hass, call),
+            model=call.data["model"],
+            size=call.data["size"],
+            quality=call.data["quality"],
+            style=call.data["style"],
+            response_format=call.data.get("response_format"),
+            refresh=call.data["refresh"],
+        )
 
     # Service schemas
+    CREATE_CHATGPT_PROMPT_SCHEMA = vol.Schema({
+        vol.Optional("entry_id"): cv.string,
+        vol.Optional("refresh", default=False): cv.boolean,
+    })
+
     CREATE_DALLE2_IMAGE_SCHEMA = vol.Schema({
+        vol.Optional("entry_id"): cv.string,
         vol.Optional("size", default="1024x1024"): cv.string,
+        vol.Optional("response_format"): vol.In(RESPONSE_FORMATS),
+        vol.Optional("refresh", default=False): cv.boolean,
     })
 
     CREATE_DALLE3_IMAGE_SCHEMA = vol.Schema({
+        vol.Optional("entry_id"): cv.string,
         vol.Optional("size", default="1024x1024"): cv.string,
         vol.Optional("quality", default="standard"): cv.string,
         vol.Optional("style", default="vivid"): cv.string,
+        vol.Optional("response_format"): vol.In(RESPONSE_FORMATS),
+        vol.Optional("refresh", default=False): cv.boolean,
+    })
+
+    GENERATE_SCENE_SCHEMA = vol.Schema({
+        vol.Optional("entry_id"): cv.string,
+        vol.Optional("model", default="dall-e-3"): vol.In(["dall-e-2", "dall-e-3"]),
+        vol.Optional("size", default="1024x1024"): cv.string,
+        vol.Optional("quality", default="standard"): cv.string,
+        vol.Optional("style", default="vivid"): cv.string,
+        vol.Optional("response_format"): vol.In(RESPONSE_FORMATS),
+        vol.Optional("refresh", default=False): cv.boolean,
+    })
+
+    GET_PROMPT_HISTORY_SCHEMA = vol.Schema({
+        vol.Optional("entry_id"): cv.string,
+        vol.Optional("limit"): vol.All(vol.Coerce(int), vol.Range(min=1)),
+        vol.Optional("since"): cv.datetime,
     })
 
     # Register services
+    hass.services.async_register(DOMAIN, 'create_chatgpt_prompt', create_gpt_prompt_service, schema=CREATE_CHATGPT_PROMPT_SCHEMA)
     hass.services.async_register(DOMAIN, 'create_dalle2_image', create_dalle2_image_service, schema=CREATE_DALLE2_IMAGE_SCHEMA)
     hass.services.async_register(DOMAIN, 'create_dalle3_image', create_dalle3_image_service, schema=CREATE_DALLE3_IMAGE_SCHEMA)
+    hass.services.async_register(
+        DOMAIN, 'generate_scene', generate_scene_service,
+        schema=GENERATE_SCENE_SCHEMA, supports_response=SupportsResponse.OPTIONAL
+    )
+    hass.services.async_register(
+        DOMAIN, 'get_prompt_history', get_prompt_history_service,
+        schema=GET_PROMPT_HISTORY_SCHEMA, supports_response=SupportsResponse.ONLY
+    )
 
+@websocket_api.websocket_command({
+    vol.Required("type"): f"{DOMAIN}/prompt_history",
+    vol.Optional("entry_id"): str,
+    vol.Optional("limit"): vol.All(vol.Coerce(int), vol.Range(min=1)),
+})
+@callback
+def websocket_prompt_history(hass: HomeAssistant, connection, msg):
+    """Return the prompt history of an entry, or the first entry, to the frontend."""
+    try:
+        config_data = _entry_config_data(hass, msg.get("entry_id"))
+    except HomeAssistantError as err:
+        connection.send_error(msg["id"], websocket_api.ERR_NOT_FOUND, str(err))
+        return
+    connection.send_result(msg["id"], {
+        "entry_id": config_data["entry_id"],
+        "prompts": config_data["prompt_history"].async_get(limit=msg.get("limit")),
+    })
 
-    # At the end of the setup process, after successfully setting up
-    hass.data[DOMAIN]['setup_complete'] = True
-    _LOGGER.debug("Integration setup completed successfully.")
-
-    return True
+@websocket_api.websocket_command({
+    vol.Required("type"): f"{DOMAIN}/subscribe_prompt_stream",
+    vol.Optional("entry_id"): str,
+})
+@callback
+def websocket_subscribe_prompt_stream(hass: HomeAssistant, connection, msg):
+    """Send the prompt of an entry, or the first entry, as it streams in.
+
+    The prompts sensor only shows the first words, so the recorder doesn't get
+    a row per update. Events carry chatgpt_in and the text so far in
+    chatgpt_out, which is None when the stream failed.
+    """
+    try:
+        config_data = _entry_config_data(hass, msg.get("entry_id"))
+    except HomeAssistantError as err:
+        connection.send_error(msg["id"], websocket_api.ERR_NOT_FOUND, str(err))
+        return
+
+    @callback
+    def forward(data):
+        connection.send_message(websocket_api.event_message(msg["id"], data))
+
+    connection.subscriptions[msg["id"]] = async_dispatcher_connect(
+        hass, SIGNAL_PROMPTS_STREAMING.format(config_data["entry_id"]), forward
+    )
+    connection.send_result(msg["id"])
 
 async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Handle unloading of weathercanvasai integration."""
-    unload_ok = all(
-        await asyncio.gather(
-            *[hass.config_entries.async_forward_entry_unload(entry, platform) for platform in PLATFORMS]
-        )
-    )
-
-    # Deregister custom services
-    hass.services.async_remove(DOMAIN, 'create_chatgpt_prompt')
-    hass.services.async_remove(DOMAIN, 'create_dalle2_image')
-    hass.services.async_remove(DOMAIN, 'create_dalle3_image')
-
-    # Remove data stored in hass.data
-    if DOMAIN in hass.data:
+    unload_ok = await hass.config_entries.async_unload_platforms(entry, PLATFORMS)
+
+    domain_data = hass.data.get(DOMAIN)
+    if not domain_data:
+        return unload_ok
+
+    # Remove the entry's data from hass.data
+    config_data = domain_data.pop(entry.entry_id, None)
+    if domain_data.get("scheduler_sensor_entry") == entry.entry_id:
+        # The next entry set up adds the scheduler's sensor
+        domain_data.pop("scheduler_sensor_entry")
+    if config_data:
+        for tracker_key in ('scene_trigger', 'day_segments'):
+            if config_data.get(tracker_key):
+                config_data[tracker_key].async_stop()
+        for store_key in ('image_index', 'prompt_cache', 'image_store', 'prompt_history'):
+            if config_data.get(store_key):
+                await config_data[store_key].async_flush()
+
+    # The last entry deregisters the services, closes the pooled HTTP client and stops the encoder
+    if not _loaded_entry_ids(hass):
+        for service in SERVICES:
+            hass.services.async_remove(DOMAIN, service)
         hass.data.pop(DOMAIN)
+        for shared_key in ('http_client', 'image_encoder'):
+            if domain_data.get(shared_key):
+                await domain_data[shared_key].async_close()
 
     return unload_ok
 
+async def async_migrate_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
+    """Migrate entries created before multiple locations were supported."""
+    if entry.version == 1:
+        # Keep the images in www and the storage files without an entry id, and follow the home location
+        hass.config_entries.async_update_entry(
+            entry, data={**entry.data, "legacy_storage": True, "follow_home": True}, version=2
+        )
+        _LOGGER.debug(f"Migrated {entry.title} to version 2")
+    return True
+
+async def async_refresh_location_name(hass: HomeAssistant, entry: ConfigEntry):
+    """Reverse geocode the new home location and store its name in the entry.
+
+    The key was validated when the entry was created, so a cached name will do.
+    """
+    success, error, location_name = await test_googlemaps_api(hass, entry.data.get("googlemaps_api_key"))
+    if not success:
+        _LOGGER.warning(f"Keeping location name {entry.data.get('location_name')}, geocoding the new home location failed: {error}")
+        return
+    if location_name and location_name != entry.data.get("location_name"):
+        _LOGGER.info(f"Home location moved, location name is now {location_name}")
+        # Updating the entry reloads it with the new name
+        hass.config_entries.async_update_entry(entry, data={**entry.data, "location_name": location_name})
+
 async def options_update_listener(hass: HomeAssistant, entry: ConfigEntry):
     """Handle options update."""
     await hass.config_entries.async_reload(entry.entry_id)
-
@@ -1,15 +1,25 @@
-import aiohttp
+import asyncio
+import datetime
 import logging
-import json
-import googlemaps
+import aiohttp
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
+from homeassistant.helpers.storage import Store
 
-from .const import DEFAULT_GPT_MODEL_NAME
+from .const import (
+    DOMAIN,
+    DEFAULT_GPT_MODEL_NAME,
+    OPENAI_API_BASE,
+    GEOCODE_URL,
+    GEOCODE_TIMEOUT,
+    GEOCODE_PRECISION,
+    GEOCODE_STORAGE_VERSION,
+)
 _LOGGER = logging.getLogger(__name__)
 
 
-async def test_openai_api(api_key):
+async def test_openai_api(hass, api_key):
 
-    url = "https://api.openai.com/v1/chat/completions"
+    url = f"{OPENAI_API_BASE}/chat/completions"
     _LOGGER.debug(url)
     headers = {
         "Authorization": f"Bearer {api_key}",
@@ -24,46 +34,77 @@ async def test_openai_api(api_key):
     }
 
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, headers=headers, json=data) as response:
-                if response.status == 200:
-                    # If the request was successful, the API key is valid
-                    return True, None
-                else:
-                    # If the request failed, the API key might be invalid
-                    response_text = await response.text()
-                    _LOGGER.error('OpenAI API returned an error: %s', response_text)
-                    return False, response_text
+        # Use Home Assistant's shared, pooled session; the integration's own client
+        # only exists once the entry is set up
+        session = async_get_clientsession(hass)
+        async with session.post(url, headers=headers, json=data) as response:
+            if response.status == 200:
+                # If the request was successful, the API key is valid
+                return True, None
+            else:
+                # If the request failed, the API key might be invalid
+                response_text = await response.text()
+                _LOGGER.error('OpenAI API returned an error: %s', response_text)
+                return False, response_text
     except Exception as e:
         _LOGGER.error('Error testing OpenAI API: %s', e)
         return False, str(e)
 
-async def test_googlemaps_api(hass, googlemaps_api_key):
-    try:
-        # Retrieve the latitude and longitude from Home Assistant's core configuration
-        latitude = hass.config.latitude
-        longitude = hass.config.longitude
-
-        # Initialize the Google Maps client
-        gmaps = googlemaps.Client(key=googlemaps_api_key)
-
-        # Define a local function for the blocking call
-        def _reverse_geocode():
-            test_location = (latitude, longitude)
-            return gmaps.reverse_geocode(test_location)
+async def test_googlemaps_api(hass, googlemaps_api_key, refresh=False):
+    """Return (success, error, location name) for Home Assistant's home location.
 
-        # Perform a simple reverse geocode test
-        googlemaps_response = await hass.async_add_executor_job(_reverse_geocode)
+    Without refresh the name comes from the geocode cache when this location
+    was looked up before, without calling Google Maps, so the key isn't
+    checked. Validating a key needs refresh=True; the result is cached then.
+    """
+    # Retrieve the latitude and longitude from Home Assistant's core configuration
+    latitude = hass.config.latitude
+    longitude = hass.config.longitude
+    key = location_key(latitude, longitude)
 
-        if googlemaps_response:
-            formatted_location_name = format_location_name(googlemaps_response)
-            return True, None, formatted_location_name
-        else:
-            return False, "No response from Google Maps API", None
+    store = Store(hass, GEOCODE_STORAGE_VERSION, f"{DOMAIN}.geocode")
+    cache = await store.async_load() or {}
+    if not refresh and key in cache:
+        _LOGGER.debug(f"Location name for {key} from the geocode cache: {cache[key]['location_name']}")
+        return True, None, cache[key]["location_name"]
 
-    except Exception as e:
+    try:
+        geocode_result = await async_reverse_geocode(hass, googlemaps_api_key, latitude, longitude)
+    except GeocodeError as e:
         _LOGGER.error('Error testing Google Maps API: %s', e)
         return False, str(e), None
+    if not geocode_result:
+        return False, "No response from Google Maps API", None
+
+    formatted_location_name = format_location_name(geocode_result)
+    cache[key] = {"location_name": formatted_location_name, "updated": datetime.datetime.now().isoformat()}
+    await store.async_save(cache)
+    return True, None, formatted_location_name
+
+def location_key(latitude, longitude):
+    """Key of the geocode cache; rounded, so small corrections of the home location don't count."""
+    return f"{round(latitude, GEOCODE_PRECISION)},{round(longitude, GEOCODE_PRECISION)}"
+
+class GeocodeError(Exception):
+    """Reverse geocoding failed."""
+
+async def async_reverse_geocode(hass, googlemaps_api_key, latitude, longitude):
+    """Reverse geocode with the Geocoding web service over Home Assistant's shared session."""
+    session = async_get_clientsession(hass)
+    params = {"latlng": f"{latitude},{longitude}", "key": googlemaps_api_key}
+    try:
+        async with session.get(GEOCODE_URL, params=params, timeout=aiohttp.ClientTimeout(total=GEOCODE_TIMEOUT)) as response:
+            if response.status != 200:
+                raise GeocodeError(f"Google Maps API returned status {response.status}")
+            result = await response.json()
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        raise GeocodeError(str(e) or "Timeout calling Google Maps API") from e
+    status = result.get("status")
+    if status == "ZERO_RESULTS":
+        return []
+    if status != "OK":
+        raise GeocodeError(result.get("error_message") or status)
+    return result.get("results", [])
 
 def format_location_name(geocode_result):
     # Initialize variables
@@ -1,103 +1,111 @@
 from homeassistant.components.camera import Camera
 from homeassistant.helpers.dispatcher import async_dispatcher_connect
-from homeassistant.helpers.aiohttp_client import async_get_clientsession
-from homeassistant.helpers.network import get_url
-import aiohttp
 import logging
-import requests
 from datetime import datetime
-from .const import DOMAIN
+from .const import DOMAIN, SIGNAL_CAMERA_UPDATED
+from .metrics import async_executor_job
+from .encoding import content_type
+from .entity import entry_device_info
 
 _LOGGER = logging.getLogger(__name__)
 
 class weathercanvasaiCamera(Camera):
-    def __init__(self, hass, entry_id, name):
+    _attr_has_entity_name = True
+
+    def __init__(self, hass, entry_id, name, device_info=None):
         """Initialize the camera."""
         super().__init__()
         self.hass = hass
         self.entry_id = entry_id
         self._name = name
+        self._attr_device_info = device_info
         self._attr_unique_id = entry_id  # Use entry_id as the unique ID
         self._state = "Initial State"  # Default state
         self._attr_icon = 'mdi:camera'  # Set the icon here
+        # Path of the latest image file, handed over by the generation pipeline,
+        # or at startup the image shown before the restart
+        self._config_data = hass.data[DOMAIN][entry_id]
+        self._image_path = self._config_data.get('latest_image_path')
         self._attributes = {
-            "last_image_update": datetime.now().isoformat()
+            "last_image_update": self._last_image_update()
         }
-        self._image_url = None
+        if self._image_path:
+            self.content_type = content_type(self._image_path)
+            self._attributes["image_url"] = self._config_data.get('latest_image_url')
         self._cached_image = None
-        self._cached_url = None
-
-    
-    async def async_added_to_hass(self):
-        # This method is called when the camera is added to Home Assistant
-        # Register an update listener
-        self.async_on_remove(
-            async_dispatcher_connect(self.hass, DOMAIN, self._update_image_url)
-        )
+        self._cached_path = None
 
     @property
     def name(self):
         """Return the name of this camera."""
         return self._name
 
+    @property
+    def extra_state_attributes(self):
+        """Return the camera state attributes."""
+        return self._attributes
+
     async def async_camera_image(self, width=None, height=None):
         """Return the image of this camera in bytes."""
-        #_LOGGER.debug("Fetching camera image.")
-        #_LOGGER.debug("Current image URL: %s", self._image_url)
-        if self._image_url:
-            # Check if the URL has changed since the last fetch
-            if self._image_url == self._cached_url:
-                #_LOGGER.debug("Returning cached image.")
+        if self._image_path:
+            if width or height:
+                # Serve a cached, resized copy to dashboard tiles and phones, in the image's
+                # own format so content_type holds for it too
+                thumbnail_cache = self._config_data['thumbnail_cache']
+                thumbnail = await thumbnail_cache.async_get(self._image_path, width, height)
+                if thumbnail is not None:
+                    return thumbnail
+
+            # Only touch the disk when a new image was generated
+            if self._image_path == self._cached_path:
                 return self._cached_image
 
-            # URL has changed, fetch new image
-            session = async_get_clientsession(self.hass)
-            new_image = await self._fetch_image_from_url(session, self._image_url)
+            new_image = await async_executor_job(self.hass, self._config_data.get('metrics'), self._read_image, self._image_path)
+            if new_image is None:
+                return self._cached_image
 
             # Update cache
             self._cached_image = new_image
-            self._cached_url = self._image_url
+            self._cached_path = self._image_path
             return new_image
 
-        _LOGGER.warning("No image URL set for camera; returning None.")
+        _LOGGER.warning("No image set for camera; returning None.")
         return None
 
-    async def _fetch_image_from_url(self, session, url):
-        """Fetch and return image from the URL using the provided session."""
+    def _last_image_update(self):
+        published = self._config_data.get('latest_image_published')
+        return published.isoformat() if published else datetime.now().isoformat()
+
+    @staticmethod
+    def _read_image(path):
+        """Read the image file; runs in the executor."""
         try:
-            async with session.get(url) as response:
-                response.raise_for_status()
-                return await response.read()
-        except aiohttp.ClientError as err:
-            _LOGGER.error("Error fetching camera image: %s", err)
+            with open(path, 'rb') as file:
+                return file.read()
+        except OSError as err:
+            _LOGGER.error("Error reading camera image %s: %s", path, err)
             return None
-               
+
     async def async_added_to_hass(self):
         """Register callbacks when entity is added."""
-        self._remove_signal = async_dispatcher_connect(
-            self.hass, 
-            "update_weathercanvasai_camera", 
-            self._update_image_url
+        self.async_on_remove(
+            async_dispatcher_connect(
+                self.hass,
+                SIGNAL_CAMERA_UPDATED.format(self.entry_id),
+                self._update_image_path
+            )
         )
 
-    async def async_will_remove_from_hass(self):
-        """Disconnect dispatcher listener when removed."""
-        if self._remove_signal:
-            self._remove_signal()
-
-    async def _update_image_url(self):
-        # Fetch the latest image URL from the domain
-        self._image_url = self.hass.data[DOMAIN].get('latest_image_full_url')
-        #_LOGGER.debug(f"Camera image URL updated: {self._image_url}")
+    async def _update_image_path(self, file_path):
+        """Switch to the image file the generation pipeline just saved."""
+        self._image_path = file_path
+        # WebP, AVIF or JPEG when an output format is configured
+        self.content_type = content_type(file_path)
+        self._attributes["last_image_update"] = self._last_image_update()
+        # Cacheable URL of the same image, for picture cards that take a URL
+        self._attributes["image_url"] = self._config_data.get('latest_image_url')
+        self.async_write_ha_state()
 
-    def camera_image(self):
-        # Override this method to return the latest image from the stored URL
-        if self._image_url:
-            # Fetch and return the image from the URL
-            response = requests.get(self._image_url)
-            return response.content
-        return None
-    
 async def async_setup_entry(hass, config_entry, async_add_entities):
     """Set up the weathercanvasaiCamera from a config entry."""
-    async_add_entities([weathercanvasaiCamera(hass, config_entry.entry_id, "weathercanvasai Image")])
+    async_add_entities([weathercanvasaiCamera(hass, config_entry.entry_id, "Image", entry_device_info(config_entry))])
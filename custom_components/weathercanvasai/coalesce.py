@@ -0,0 +1,71 @@
+import asyncio
+import logging
+import time
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """Coalesce concurrent calls for the same key into one.
+
+    Callers arriving while a call for their key is running await that call's
+    result instead of starting their own. A successful result is also replayed
+    to callers arriving within `cooldown` seconds after it finished.
+    """
+
+    def __init__(self, cooldown: float):
+        self.cooldown = cooldown
+        self._in_flight = {}
+        self._recent = {}  # key -> (finished monotonic time, result)
+        self.executed = 0
+        self.coalesced = 0
+        self.replayed = 0
+
+    async def async_run(self, key, factory, replay=True):
+        """Return the result of factory() for the key, sharing it with concurrent callers.
+
+        factory is a no-argument callable returning a coroutine. With replay=False
+        a recent result is not reused, but a running call still is.
+        """
+        if key in self._in_flight:
+            self.coalesced += 1
+            _LOGGER.debug(f"Coalescing call for {key}")
+            # Shielded, so one caller being cancelled doesn't cancel the others
+            return await asyncio.shield(self._in_flight[key])
+
+        recent = self._recent.get(key)
+        if replay and recent and time.monotonic() - recent[0] < self.cooldown:
+            self.replayed += 1
+            _LOGGER.debug(f"Replaying result for {key} within the cooldown")
+            return recent[1]
+
+        self.executed += 1
+        task = asyncio.ensure_future(factory())
+        self._in_flight[key] = task
+        try:
+            result = await asyncio.shield(task)
+        finally:
+            if task.done():
+                self._in_flight.pop(key, None)
+            else:
+                # The first caller was cancelled, let the shared call finish for the others
+                task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        self._remember(key, result)
+        return result
+
+    def _remember(self, key, result):
+        now = time.monotonic()
+        # Drop results that left the cooldown window
+        for old_key in [k for k, (finished, _) in self._recent.items() if now - finished >= self.cooldown]:
+            del self._recent[old_key]
+        if result is not None and self.cooldown > 0:
+            self._recent[key] = (now, result)
+
+    def as_dict(self):
+        return {
+            "cooldown_s": self.cooldown,
+            "executed": self.executed,
+            "coalesced": self.coalesced,
+            "replayed": self.replayed,
+            "in_flight": len(self._in_flight),
+        }
@@ -1,3 +1,4 @@
+import asyncio
 import logging
 import types
 from types import MappingProxyType
@@ -5,17 +6,55 @@ from typing import Any, Tuple
 import voluptuous as vol
 from homeassistant import config_entries
 from homeassistant.core import HomeAssistant
-from homeassistant.helpers import config_validation as cv
+from homeassistant.helpers import selector
 from homeassistant.data_entry_flow import FlowResult
 
 from .api_util import test_openai_api, test_googlemaps_api
 from .const import (
     CONF_MAX_IMAGES_RETAINED,
     DEFAULT_MAX_IMAGES_RETAINED,
+    CONF_MAX_IMAGES_MEGABYTES,
+    DEFAULT_MAX_IMAGES_MEGABYTES,
+    CONF_PROMPT_CACHE_TTL_HOURS,
+    DEFAULT_PROMPT_CACHE_TTL_HOURS,
+    CONF_PROMPT_CACHE_VARIANTS,
+    DEFAULT_PROMPT_CACHE_VARIANTS,
+    CONF_IMAGE_REUSE_DAYS,
+    DEFAULT_IMAGE_REUSE_DAYS,
+    CONF_IMAGE_REUSE_VARIANTS,
+    DEFAULT_IMAGE_REUSE_VARIANTS,
+    CONF_IMAGE_STORE_MEGABYTES,
+    DEFAULT_IMAGE_STORE_MEGABYTES,
+    CONF_GENERATION_COOLDOWN,
+    DEFAULT_GENERATION_COOLDOWN,
+    CONF_AUTO_GENERATE,
+    DEFAULT_AUTO_GENERATE,
+    CONF_AUTO_GENERATE_DEBOUNCE,
+    DEFAULT_AUTO_GENERATE_DEBOUNCE,
+    CONF_AUTO_GENERATE_MIN_INTERVAL,
+    DEFAULT_AUTO_GENERATE_MIN_INTERVAL,
     CONF_GPT_MODEL_NAME,
     DEFAULT_GPT_MODEL_NAME,
     CONF_SYSTEM_INSTRUCTION,
     DEFAULT_SYSTEM_INSTRUCTION,
+    CONF_WEATHER_ENTITY,
+    DEFAULT_WEATHER_ENTITY,
+    CONF_SUN_ENTITY,
+    DEFAULT_SUN_ENTITY,
+    CONF_OUTPUT_FORMAT,
+    DEFAULT_OUTPUT_FORMAT,
+    OUTPUT_FORMATS,
+    CONF_OUTPUT_QUALITY,
+    DEFAULT_OUTPUT_QUALITY,
+    CONF_KEEP_PNG_MASTER,
+    DEFAULT_KEEP_PNG_MASTER,
+    CONF_STREAM_PROMPTS,
+    DEFAULT_STREAM_PROMPTS,
+    CONF_PROMPT_HISTORY_SIZE,
+    DEFAULT_PROMPT_HISTORY_SIZE,
+    CONF_RESPONSE_FORMAT,
+    DEFAULT_RESPONSE_FORMAT,
+    RESPONSE_FORMATS,
     DOMAIN,
 )
 _LOGGER = logging.getLogger(__name__)
@@ -33,8 +72,26 @@ STEP_USER_DATA_SCHEMA = vol.Schema({
 DEFAULT_OPTIONS = types.MappingProxyType(
     {
         CONF_MAX_IMAGES_RETAINED: DEFAULT_MAX_IMAGES_RETAINED,
+        CONF_MAX_IMAGES_MEGABYTES: DEFAULT_MAX_IMAGES_MEGABYTES,
         CONF_GPT_MODEL_NAME: DEFAULT_GPT_MODEL_NAME,
         CONF_SYSTEM_INSTRUCTION: DEFAULT_SYSTEM_INSTRUCTION,
+        CONF_RESPONSE_FORMAT: DEFAULT_RESPONSE_FORMAT,
+        CONF_PROMPT_CACHE_TTL_HOURS: DEFAULT_PROMPT_CACHE_TTL_HOURS,
+        CONF_PROMPT_CACHE_VARIANTS: DEFAULT_PROMPT_CACHE_VARIANTS,
+        CONF_IMAGE_REUSE_DAYS: DEFAULT_IMAGE_REUSE_DAYS,
+        CONF_IMAGE_REUSE_VARIANTS: DEFAULT_IMAGE_REUSE_VARIANTS,
+        CONF_IMAGE_STORE_MEGABYTES: DEFAULT_IMAGE_STORE_MEGABYTES,
+        CONF_GENERATION_COOLDOWN: DEFAULT_GENERATION_COOLDOWN,
+        CONF_AUTO_GENERATE: DEFAULT_AUTO_GENERATE,
+        CONF_AUTO_GENERATE_DEBOUNCE: DEFAULT_AUTO_GENERATE_DEBOUNCE,
+        CONF_AUTO_GENERATE_MIN_INTERVAL: DEFAULT_AUTO_GENERATE_MIN_INTERVAL,
+        CONF_WEATHER_ENTITY: DEFAULT_WEATHER_ENTITY,
+        CONF_SUN_ENTITY: DEFAULT_SUN_ENTITY,
+        CONF_OUTPUT_FORMAT: DEFAULT_OUTPUT_FORMAT,
+        CONF_OUTPUT_QUALITY: DEFAULT_OUTPUT_QUALITY,
+        CONF_KEEP_PNG_MASTER: DEFAULT_KEEP_PNG_MASTER,
+        CONF_STREAM_PROMPTS: DEFAULT_STREAM_PROMPTS,
+        CONF_PROMPT_HISTORY_SIZE: DEFAULT_PROMPT_HISTORY_SIZE,
     }
 )
 
@@ -42,15 +99,20 @@ async def validate_input(hass: HomeAssistant, data: dict[str, Any]) -> Tuple[boo
     openai_api_key = data['openai_api_key']
     googlemaps_api_key = data['googlemaps_api_key']
 
-    # Test the OpenAI API key
-    openai_test_success, openai_error = await test_openai_api(openai_api_key)
-    if not openai_test_success:
-        return False, openai_error or 'openai_api_test_fail', '', None
-
-    # Test the Google Maps API key
-    googlemaps_test_success, googlemaps_error, google_location_name = await test_googlemaps_api(hass, googlemaps_api_key)
-    if not googlemaps_test_success:
-        return False, '', googlemaps_error or 'googlemaps_api_test_fail', None
+    # Test both API keys at the same time
+    (openai_test_success, openai_error), (googlemaps_test_success, googlemaps_error, google_location_name) = await asyncio.gather(
+        test_openai_api(hass, openai_api_key),
+        # Always a real lookup, the cache would accept any key
+        test_googlemaps_api(hass, googlemaps_api_key, refresh=True),
+    )
+    if not openai_test_success or not googlemaps_test_success:
+        # Both ran, so report every key that failed
+        return (
+            False,
+            '' if openai_test_success else openai_error or 'openai_api_test_fail',
+            '' if googlemaps_test_success else googlemaps_error or 'googlemaps_api_test_fail',
+            None,
+        )
 
     # If both tests pass, return success along with the location name
     return True, '', '', google_location_name
@@ -59,22 +121,17 @@ async def validate_input(hass: HomeAssistant, data: dict[str, Any]) -> Tuple[boo
 class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
     """Handle a config flow for generating Weather Images."""
 
-    VERSION = 1
+    # Version 2 keeps each entry's images and caches apart, see async_migrate_entry
+    VERSION = 2
   
     def __init__(self):
         """Initialize the config flow."""
+        self.location_name = None
 
     async def async_step_user(self, user_input=None):
         """Handle the initial user input configuration step."""
         errors = {}
 
-        # Check the number of current entries and abort if any exists
-        current_entries = self._async_current_entries()
-        _LOGGER.debug(f"Current entries: {current_entries}")
-        if len(current_entries) > 0:
-            errors["base"] = "single_instance_allowed"
-            return self.async_show_form(step_id="user", errors=errors)
-
         if user_input is not None:
             success, openai_error, googlemaps_error, google_location_name = await validate_input(self.hass, user_input)
 
@@ -97,10 +154,8 @@ class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
                 self.max_images_retained = user_input['max_images_retained']
                 self.system_instruction = user_input['system_instruction']
 
-                # Store the location name in hass.data
-                if self.hass.data.get(DOMAIN) is None:
-                    self.hass.data[DOMAIN] = {}
-                self.hass.data[DOMAIN]['temporary_location_name'] = google_location_name
+                # The name of Home Assistant's home location, suggested in the next step
+                self.location_name = google_location_name
 
                 # Proceed to the location step
                 return await self.async_step_location()
@@ -116,26 +171,37 @@ class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
         errors = {}
 
         if user_input is not None:
-            # Use the stored location name
-            location_name = self.hass.data[DOMAIN].get('temporary_location_name', "Unknown Location")
+            location_name = user_input.get('location_name', self.location_name or "Unknown Location")
 
             # Create the final configuration with the user-provided or stored location name
             final_configuration = {
                 'openai_api_key': self.openai_api_key,
                 'googlemaps_api_key': self.googlemaps_api_key,
                 'gpt_model_name': self.gpt_model_name,
-                'location_name': user_input.get('location_name', location_name),
+                'location_name': location_name,
                 'max_images_retained': self.max_images_retained,
-                'system_instruction': self.system_instruction
+                'system_instruction': self.system_instruction,
+                # Only the home location's own name follows Home Assistant's home location around
+                'follow_home': location_name == self.location_name,
             }
 
-            # Create the configuration entry
-            return self.async_create_entry(title="Weather Canvas AI", data=final_configuration)
+            # Create the configuration entry, one per location
+            return self.async_create_entry(
+                title=location_name,
+                data=final_configuration,
+                options={
+                    CONF_WEATHER_ENTITY: user_input[CONF_WEATHER_ENTITY],
+                    CONF_SUN_ENTITY: user_input[CONF_SUN_ENTITY],
+                },
+            )
 
-        # Form for finalizing location
-        stored_location_name = self.hass.data[DOMAIN].get('temporary_location_name', "Enter location")
+        # Form for finalizing location and its weather and sun sources
         data_schema = vol.Schema({
-            vol.Required('location_name', default=stored_location_name): str,
+            vol.Required('location_name', default=self.location_name or "Enter location"): str,
+            vol.Required(CONF_WEATHER_ENTITY, default=DEFAULT_WEATHER_ENTITY): selector.EntitySelector(
+                selector.EntitySelectorConfig(domain="weather")
+            ),
+            vol.Required(CONF_SUN_ENTITY, default=DEFAULT_SUN_ENTITY): selector.EntitySelector(),
         })
 
         # Show the form again with any errors
@@ -180,6 +246,10 @@ def openai_config_option_schema(options: MappingProxyType[str, Any]) -> dict:
             CONF_MAX_IMAGES_RETAINED,
             default=options.get(CONF_MAX_IMAGES_RETAINED, DEFAULT_MAX_IMAGES_RETAINED),
         ): int,
+        vol.Required(
+            CONF_MAX_IMAGES_MEGABYTES,
+            default=options.get(CONF_MAX_IMAGES_MEGABYTES, DEFAULT_MAX_IMAGES_MEGABYTES),
+        ): vol.All(vol.Coerce(int), vol.Range(min=0)),
         vol.Required(
             CONF_GPT_MODEL_NAME,
             default=options.get(CONF_GPT_MODEL_NAME, DEFAULT_GPT_MODEL_NAME),
@@ -188,5 +258,73 @@ def openai_config_option_schema(options: MappingProxyType[str, Any]) -> dict:
             CONF_SYSTEM_INSTRUCTION,
             default=options.get(CONF_SYSTEM_INSTRUCTION, DEFAULT_SYSTEM_INSTRUCTION),
         ): str,
+        vol.Required(
+            CONF_RESPONSE_FORMAT,
+            default=options.get(CONF_RESPONSE_FORMAT, DEFAULT_RESPONSE_FORMAT),
+        ): vol.In(RESPONSE_FORMATS),
+        vol.Required(
+            CONF_PROMPT_CACHE_TTL_HOURS,
+            default=options.get(CONF_PROMPT_CACHE_TTL_HOURS, DEFAULT_PROMPT_CACHE_TTL_HOURS),
+        ): vol.All(vol.Coerce(int), vol.Range(min=0)),
+        vol.Required(
+            CONF_PROMPT_CACHE_VARIANTS,
+            default=options.get(CONF_PROMPT_CACHE_VARIANTS, DEFAULT_PROMPT_CACHE_VARIANTS),
+        ): vol.All(vol.Coerce(int), vol.Range(min=1)),
+        vol.Required(
+            CONF_IMAGE_REUSE_DAYS,
+            default=options.get(CONF_IMAGE_REUSE_DAYS, DEFAULT_IMAGE_REUSE_DAYS),
+        ): vol.All(vol.Coerce(int), vol.Range(min=0)),
+        vol.Required(
+            CONF_IMAGE_REUSE_VARIANTS,
+            default=options.get(CONF_IMAGE_REUSE_VARIANTS, DEFAULT_IMAGE_REUSE_VARIANTS),
+        ): vol.All(vol.Coerce(int), vol.Range(min=1)),
+        vol.Required(
+            CONF_IMAGE_STORE_MEGABYTES,
+            default=options.get(CONF_IMAGE_STORE_MEGABYTES, DEFAULT_IMAGE_STORE_MEGABYTES),
+        ): vol.All(vol.Coerce(int), vol.Range(min=1)),
+        vol.Required(
+            CONF_GENERATION_COOLDOWN,
+            default=options.get(CONF_GENERATION_COOLDOWN, DEFAULT_GENERATION_COOLDOWN),
+        ): vol.All(vol.Coerce(int), vol.Range(min=0)),
+        vol.Required(
+            CONF_AUTO_GENERATE,
+            default=options.get(CONF_AUTO_GENERATE, DEFAULT_AUTO_GENERATE),
+        ): bool,
+        vol.Required(
+            CONF_AUTO_GENERATE_DEBOUNCE,
+            default=options.get(CONF_AUTO_GENERATE_DEBOUNCE, DEFAULT_AUTO_GENERATE_DEBOUNCE),
+        ): vol.All(vol.Coerce(int), vol.Range(min=0)),
+        vol.Required(
+            CONF_AUTO_GENERATE_MIN_INTERVAL,
+            default=options.get(CONF_AUTO_GENERATE_MIN_INTERVAL, DEFAULT_AUTO_GENERATE_MIN_INTERVAL),
+        ): vol.All(vol.Coerce(int), vol.Range(min=0)),
+        vol.Required(
+            CONF_WEATHER_ENTITY,
+            default=options.get(CONF_WEATHER_ENTITY, DEFAULT_WEATHER_ENTITY),
+        ): selector.EntitySelector(selector.EntitySelectorConfig(domain="weather")),
+        vol.Required(
+            CONF_SUN_ENTITY,
+            default=options.get(CONF_SUN_ENTITY, DEFAULT_SUN_ENTITY),
+        ): selector.EntitySelector(),
+        vol.Required(
+            CONF_OUTPUT_FORMAT,
+            default=options.get(CONF_OUTPUT_FORMAT, DEFAULT_OUTPUT_FORMAT),
+        ): vol.In(OUTPUT_FORMATS),
+        vol.Required(
+            CONF_OUTPUT_QUALITY,
+            default=options.get(CONF_OUTPUT_QUALITY, DEFAULT_OUTPUT_QUALITY),
+        ): vol.All(vol.Coerce(int), vol.Range(min=1, max=100)),
+        vol.Required(
+            CONF_KEEP_PNG_MASTER,
+            default=options.get(CONF_KEEP_PNG_MASTER, DEFAULT_KEEP_PNG_MASTER),
+        ): bool,
+        vol.Required(
+            CONF_STREAM_PROMPTS,
+            default=options.get(CONF_STREAM_PROMPTS, DEFAULT_STREAM_PROMPTS),
+        ): bool,
+        vol.Required(
+            CONF_PROMPT_HISTORY_SIZE,
+            default=options.get(CONF_PROMPT_HISTORY_SIZE, DEFAULT_PROMPT_HISTORY_SIZE),
+        ): vol.All(vol.Coerce(int), vol.Range(min=0)),
     }
   
\ No newline at end of file
@@ -5,3 +5,126 @@ CONF_SYSTEM_INSTRUCTION = "system_instruction"
 DEFAULT_SYSTEM_INSTRUCTION ="Create a succinct DALL-E prompt under 100 words, that will create an artistic image, focusing on the most visually striking aspects of the given city/region, weather, and time of day. Highlight key elements that define the scene's character, such as specific landmarks, weather effects, folklore or cultural features, in a direct and vivid manner. Avoid elaborate descriptions; instead, aim for a prompt that vividly captures the essence of the scene in a concise format, suitable for generating a distinct and compelling image."
 CONF_MAX_IMAGES_RETAINED = "max_images_retained"
 DEFAULT_MAX_IMAGES_RETAINED = 5
+CONF_MAX_IMAGES_MEGABYTES = "max_images_megabytes"
+DEFAULT_MAX_IMAGES_MEGABYTES = 0  # 0 disables the byte budget
+CONF_PROMPT_CACHE_TTL_HOURS = "prompt_cache_ttl_hours"
+DEFAULT_PROMPT_CACHE_TTL_HOURS = 72  # 0 disables the prompt cache
+CONF_PROMPT_CACHE_VARIANTS = "prompt_cache_variants"
+DEFAULT_PROMPT_CACHE_VARIANTS = 3
+CONF_IMAGE_REUSE_DAYS = "image_reuse_days"
+DEFAULT_IMAGE_REUSE_DAYS = 7  # 0 disables the image store
+CONF_IMAGE_REUSE_VARIANTS = "image_reuse_variants"
+DEFAULT_IMAGE_REUSE_VARIANTS = 3
+CONF_IMAGE_STORE_MEGABYTES = "image_store_megabytes"
+DEFAULT_IMAGE_STORE_MEGABYTES = 200
+CONF_GENERATION_COOLDOWN = "generation_cooldown"
+DEFAULT_GENERATION_COOLDOWN = 30  # seconds an identical image request returns the last result
+CONF_AUTO_GENERATE = "auto_generate"
+DEFAULT_AUTO_GENERATE = False
+CONF_AUTO_GENERATE_DEBOUNCE = "auto_generate_debounce"
+DEFAULT_AUTO_GENERATE_DEBOUNCE = 120  # seconds a scene change has to hold
+CONF_AUTO_GENERATE_MIN_INTERVAL = "auto_generate_min_interval"
+DEFAULT_AUTO_GENERATE_MIN_INTERVAL = 60  # minutes between automatic generations
+CONF_WEATHER_ENTITY = "weather_entity"
+DEFAULT_WEATHER_ENTITY = "weather.forecast_home"
+CONF_SUN_ENTITY = "sun_entity"
+DEFAULT_SUN_ENTITY = "sun.sun"
+CONF_OUTPUT_FORMAT = "output_format"
+DEFAULT_OUTPUT_FORMAT = "png"  # png keeps the image as DALL-E returned it
+OUTPUT_FORMAT_PNG = "png"
+OUTPUT_FORMATS = ["png", "webp", "avif", "jpeg"]
+CONF_OUTPUT_QUALITY = "output_quality"
+DEFAULT_OUTPUT_QUALITY = 80
+CONF_KEEP_PNG_MASTER = "keep_png_master"
+DEFAULT_KEEP_PNG_MASTER = False
+CONF_STREAM_PROMPTS = "stream_prompts"
+DEFAULT_STREAM_PROMPTS = False
+CONF_PROMPT_HISTORY_SIZE = "prompt_history_size"
+DEFAULT_PROMPT_HISTORY_SIZE = 200  # prompts kept in the prompt history, 0 disables it
+CONF_RESPONSE_FORMAT = "response_format"
+DEFAULT_RESPONSE_FORMAT = "url"
+RESPONSE_FORMATS = ["url", "b64_json"]
+
+# Automatic generation
+AUTO_GENERATE_TEMPERATURE_HYSTERESIS = 1.0  # °C past a temperature band edge
+AUTO_GENERATE_CLOUD_HYSTERESIS = 5  # % cloud coverage past a cloud bucket edge
+
+# Reverse geocoding
+GEOCODE_URL = "https://maps.googleapis.com/maps/api/geocode/json"
+GEOCODE_TIMEOUT = 15  # seconds
+GEOCODE_PRECISION = 3  # decimals of the cache key, about 100 m
+GEOCODE_STORAGE_VERSION = 1
+
+# Metrics
+METRICS_SAMPLES = 500  # latency samples kept per stage for the percentiles
+
+# Day segments
+EVENT_DAY_SEGMENT_CHANGED = "weathercanvasai_day_segment_changed"
+
+# Dispatcher signals, formatted with the config entry id
+SIGNAL_PROMPTS_UPDATED = "update_weathercanvasai_sensor_{}"
+SIGNAL_PROMPTS_STREAMING = "update_weathercanvasai_sensor_partial_{}"
+SIGNAL_IMAGE_UPDATED = "update_weathercanvasai_image_sensor_{}"
+SIGNAL_CAMERA_UPDATED = "update_weathercanvasai_camera_{}"
+SIGNAL_DAY_SEGMENT_UPDATED = "update_weathercanvasai_day_segment_sensor_{}"
+
+# Shared HTTP client
+OPENAI_API_BASE = "https://api.openai.com/v1"
+HTTP_LIMIT = 20
+HTTP_LIMIT_PER_HOST = 4
+HTTP_KEEPALIVE_TIMEOUT = 60  # seconds an idle connection is kept open
+HTTP_DNS_CACHE_TTL = 300  # seconds
+HTTP_CONNECT_TIMEOUT = 15
+HTTP_TOTAL_TIMEOUT = 180  # DALL-E 3 HD generations can take well over a minute
+CHAT_COMPLETION_TIMEOUT = 60
+
+# Prompt compiler
+PROMPT_MAX_TOKENS = 256  # max_tokens when the system instruction doesn't ask for a length
+PROMPT_TOKENS_PER_WORD = 1.4  # English text, a little above the usual 1.3 so prompts aren't cut off
+PROMPT_MAX_TOKENS_MARGIN = 16  # tokens on top of the asked length
+PROMPT_STREAM_UPDATE_INTERVAL = 1.0  # seconds between updates of a prompt while it streams in
+
+# Request scheduler
+SCHEDULER_MAX_ATTEMPTS = 4  # including the first one
+SCHEDULER_BACKOFF_BASE = 1.0  # seconds, doubled per attempt
+SCHEDULER_BACKOFF_MAX = 30.0  # seconds
+SCHEDULER_RATE_WINDOW = 60  # seconds, OpenAI limits are per minute
+SCHEDULER_MAX_CONCURRENCY = 4  # OpenAI calls in flight across all entries
+
+# Image download
+IMAGE_CHUNK_SIZE = 64 * 1024  # bytes per streamed chunk, bounds peak memory of a download
+
+# Image encoding
+ENCODER_PROCESSES = 1  # worker processes transcoding images, shared by all entries
+
+# Image view
+IMAGE_VIEW_PATH = "/api/weathercanvasai/images"  # followed by the entry id and the path below the entry's image directory
+IMAGE_CACHE_CONTROL = "public, max-age=31536000, immutable"  # image names are content hashed, their bytes never change
+
+# Camera thumbnails
+THUMBNAIL_BUCKETS = (160, 320, 480, 640, 800, 960)  # pixels, requests round up to the next bucket
+THUMBNAIL_EAGER_BUCKETS = (320, 640)  # common dashboard tile widths, resized right after saving
+THUMBNAIL_CACHE_MAX_BYTES = 8 * 1024 * 1024
+THUMBNAIL_ENTRY_BYTES = 256  # counted per cached entry on top of the thumbnail, for the key and bookkeeping
+THUMBNAIL_QUALITY = 85  # JPEG, WebP and AVIF thumbnails
+
+# Image retention index
+IMAGE_INDEX_STORAGE_VERSION = 1
+IMAGE_INDEX_SAVE_DELAY = 10  # seconds
+
+# Prompt cache
+PROMPT_CACHE_STORAGE_VERSION = 1
+PROMPT_CACHE_SAVE_DELAY = 30  # seconds
+PROMPT_CACHE_MAX_ENTRIES = 200
+PROMPT_CACHE_TEMPERATURE_BUCKET = 5  # °C
+PROMPT_CACHE_CLOUD_BUCKET = 25  # % cloud coverage
+
+# Prompt history
+PROMPT_HISTORY_STORAGE_VERSION = 1
+PROMPT_HISTORY_SAVE_DELAY = 60  # seconds
+
+# Image store
+IMAGE_STORE_DIRECTORY = "weathercanvasai"  # below the www directory, also holds a directory of images per entry
+IMAGE_STORE_SUBDIRECTORY = "store"  # below an entry's image directory
+IMAGE_STORE_STORAGE_VERSION = 1
+IMAGE_STORE_SAVE_DELAY = 30  # seconds
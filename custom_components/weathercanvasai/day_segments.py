@@ -0,0 +1,194 @@
+import bisect
+import datetime
+import logging
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.dispatcher import async_dispatcher_send
+from homeassistant.helpers.event import async_track_state_change_event, async_track_point_in_utc_time
+from homeassistant.util import dt as dt_util
+
+from .const import EVENT_DAY_SEGMENT_CHANGED, SIGNAL_DAY_SEGMENT_UPDATED
+
+_LOGGER = logging.getLogger(__name__)
+
+# Ten equal segments between sunrise and sunset, and between sunset and sunrise
+DAY_SEGMENTS = (
+    "sunrise",
+    "early morning",
+    "mid-morning",
+    "late morning",
+    "noon",
+    "early afternoon",
+    "mid-afternoon",
+    "late afternoon",
+    "dusk",
+    "sunset",
+)
+NIGHT_SEGMENTS = (
+    "twilight",
+    "early night",
+    "nightfall",
+    "midnight hours",
+    "late night",
+    "deep night",
+    "quiet hours",
+    "pre-dawn",
+    "dawn's first light",
+    "dawn",
+)
+UNKNOWN_SEGMENT = "Unknown time"
+
+
+class DaySegmentSchedule:
+    """Segment boundaries of the current day or night period, searched with bisect.
+
+    Built from sun.sun's full next_rising/next_setting datetimes: while the sun
+    is up the day started one day before next_rising and ends at next_setting,
+    while it is down the night started one day before next_setting and ends at
+    next_rising. Using full datetimes keeps the fraction right across midnight.
+    """
+
+    def __init__(self, period, start, end):
+        self.period = period
+        self.start = start
+        self.end = end
+        self.names = DAY_SEGMENTS if period == "day" else NIGHT_SEGMENTS
+        step = (end - start) / len(self.names)
+        self.boundaries = [start + step * index for index in range(len(self.names))]
+
+    @classmethod
+    def from_sun_state(cls, sun_state):
+        """Build the schedule from the sun.sun state, or return None if it's unusable."""
+        if sun_state is None:
+            return None
+        try:
+            next_rising = dt_util.parse_datetime(sun_state.attributes["next_rising"])
+            next_setting = dt_util.parse_datetime(sun_state.attributes["next_setting"])
+        except (KeyError, TypeError):
+            return None
+        if next_rising is None or next_setting is None:
+            return None
+        one_day = datetime.timedelta(days=1)
+        if sun_state.state == "above_horizon":
+            return cls("day", next_rising - one_day, next_setting)
+        return cls("night", next_setting - one_day, next_rising)
+
+    def segment_index(self, now):
+        # Before the first boundary clamps to the first segment, after the end to the last
+        return max(0, bisect.bisect_right(self.boundaries, now) - 1)
+
+    def segment(self, now):
+        return self.names[self.segment_index(now)]
+
+    def next_transition(self, now):
+        """Return the next segment boundary after now, or None at the end of the period."""
+        index = bisect.bisect_right(self.boundaries, now)
+        if index < len(self.boundaries):
+            return self.boundaries[index]
+        return None
+
+
+def calculate_day_segment(sun_state, now=None):
+    """Return the current day segment for a sun.sun state."""
+    schedule = DaySegmentSchedule.from_sun_state(sun_state)
+    if schedule is None:
+        return UNKNOWN_SEGMENT
+    return schedule.segment(now or dt_util.utcnow())
+
+
+class DaySegmentTracker:
+    """Keeps the segment schedule current and announces each segment change.
+
+    The schedule is rebuilt only when the sun entity's state or next
+    rising/setting change. At every boundary a
+    weathercanvasai_day_segment_changed event is fired with the entry id and
+    the entry's day segment sensor is updated, so automations can regenerate
+    on segment changes instead of polling on a time pattern.
+    """
+
+    def __init__(self, hass: HomeAssistant, entry_id, sun_entity_id="sun.sun"):
+        self.hass = hass
+        self.entry_id = entry_id
+        self.sun_entity_id = sun_entity_id
+        self.schedule = None
+        self.segment = None
+        self._sun_key = None
+        self._unsub_state = None
+        self._unsub_timer = None
+
+    @callback
+    def async_start(self):
+        self._async_rebuild(self.hass.states.get(self.sun_entity_id))
+        self._unsub_state = async_track_state_change_event(
+            self.hass, [self.sun_entity_id], self._async_sun_changed
+        )
+
+    @callback
+    def async_stop(self):
+        if self._unsub_state:
+            self._unsub_state()
+            self._unsub_state = None
+        self._cancel_timer()
+
+    @callback
+    def async_current_segment(self, now=None):
+        if self.schedule is None:
+            return UNKNOWN_SEGMENT
+        return self.schedule.segment(now or dt_util.utcnow())
+
+    @property
+    def next_transition(self):
+        if self.schedule is None:
+            return None
+        return self.schedule.next_transition(dt_util.utcnow())
+
+    @callback
+    def _async_sun_changed(self, event):
+        self._async_rebuild(event.data.get("new_state"))
+
+    @callback
+    def _async_rebuild(self, sun_state):
+        sun_key = None
+        if sun_state is not None:
+            sun_key = (
+                sun_state.state,
+                sun_state.attributes.get("next_rising"),
+                sun_state.attributes.get("next_setting"),
+            )
+        if sun_key == self._sun_key and self.schedule is not None:
+            return  # Only elevation/azimuth changed
+        self._sun_key = sun_key
+        self.schedule = DaySegmentSchedule.from_sun_state(sun_state)
+        _LOGGER.debug(
+            "Day segment schedule rebuilt: %s",
+            [(self.schedule.names[i], b.isoformat()) for i, b in enumerate(self.schedule.boundaries)] if self.schedule else None,
+        )
+        self._async_update()
+
+    @callback
+    def _async_update(self, now=None):
+        """Announce the current segment if it changed and wait for the next boundary."""
+        if now is not None:
+            # Called by the timer, which has fired and can't be cancelled anymore
+            self._unsub_timer = None
+        else:
+            self._cancel_timer()
+        segment = self.async_current_segment()
+        if segment != self.segment:
+            previous, self.segment = self.segment, segment
+            if previous is not None:
+                self.hass.bus.async_fire(EVENT_DAY_SEGMENT_CHANGED, {
+                    "entry_id": self.entry_id,
+                    "segment": segment,
+                    "previous_segment": previous,
+                    "period": self.schedule.period if self.schedule else None,
+                })
+            async_dispatcher_send(self.hass, SIGNAL_DAY_SEGMENT_UPDATED.format(self.entry_id))
+
+        next_transition = self.next_transition
+        if next_transition is not None:
+            self._unsub_timer = async_track_point_in_utc_time(self.hass, self._async_update, next_transition)
+
+    def _cancel_timer(self):
+        if self._unsub_timer:
+            self._unsub_timer()
+            self._unsub_timer = None
@@ -0,0 +1,68 @@
+from typing import Any
+from homeassistant.components.diagnostics import async_redact_data
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant
+
+from .const import DOMAIN
+
+TO_REDACT = {"openai_api_key", "googlemaps_api_key"}
+
+
+async def async_get_config_entry_diagnostics(hass: HomeAssistant, entry: ConfigEntry) -> dict[str, Any]:
+    """Return diagnostics for a config entry."""
+    domain_data = hass.data.get(DOMAIN, {})
+    config_data = domain_data.get(entry.entry_id, {})
+    # Shared by all entries
+    http_client = domain_data.get("http_client")
+    request_scheduler = domain_data.get("request_scheduler")
+    thumbnail_cache = domain_data.get("thumbnail_cache")
+    image_encoder = domain_data.get("image_encoder")
+    # This entry's own
+    metrics = config_data.get("metrics")
+    prompt_cache = config_data.get("prompt_cache")
+    prompt_history = config_data.get("prompt_history")
+    prompt_compiler = config_data.get("prompt_compiler")
+    image_store = config_data.get("image_store")
+    image_flights = config_data.get("image_flights")
+    scene_trigger = config_data.get("scene_trigger")
+
+    return {
+        "entry": {
+            "data": async_redact_data(dict(entry.data), TO_REDACT),
+            "options": dict(entry.options),
+        },
+        "weather_entity": config_data.get("weather_entity"),
+        "sun_entity": config_data.get("sun_entity"),
+        "image_directory": config_data.get("image_directory"),
+        "loaded_entries": sum(
+            other.entry_id in domain_data for other in hass.config_entries.async_entries(DOMAIN)
+        ),
+        "metrics": metrics.as_dict() if metrics else None,
+        "http_client": http_client.as_dict() if http_client else None,
+        "request_scheduler": request_scheduler.as_dict() if request_scheduler else None,
+        "image_generation": _generation_latency(config_data.get("generation_stats", {})),
+        "thumbnail_cache": thumbnail_cache.as_dict() if thumbnail_cache else None,
+        # bytes_saved of this entry is in the metrics counters, the encoder's own counts all entries
+        "image_encoding": image_encoder.as_dict() if image_encoder else None,
+        "prompt_compiler": prompt_compiler.as_dict() if prompt_compiler else None,
+        "prompt_cache": prompt_cache.as_dict() if prompt_cache else None,
+        "prompt_history": prompt_history.as_dict() if prompt_history else None,
+        "image_store": image_store.as_dict() if image_store else None,
+        "image_coalescing": image_flights.as_dict() if image_flights else None,
+        "scene_trigger": scene_trigger.as_dict() if scene_trigger else None,
+    }
+
+
+def _generation_latency(stats: dict) -> dict[str, Any]:
+    """Average image generation latency per response format and the difference between them."""
+    result = {}
+    for response_format, mode_stats in stats.items():
+        result[response_format] = {
+            "count": mode_stats["count"],
+            "avg_s": round(mode_stats["total_s"] / mode_stats["count"], 3),
+            "last_s": mode_stats["last_s"],
+        }
+    if "url" in result and "b64_json" in result:
+        # Positive when b64_json is faster than downloading the image from the CDN
+        result["url_minus_b64_json_avg_s"] = round(result["url"]["avg_s"] - result["b64_json"]["avg_s"], 3)
+    return result
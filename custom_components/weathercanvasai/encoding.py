@@ -0,0 +1,154 @@
+import asyncio
+import hashlib
+import io
+import logging
+import os
+import tempfile
+import time
+from homeassistant.core import HomeAssistant
+from homeassistant.const import EVENT_HOMEASSISTANT_CLOSE
+
+from .const import ENCODER_PROCESSES, OUTPUT_FORMAT_PNG
+from .image_io import content_digest, CONTENT_DIGEST_LENGTH, _write_all, _finalize_temp_file, _discard_temp_file
+
+_LOGGER = logging.getLogger(__name__)
+
+# Pillow format name and file extension of each output format
+OUTPUT_ENCODINGS = {
+    "webp": ("WEBP", ".webp"),
+    "avif": ("AVIF", ".avif"),
+    "jpeg": ("JPEG", ".jpg"),
+}
+
+CONTENT_TYPES = {".png": "image/png", ".webp": "image/webp", ".avif": "image/avif", ".jpg": "image/jpeg"}
+
+
+def content_type(path):
+    """Return the MIME type of a saved image, by its extension."""
+    return CONTENT_TYPES.get(os.path.splitext(path)[1].lower(), "image/png")
+
+
+def output_prefix(png_path):
+    """Return the start of the name of a PNG's compact variant; the variant's own hash completes it."""
+    stem = os.path.splitext(png_path)[0]
+    digest = content_digest(png_path)
+    return stem[:-len(digest)] if digest else f"{stem}_"
+
+
+def _transcode(source_path, prefix, output_format, quality):
+    """Encode the PNG at source_path to a content addressed file; runs in a worker process.
+
+    Encoded in memory, hashed, written to a temporary file and renamed into
+    place, like the PNG itself. Returns (path, bytes written, seconds spent encoding).
+    """
+    from PIL import Image, features
+
+    start = time.monotonic()
+    pil_format, extension = OUTPUT_ENCODINGS[output_format]
+    if output_format in ("webp", "avif") and not features.check(output_format):
+        raise ValueError(f"This Pillow build can't encode {output_format}")
+    with Image.open(source_path) as image:
+        if output_format == "jpeg":
+            image = image.convert("RGB")
+            options = {"quality": quality, "progressive": True, "optimize": True}
+        elif output_format == "webp":
+            options = {"quality": quality, "method": 4}
+        else:
+            options = {"quality": quality}
+        output = io.BytesIO()
+        image.save(output, format=pil_format, **options)
+    data = output.getbuffer()
+    target_path = f"{prefix}{hashlib.sha256(data).hexdigest()[:CONTENT_DIGEST_LENGTH]}{extension}"
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(target_path), prefix=".dalle_", suffix=".part")
+    try:
+        _write_all(fd, data)
+    except BaseException:
+        _discard_temp_file(fd, temp_path)
+        raise
+    _finalize_temp_file(fd, temp_path, target_path)
+    return target_path, len(data), time.monotonic() - start
+
+
+class ImageEncoder:
+    """Transcodes saved PNGs to a compact format in a small process pool.
+
+    Encoding AVIF or WebP at full DALL-E size takes seconds of CPU; in worker
+    processes it holds neither the event loop, nor Home Assistant's executor
+    threads, nor the GIL. The pool is shared by all entries, started on first
+    use and bounded to ENCODER_PROCESSES, further jobs queue.
+    """
+
+    def __init__(self, hass: HomeAssistant, processes: int = ENCODER_PROCESSES):
+        self.hass = hass
+        self.processes = max(1, processes)
+        self._pool = None
+        self._remove_close_listener = None
+        self.stats = {
+            "encoded": 0,
+            "failed": 0,
+            "bytes_in": 0,
+            "bytes_out": 0,
+            "encode_time_total_s": 0.0,
+        }
+
+    def _get_pool(self):
+        if self._pool is None:
+            # Imported here, most installs keep saving PNGs and never start the pool
+            import concurrent.futures.process
+            import multiprocessing
+
+            # spawn, as forking Home Assistant's threaded process isn't safe
+            self._pool = concurrent.futures.process.ProcessPoolExecutor(
+                max_workers=self.processes, mp_context=multiprocessing.get_context("spawn")
+            )
+            if self._remove_close_listener is None:
+                self._remove_close_listener = self.hass.bus.async_listen_once(
+                    EVENT_HOMEASSISTANT_CLOSE, self._async_handle_close
+                )
+        return self._pool
+
+    async def async_transcode(self, source_path, output_format, quality):
+        """Write the compact variant of a PNG next to it and return (path, size).
+
+        The variant is named like the PNG, with its own content hash. Raises if
+        encoding fails; the caller keeps the PNG then.
+        """
+        if output_format == OUTPUT_FORMAT_PNG:
+            raise ValueError("PNG images are not transcoded")
+        source_size = await self.hass.async_add_executor_job(os.path.getsize, source_path)
+        try:
+            future = self._get_pool().submit(_transcode, source_path, output_prefix(source_path), output_format, quality)
+            target_path, size, seconds = await asyncio.wrap_future(future)
+        except Exception:
+            self.stats["failed"] += 1
+            raise
+        self.stats["encoded"] += 1
+        self.stats["bytes_in"] += source_size
+        self.stats["bytes_out"] += size
+        self.stats["encode_time_total_s"] += seconds
+        return target_path, size
+
+    async def _async_handle_close(self, event):
+        self._remove_close_listener = None
+        await self.async_close()
+
+    async def async_close(self):
+        """Stop the worker processes."""
+        if self._remove_close_listener is not None:
+            self._remove_close_listener()
+            self._remove_close_listener = None
+        if self._pool is not None:
+            pool, self._pool = self._pool, None
+            await self.hass.async_add_executor_job(lambda: pool.shutdown(wait=True, cancel_futures=True))
+
+    def as_dict(self):
+        """Return the encoding counters and bytes saved, e.g. for diagnostics."""
+        encoded = self.stats["encoded"]
+        return {
+            **self.stats,
+            "processes": self.processes,
+            "bytes_saved": self.stats["bytes_in"] - self.stats["bytes_out"],
+            "compression_ratio": round(self.stats["bytes_out"] / self.stats["bytes_in"], 3) if self.stats["bytes_in"] else None,
+            "encode_time_total_s": round(self.stats["encode_time_total_s"], 3),
+            "encode_time_avg_s": round(self.stats["encode_time_total_s"] / encoded, 3) if encoded else None,
+        }
@@ -0,0 +1,14 @@
+from homeassistant.helpers.device_registry import DeviceEntryType, DeviceInfo
+
+from .const import DOMAIN
+
+
+def entry_device_info(config_entry):
+    """Device of an entry's entities, named after its location, so each location's entities get its name."""
+    return DeviceInfo(
+        identifiers={(DOMAIN, config_entry.entry_id)},
+        name=config_entry.title,
+        manufacturer="OpenAI",
+        model="ChatGPT and DALL-E",
+        entry_type=DeviceEntryType.SERVICE,
+    )
@@ -0,0 +1,164 @@
+import logging
+import time
+import aiohttp
+from homeassistant.core import HomeAssistant
+from homeassistant.const import EVENT_HOMEASSISTANT_CLOSE
+from homeassistant.helpers.aiohttp_client import SERVER_SOFTWARE
+from homeassistant.util import ssl as ssl_util
+
+from .const import (
+    OPENAI_API_BASE,
+    HTTP_LIMIT,
+    HTTP_LIMIT_PER_HOST,
+    HTTP_KEEPALIVE_TIMEOUT,
+    HTTP_DNS_CACHE_TTL,
+    HTTP_CONNECT_TIMEOUT,
+    HTTP_TOTAL_TIMEOUT,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class WeathercanvasaiHttpClient:
+    """Long-lived, pooled HTTP client for all OpenAI and image CDN traffic.
+
+    Home Assistant's shared connector can't be tuned per integration, so this
+    client owns its own keep-alive connector, using Home Assistant's SSL context
+    and user agent, and counts how often a connection is reused instead of
+    paying for a new DNS lookup and TCP/TLS handshake.
+    """
+
+    def __init__(self, hass: HomeAssistant, api_base: str = OPENAI_API_BASE):
+        self.hass = hass
+        self.api_base = api_base.rstrip("/")
+        self._session = None
+        self._remove_close_listener = None
+        self.stats = {
+            "requests": 0,
+            "connections_created": 0,
+            "connections_reused": 0,
+            "dns_cache_hits": 0,
+            "dns_cache_misses": 0,
+            "handshake_time_total_ms": 0.0,
+            "handshake_time_last_ms": None,
+        }
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        """Return the pooled session, creating it on first use."""
+        if self._session is None or self._session.closed:
+            self._session = self._create_session()
+        return self._session
+
+    def url(self, path: str) -> str:
+        """Return the full API url for a path such as '/images/generations'."""
+        return f"{self.api_base}/{path.lstrip('/')}"
+
+    def _create_session(self) -> aiohttp.ClientSession:
+        connector = aiohttp.TCPConnector(
+            ssl=ssl_util.client_context(),
+            limit=HTTP_LIMIT,
+            limit_per_host=HTTP_LIMIT_PER_HOST,
+            keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT,
+            ttl_dns_cache=HTTP_DNS_CACHE_TTL,
+            enable_cleanup_closed=True,
+        )
+        timeout = aiohttp.ClientTimeout(total=HTTP_TOTAL_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT)
+
+        if self._remove_close_listener is None:
+            # Make sure the connector is closed when Home Assistant stops
+            self._remove_close_listener = self.hass.bus.async_listen_once(
+                EVENT_HOMEASSISTANT_CLOSE, self._async_handle_close
+            )
+
+        return aiohttp.ClientSession(
+            connector=connector,
+            timeout=timeout,
+            headers={"User-Agent": SERVER_SOFTWARE},
+            trace_configs=[self._create_trace_config()],
+        )
+
+    def _create_trace_config(self) -> aiohttp.TraceConfig:
+        """Hook aiohttp's tracing signals up to the connection counters."""
+        stats = self.stats
+
+        async def on_request_start(session, ctx, params):
+            stats["requests"] += 1
+
+        async def on_connection_create_start(session, ctx, params):
+            ctx.connection_start = time.perf_counter()
+
+        async def on_connection_create_end(session, ctx, params):
+            # Covers DNS, TCP connect and the TLS handshake of a new connection
+            elapsed_ms = (time.perf_counter() - ctx.connection_start) * 1000
+            stats["connections_created"] += 1
+            stats["handshake_time_total_ms"] += elapsed_ms
+            stats["handshake_time_last_ms"] = round(elapsed_ms, 1)
+
+        async def on_connection_reuseconn(session, ctx, params):
+            stats["connections_reused"] += 1
+
+        async def on_dns_cache_hit(session, ctx, params):
+            stats["dns_cache_hits"] += 1
+
+        async def on_dns_cache_miss(session, ctx, params):
+            stats["dns_cache_misses"] += 1
+
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_request_start.append(on_request_start)
+        trace_config.on_connection_create_start.append(on_connection_create_start)
+        trace_config.on_connection_create_end.append(on_connection_create_end)
+        trace_config.on_connection_reuseconn.append(on_connection_reuseconn)
+        trace_config.on_dns_cache_hit.append(on_dns_cache_hit)
+        trace_config.on_dns_cache_miss.append(on_dns_cache_miss)
+        return trace_config
+
+    def as_dict(self) -> dict:
+        """Return the connection counters, e.g. for diagnostics."""
+        created = self.stats["connections_created"]
+        reused = self.stats["connections_reused"]
+        return {
+            **self.stats,
+            "handshake_time_total_ms": round(self.stats["handshake_time_total_ms"], 1),
+            "handshake_time_avg_ms": round(self.stats["handshake_time_total_ms"] / created, 1) if created else None,
+            "connection_reuse_ratio": round(reused / (created + reused), 3) if (created + reused) else None,
+            "api_base": self.api_base,
+        }
+
+    async def _async_handle_close(self, event):
+        self._remove_close_listener = None
+        await self.async_close()
+
+    async def async_close(self):
+        """Close the session and its connection pool."""
+        if self._remove_close_listener is not None:
+            self._remove_close_listener()
+            self._remove_close_listener = None
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+
+async def async_iter_sse_data(stream):
+    """Yield the data of each server-sent event of a response while it streams in.
+
+    Events are separated by blank lines and their data lines joined with a
+    newline; comments and other fields are skipped. Stops at OpenAI's
+    closing "[DONE]".
+    """
+    data = []
+    async for raw_line in stream:
+        line = raw_line.decode("utf-8").rstrip("\r\n")
+        if line.startswith("data:"):
+            # One space after the colon is part of the field syntax, not the data
+            value = line[5:]
+            data.append(value[1:] if value.startswith(" ") else value)
+            continue
+        if line or not data:
+            continue
+        event, data = "\n".join(data), []
+        if event == "[DONE]":
+            return
+        yield event
+    if data and "\n".join(data) != "[DONE]":
+        yield "\n".join(data)
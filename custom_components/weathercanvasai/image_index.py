@@ -0,0 +1,172 @@
+import hashlib
+import logging
+import os
+import time
+from collections import OrderedDict
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.storage import Store
+
+from .const import DOMAIN, IMAGE_INDEX_STORAGE_VERSION, IMAGE_INDEX_SAVE_DELAY
+from .metrics import async_executor_job
+
+_LOGGER = logging.getLogger(__name__)
+
+# The PNG from DALL-E and the compact output formats
+IMAGE_EXTENSIONS = (".png", ".webp", ".avif", ".jpg")
+
+
+def prompt_hash(prompt):
+    """Short, stable hash of a prompt, so the index doesn't store the prompt text."""
+    if not prompt:
+        return None
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:16]
+
+
+class ImageIndex:
+    """Persistent manifest of the images this integration generated, oldest first.
+
+    Retention works on this ordered manifest instead of listing and stat'ing the
+    shared www directory, so evicting k images costs O(k) and other PNG files in
+    that directory are never touched.
+    """
+
+    def __init__(self, hass: HomeAssistant, directory: str, storage_key=f"{DOMAIN}.image_index", metrics=None):
+        self.hass = hass
+        self.directory = directory
+        self.metrics = metrics
+        self._store = Store(hass, IMAGE_INDEX_STORAGE_VERSION, storage_key)
+        self._images = OrderedDict()  # filename -> {"path", "size", "created", "prompt_hash"}
+        self._bytes = 0
+        # The image shown last, a new one or one from the image store: {"path", "master", "published"}
+        self.published = None
+
+    @property
+    def count(self):
+        return len(self._images)
+
+    @property
+    def total_bytes(self):
+        return self._bytes
+
+    @property
+    def latest(self):
+        """Return the newest image record, or None."""
+        if not self._images:
+            return None
+        return self._images[next(reversed(self._images))]
+
+    async def async_load(self):
+        """Load the manifest, rebuilding it from disk once if it doesn't exist yet."""
+        data = await self._store.async_load()
+        if data is None:
+            records = await self.hass.async_add_executor_job(self._scan_directory)
+            _LOGGER.debug(f"Image index rebuilt from {self.directory}: {len(records)} image(s)")
+            self._set_records(records)
+            await self._store.async_save(self._data_to_save())
+        else:
+            self._set_records(data.get("images", []))
+            self.published = data.get("published")
+
+    def _scan_directory(self):
+        """Collect the images previously saved by this integration; runs in the executor."""
+        records = []
+        try:
+            with os.scandir(self.directory) as entries:
+                for entry in entries:
+                    if entry.name.startswith("dalle_") and entry.name.endswith(IMAGE_EXTENSIONS) and entry.is_file():
+                        stat = entry.stat()
+                        records.append({
+                            "path": entry.path,
+                            "size": stat.st_size,
+                            "created": stat.st_mtime,
+                            "prompt_hash": None,
+                        })
+        except FileNotFoundError:
+            return []
+        records.sort(key=lambda record: record["created"])
+        return records
+
+    def _set_records(self, records):
+        self._images = OrderedDict((os.path.basename(record["path"]), record) for record in records)
+        self._bytes = sum(record["size"] for record in records)
+
+    def _data_to_save(self):
+        return {"images": list(self._images.values()), "published": self.published}
+
+    @callback
+    def async_set_published(self, file_path, master=None):
+        """Remember the image shown last, to show it again after a restart."""
+        self.published = {"path": file_path, "master": master, "published": time.time()}
+        self._store.async_delay_save(self._data_to_save, IMAGE_INDEX_SAVE_DELAY)
+
+    async def async_get_published(self):
+        """Return the record of the image shown last if its file is still there, else None.
+
+        Indexes from before the image shown last was kept fall back to the newest image.
+        A single stat, no directory listing.
+        """
+        record = self.published
+        if record is None and self.latest is not None:
+            record = {"path": self.latest["path"], "master": self.latest.get("master"), "published": self.latest["created"]}
+        if record is None:
+            return None
+        if not await async_executor_job(self.hass, self.metrics, os.path.isfile, record["path"]):
+            return None
+        return record
+
+    @callback
+    def async_add(self, file_path, size, prompt=None, master=None, master_size=0):
+        """Record a newly saved image as the newest one.
+
+        A PNG master kept next to a transcoded image is retained and removed with it.
+        """
+        filename = os.path.basename(file_path)
+        previous = self._images.pop(filename, None)
+        if previous:
+            self._bytes -= previous["size"]
+        size += master_size
+        self._images[filename] = {
+            "path": file_path,
+            "size": size,
+            "created": time.time(),
+            "prompt_hash": prompt_hash(prompt),
+        }
+        if master:
+            self._images[filename]["master"] = master
+        self._bytes += size
+        self._store.async_delay_save(self._data_to_save, IMAGE_INDEX_SAVE_DELAY)
+
+    async def async_evict(self, max_images, max_bytes=0):
+        """Remove the oldest images until both the count and the byte budget are met.
+
+        max_bytes of 0 disables the byte budget. The newest image is always kept.
+        Returns the paths that were removed.
+        """
+        evicted = []
+        while len(self._images) > 1 and (
+            len(self._images) > max_images or (max_bytes and self._bytes > max_bytes)
+        ):
+            _, record = self._images.popitem(last=False)
+            self._bytes -= record["size"]
+            evicted.append(record["path"])
+            if record.get("master"):
+                evicted.append(record["master"])
+        if evicted:
+            await async_executor_job(self.hass, self.metrics, _remove_files, evicted)
+            self._store.async_delay_save(self._data_to_save, IMAGE_INDEX_SAVE_DELAY)
+        return evicted
+
+    async def async_flush(self):
+        """Write pending changes, e.g. when the entry is unloaded."""
+        await self._store.async_save(self._data_to_save())
+
+
+def _remove_files(paths):
+    for path in paths:
+        try:
+            os.remove(path)
+            _LOGGER.debug(f"Removed old image file: {path}")
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            _LOGGER.error(f"Error removing file {path}: {e}")
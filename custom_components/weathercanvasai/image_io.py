@@ -0,0 +1,160 @@
+import base64
+import binascii
+import hashlib
+import logging
+import os
+import re
+import tempfile
+import time
+from typing import AsyncIterable
+from homeassistant.core import HomeAssistant
+
+from .metrics import async_executor_job, async_observe, STAGE_DISK_WRITE
+
+_LOGGER = logging.getLogger(__name__)
+
+# Hex digits of the sha256 in content addressed file names; 64 bits, plenty for a few thousand images
+CONTENT_DIGEST_LENGTH = 16
+CONTENT_DIGEST_PATTERN = re.compile(r"_([0-9a-f]{%d})\.[a-z]+$" % CONTENT_DIGEST_LENGTH)
+
+
+async def async_write_chunks_content_addressed(hass: HomeAssistant, chunks: AsyncIterable[bytes], directory: str, prefix: str, suffix: str, metrics=None):
+    """Write an async stream of byte chunks to a file named by its content, without blocking the event loop.
+
+    The chunks go to a temporary file in the directory, one executor job per
+    chunk, so at most one chunk is held in memory at a time. The sha256 of the
+    chunks is computed along the way, and the file is fsynced and atomically
+    renamed to prefix + the first CONTENT_DIGEST_LENGTH hex digits + suffix, so
+    readers never see a half written image and a name never refers to other
+    bytes. Returns (file path, bytes written); the disk time goes to metrics, if given.
+    """
+    disk_time = 0.0  # Time spent on the disk, not waiting for the stream
+    start = time.monotonic()
+    fd, temp_path = await async_executor_job(hass, metrics, _open_temp_file, directory)
+    disk_time += time.monotonic() - start
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        async for chunk in chunks:
+            if chunk:
+                start = time.monotonic()
+                # Hashed in the executor thread as well, hashlib releases the GIL
+                await async_executor_job(hass, metrics, _write_all, fd, chunk, digest)
+                disk_time += time.monotonic() - start
+                size += len(chunk)
+    except BaseException:
+        # Covers cancellation as well; never leave a partial temp file behind
+        await async_executor_job(hass, metrics, _discard_temp_file, fd, temp_path)
+        raise
+    file_path = os.path.join(directory, f"{prefix}{digest.hexdigest()[:CONTENT_DIGEST_LENGTH]}{suffix}")
+    start = time.monotonic()
+    await async_executor_job(hass, metrics, _finalize_temp_file, fd, temp_path, file_path)
+    async_observe(metrics, STAGE_DISK_WRITE, disk_time + time.monotonic() - start)
+    return file_path, size
+
+
+def content_digest(file_path):
+    """Return the content hash in a content addressed file name, or None for older names."""
+    match = CONTENT_DIGEST_PATTERN.search(os.path.basename(file_path))
+    return match.group(1) if match else None
+
+
+async def async_iter_b64_json_image(stream, chunk_size: int):
+    """Decode the first 'b64_json' value of an images API response while it streams in.
+
+    The response JSON is scanned incrementally for the "b64_json" string and its
+    base64 content is decoded in 4 character aligned slices as it arrives, so
+    neither the encoded nor the decoded image is ever held in memory as a whole.
+    Yields decoded image bytes; raises ValueError if the key is not found.
+    """
+    key = b'"b64_json"'
+    buffer = b""
+    in_value = False
+    pending = b""  # base64 characters not yet forming a full 4 character group
+    async for chunk in stream.iter_chunked(chunk_size):
+        buffer += chunk
+        if not in_value:
+            index = buffer.find(key)
+            if index == -1:
+                # Keep just enough to match a key split across two chunks
+                buffer = buffer[-(len(key) - 1):]
+                continue
+            rest = buffer[index + len(key):].lstrip(b" \t\r\n")
+            if not rest or (rest[:1] == b":" and not rest[1:].lstrip(b" \t\r\n")):
+                # Wait for the opening quote of the value
+                buffer = buffer[index:]
+                continue
+            if rest[:1] != b":" or rest[1:].lstrip(b" \t\r\n")[:1] != b'"':
+                raise ValueError("Malformed 'b64_json' value in the response data.")
+            buffer = rest[1:].lstrip(b" \t\r\n")[1:]
+            in_value = True
+
+        end = buffer.find(b'"')
+        if end == -1:
+            data, buffer = buffer, b""
+        else:
+            data, buffer = buffer[:end], b""
+        if data.endswith(b"\\"):
+            # Escape sequence split across chunks, finish it with the next chunk
+            data, buffer = data[:-1], b"\\" + buffer
+        # JSON may escape '/' as '\/'; base64 never contains a backslash itself
+        data = pending + data.replace(b"\\/", b"/").replace(b"\\n", b"").replace(b"\\r", b"")
+        aligned = len(data) - len(data) % 4
+        pending = data[aligned:]
+        if aligned:
+            try:
+                yield base64.b64decode(data[:aligned], validate=True)
+            except binascii.Error as err:
+                raise ValueError(f"Invalid base64 image data: {err}") from err
+        if end != -1:
+            if pending:
+                raise ValueError("Truncated base64 image data.")
+            return
+
+    raise ValueError("No 'b64_json' key in the response data." if not in_value else "Truncated base64 image data.")
+
+
+def _open_temp_file(directory):
+    os.makedirs(directory, exist_ok=True)  # Create the directory if it doesn't exist
+    return tempfile.mkstemp(dir=directory, prefix=".dalle_", suffix=".part")
+
+
+def _write_all(fd, chunk, digest=None):
+    if digest is not None:
+        digest.update(chunk)
+    view = memoryview(chunk)
+    while view:
+        written = os.write(fd, view)
+        view = view[written:]
+
+
+def _finalize_temp_file(fd, temp_path, file_path):
+    try:
+        try:
+            # mkstemp creates the file as 0600, the web server needs to read it
+            os.fchmod(fd, 0o644)
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        os.replace(temp_path, file_path)
+    except OSError:
+        _remove_quietly(temp_path)
+        raise
+    # Persist the rename itself
+    dir_fd = os.open(os.path.dirname(file_path), os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+
+
+def _discard_temp_file(fd, temp_path):
+    os.close(fd)
+    _remove_quietly(temp_path)
+
+
+def _remove_quietly(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
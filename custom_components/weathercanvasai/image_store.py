@@ -0,0 +1,168 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+from collections import OrderedDict
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.storage import Store
+
+from .const import DOMAIN, IMAGE_STORE_STORAGE_VERSION, IMAGE_STORE_SAVE_DELAY
+from .metrics import async_executor_job
+from .image_io import content_digest
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def image_key(subject, model, size, quality=None, style=None) -> str:
+    """Return the content address for an image request.
+
+    subject is the scene fingerprint when known, else the prompt itself.
+    """
+    parts = [subject, model, size, quality, style]
+    return hashlib.sha256(json.dumps(parts).encode("utf-8")).hexdigest()[:24]
+
+
+class ImageStore:
+    """Content-addressed store of generated images, reused for repeated scenes.
+
+    Each key collects up to `variants` images before it starts serving hits,
+    and then rotates through them. Images older than `max_age` seconds are not
+    reused, and the least recently used images are evicted once the store holds
+    more than `max_bytes`. Images are hard linked into the store directory, so
+    they survive the retention of the www directory without using extra space.
+
+    The image being shown can be one of the store's. Callers pass its path as
+    `protected`: it is dropped from its key like any other, but its file is
+    only removed once another image is shown.
+    """
+
+    def __init__(self, hass: HomeAssistant, directory: str, max_age: float, variants: int, max_bytes: int, storage_key=f"{DOMAIN}.image_store", metrics=None):
+        self.hass = hass
+        self.directory = directory
+        self.metrics = metrics
+        self.max_age = max_age
+        self.variants = max(1, variants)
+        self.max_bytes = max_bytes
+        self._store = Store(hass, IMAGE_STORE_STORAGE_VERSION, storage_key)
+        self._entries = OrderedDict()  # key -> {"variants": [{"path", "size", "created"}], "next": int}
+        self._pending = []  # Variants dropped while shown, removed later
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self):
+        return self.max_age > 0
+
+    async def async_load(self):
+        data = await self._store.async_load()
+        if data:
+            self._entries = OrderedDict(data.get("entries", []))
+            self._pending = data.get("pending", [])
+            self._bytes = sum(
+                variant["size"] for entry in self._entries.values() for variant in entry["variants"]
+            ) + sum(variant["size"] for variant in self._pending)
+
+    def _data_to_save(self):
+        return {"entries": list(self._entries.items()), "pending": self._pending}
+
+    async def async_get(self, key, protected=None):
+        """Return the path of a cached image for the key, or None on a miss.
+
+        protected is the path of the image being shown, its file isn't removed.
+        """
+        if not self.enabled:
+            return None
+        entry = self._entries.get(key)
+        if entry is not None:
+            now = time.time()
+            expired = [variant for variant in entry["variants"] if now - variant["created"] >= self.max_age]
+            if expired:
+                entry["variants"] = [variant for variant in entry["variants"] if variant not in expired]
+                await self._async_remove(expired, protected)
+            if len(entry["variants"]) >= self.variants:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                index = entry["next"] % len(entry["variants"])
+                entry["next"] = index + 1
+                self._store.async_delay_save(self._data_to_save, IMAGE_STORE_SAVE_DELAY)
+                return entry["variants"][index]["path"]
+        self.misses += 1
+        return None
+
+    async def async_add(self, key, file_path, size, protected=None):
+        """Add a freshly generated image as a variant for the key.
+
+        protected is the path of the image being shown, its file isn't removed.
+        """
+        if not self.enabled:
+            return
+        # Keeps the content hash of the image's name, so the stored copy is served with the same ETag
+        digest = content_digest(file_path)
+        name = f"{key}_{int(time.time() * 1000)}" + (f"_{digest}" if digest else "")
+        store_path = os.path.join(self.directory, f"{name}{os.path.splitext(file_path)[1]}")
+        try:
+            await async_executor_job(self.hass, self.metrics, _link_or_copy, file_path, store_path)
+        except OSError as e:
+            _LOGGER.error(f"Error adding {file_path} to the image store: {e}")
+            return
+        entry = self._entries.pop(key, None) or {"variants": [], "next": 0}
+        entry["variants"].append({"path": store_path, "size": size, "created": time.time()})
+        self._bytes += size
+        self._entries[key] = entry
+
+        # Keep the newest variants only, then evict least recently used images
+        evicted = entry["variants"][:-self.variants]
+        entry["variants"] = entry["variants"][-self.variants:]
+        while self._bytes - sum(variant["size"] for variant in evicted) > self.max_bytes and len(self._entries) > 1:
+            _, oldest = self._entries.popitem(last=False)
+            evicted.extend(oldest["variants"])
+        await self._async_remove(evicted, protected)
+        self._store.async_delay_save(self._data_to_save, IMAGE_STORE_SAVE_DELAY)
+
+    async def _async_remove(self, variants, protected=None):
+        """Remove the variants' files, and those kept while they were shown; not the protected one."""
+        variants = self._pending + variants
+        self._pending = [variant for variant in variants if variant["path"] == protected]
+        removed = [variant for variant in variants if variant["path"] != protected]
+        if not removed:
+            return
+        self._bytes -= sum(variant["size"] for variant in removed)
+        await async_executor_job(self.hass, self.metrics, _remove_files, [variant["path"] for variant in removed])
+
+    async def async_flush(self):
+        await self._store.async_save(self._data_to_save())
+
+    def as_dict(self):
+        """Return hit/miss counts and the store size."""
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "images": sum(len(entry["variants"]) for entry in self._entries.values()),
+            "pending_removal": len(self._pending),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+def _link_or_copy(source, destination):
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+    try:
+        os.link(source, destination)
+    except OSError:
+        # Different file system or no hard link support
+        shutil.copy2(source, destination)
+
+
+def _remove_files(paths):
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            _LOGGER.error(f"Error removing file {path}: {e}")
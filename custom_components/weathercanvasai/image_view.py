@@ -0,0 +1,88 @@
+import logging
+import os
+from http import HTTPStatus
+from aiohttp import web
+from homeassistant.components.http import HomeAssistantView
+
+from .const import DOMAIN, IMAGE_VIEW_PATH, IMAGE_CACHE_CONTROL
+from .encoding import content_type
+from .image_index import IMAGE_EXTENSIONS
+from .image_io import content_digest
+from .metrics import async_executor_job
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def image_url_path(config_data, file_path):
+    """Return the URL path the image view serves a saved image of the entry at."""
+    relative_path = os.path.relpath(file_path, config_data['image_directory']).replace(os.sep, "/")
+    return f"{IMAGE_VIEW_PATH}/{config_data['entry_id']}/{relative_path}"
+
+
+def image_etag(file_path, stat):
+    """Strong ETag of a saved image: its content hash, or size and mtime for images saved before hashed names."""
+    digest = content_digest(file_path)
+    if digest:
+        return f'"{digest}{os.path.splitext(file_path)[1]}"'
+    return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+
+class WeathercanvasaiImageView(HomeAssistantView):
+    """Serves the entries' images with long lived caching.
+
+    Image names contain a hash of their content, so a URL never serves other
+    bytes and browsers may keep the image for a year without asking again.
+    Clients that do ask again with the ETag get a 304 without a body. No
+    authentication, like /local, so dashboards and notifications can load the
+    images directly.
+    """
+
+    url = IMAGE_VIEW_PATH + "/{entry_id}/{path:.+}"
+    name = f"api:{DOMAIN}:images"
+    requires_auth = False
+
+    async def get(self, request: web.Request, entry_id: str, path: str) -> web.StreamResponse:
+        hass = request.app["hass"]
+        config_data = hass.data.get(DOMAIN, {}).get(entry_id)
+        if not isinstance(config_data, dict) or "image_directory" not in config_data:
+            return web.Response(status=HTTPStatus.NOT_FOUND)
+        directory = config_data['image_directory']
+        file_path = os.path.normpath(os.path.join(directory, path))
+        # Only images, only from this entry's directory
+        if (
+            os.path.commonpath([directory, file_path]) != directory
+            or not file_path.endswith(IMAGE_EXTENSIONS)
+            or os.path.basename(file_path).startswith(".")
+        ):
+            return web.Response(status=HTTPStatus.NOT_FOUND)
+
+        try:
+            stat = await async_executor_job(hass, config_data.get('metrics'), os.stat, file_path)
+        except OSError:
+            return web.Response(status=HTTPStatus.NOT_FOUND)
+        etag = image_etag(file_path, stat)
+        headers = {"Cache-Control": IMAGE_CACHE_CONTROL, "ETag": etag}
+        if _etag_matches(etag, request.headers.get("If-None-Match")):
+            return web.Response(status=HTTPStatus.NOT_MODIFIED, headers=headers)
+
+        body = await async_executor_job(hass, config_data.get('metrics'), _read_file, file_path)
+        if body is None:
+            return web.Response(status=HTTPStatus.NOT_FOUND)
+        return web.Response(body=body, content_type=content_type(file_path), headers=headers)
+
+
+def _etag_matches(etag, if_none_match):
+    """If-None-Match uses the weak comparison, a W/ prefix doesn't matter."""
+    if not if_none_match:
+        return False
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags
+
+
+def _read_file(path):
+    try:
+        with open(path, "rb") as file:
+            return file.read()
+    except OSError as err:
+        _LOGGER.error("Error reading image %s: %s", path, err)
+        return None
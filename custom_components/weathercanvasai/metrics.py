@@ -0,0 +1,154 @@
+import logging
+import time
+from collections import deque
+from homeassistant.core import HomeAssistant
+
+from .const import METRICS_SAMPLES
+
+_LOGGER = logging.getLogger(__name__)
+
+# Stages timed by the integration
+STAGE_PROMPT_API = "prompt_api"  # ChatGPT call, retries included
+STAGE_PROMPT_TTFT = "prompt_ttft"  # Streamed ChatGPT call until its first token, queueing included
+STAGE_IMAGE_API = "image_api"  # DALL-E call, for b64_json including the save
+STAGE_DOWNLOAD = "download"  # CDN download and save of a url response
+STAGE_DISK_WRITE = "disk_write"  # Writing an image to disk
+STAGE_ENCODE = "encode"  # Transcoding to the output format, queueing for a worker included
+STAGE_CLEAN_UP = "clean_up"  # clean_up_images
+STAGE_SCENE = "scene"  # The whole generate_scene pipeline
+STAGE_EXECUTOR_WAIT = "executor_wait"  # Executor jobs waiting for a free thread
+
+
+class Histogram:
+    """Latency samples of one stage; percentiles over the last METRICS_SAMPLES."""
+
+    def __init__(self, samples=METRICS_SAMPLES):
+        self._samples = deque(maxlen=samples)
+        self.count = 0
+        self.total = 0.0
+        self.last = None
+
+    def observe(self, seconds):
+        self._samples.append(seconds)
+        self.count += 1
+        self.total += seconds
+        self.last = seconds
+
+    def percentile(self, fraction):
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+    def as_dict(self):
+        def ms(seconds):
+            return round(seconds * 1000, 1) if seconds is not None else None
+
+        return {
+            "count": self.count,
+            "p50_ms": ms(self.percentile(0.5)),
+            "p95_ms": ms(self.percentile(0.95)),
+            "max_ms": ms(max(self._samples)) if self._samples else None,
+            "last_ms": ms(self.last),
+            "avg_ms": ms(self.total / self.count) if self.count else None,
+        }
+
+
+class TokenUsage:
+    """Token counts the chat completions report, and the completion tokens per second."""
+
+    def __init__(self, samples=METRICS_SAMPLES):
+        self._rates = deque(maxlen=samples)
+        self.requests = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.estimated_prompt_tokens = 0
+        self.truncated = 0
+        self.last = None
+
+    def observe(self, prompt_tokens, completion_tokens, seconds, estimated_prompt_tokens=None, truncated=False):
+        self.requests += 1
+        self.prompt_tokens += prompt_tokens
+        self.completion_tokens += completion_tokens
+        self.estimated_prompt_tokens += estimated_prompt_tokens or prompt_tokens
+        self.truncated += truncated
+        tokens_per_second = round(completion_tokens / seconds, 1) if seconds > 0 else None
+        if tokens_per_second is not None:
+            self._rates.append(tokens_per_second)
+        self.last = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "tokens_per_s": tokens_per_second,
+        }
+
+    def as_dict(self):
+        ordered = sorted(self._rates)
+        return {
+            "requests": self.requests,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "avg_prompt_tokens": round(self.prompt_tokens / self.requests, 1) if self.requests else None,
+            "avg_completion_tokens": round(self.completion_tokens / self.requests, 1) if self.requests else None,
+            # How far the compiler's estimate is off, 1.0 is exact
+            "estimate_ratio": round(self.estimated_prompt_tokens / self.prompt_tokens, 2) if self.prompt_tokens else None,
+            "tokens_per_s_p50": ordered[len(ordered) // 2] if ordered else None,
+            "truncated": self.truncated,
+            "last": self.last,
+        }
+
+
+class Metrics:
+    """Per-stage latency histograms and counters of one entry, for diagnostics and the diagnostic sensors."""
+
+    def __init__(self, hass: HomeAssistant):
+        self.hass = hass
+        self.histograms = {}
+        self.tokens = TokenUsage()
+        self.counters = {"bytes_downloaded": 0, "bytes_saved": 0, "images_saved": 0, "prompt_errors": 0, "image_errors": 0}
+
+    def observe(self, stage, seconds):
+        if stage not in self.histograms:
+            self.histograms[stage] = Histogram()
+        self.histograms[stage].observe(seconds)
+
+    def increment(self, counter, amount=1):
+        self.counters[counter] = self.counters.get(counter, 0) + amount
+
+    def histogram(self, stage):
+        return self.histograms.get(stage)
+
+    def as_dict(self):
+        return {
+            "latency": {stage: histogram.as_dict() for stage, histogram in sorted(self.histograms.items())},
+            "counters": dict(self.counters),
+            "tokens": self.tokens.as_dict(),
+        }
+
+
+def async_observe(metrics, stage, seconds):
+    """Record a stage duration in an entry's metrics, if it has any."""
+    if metrics is not None:
+        metrics.observe(stage, seconds)
+
+
+def async_observe_tokens(metrics, prompt_tokens, completion_tokens, seconds, estimated_prompt_tokens=None, truncated=False):
+    """Record the token usage of a chat completion in an entry's metrics, if it has any."""
+    if metrics is not None:
+        metrics.tokens.observe(prompt_tokens, completion_tokens, seconds, estimated_prompt_tokens, truncated)
+
+
+def async_increment(metrics, counter, amount=1):
+    if metrics is not None:
+        metrics.increment(counter, amount)
+
+
+async def async_executor_job(hass: HomeAssistant, metrics, target, *args):
+    """Run target in the executor like hass.async_add_executor_job, timing the wait for a thread."""
+    submitted = time.monotonic()
+
+    def job():
+        return time.monotonic(), target(*args)
+
+    started, result = await hass.async_add_executor_job(job)
+    async_observe(metrics, STAGE_EXECUTOR_WAIT, started - submitted)
+    return result
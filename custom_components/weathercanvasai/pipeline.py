@@ -0,0 +1,93 @@
+import logging
+import time
+from homeassistant.core import HomeAssistant
+
+from .scheduler import PRIORITY_USER
+from .metrics import async_observe, STAGE_SCENE
+from .weather_processing import (
+    async_build_scene,
+    async_get_dalle_prompt,
+    async_publish_prompts,
+    generate_dalle2_image,
+    generate_dalle3_image,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+
+async def async_generate_scene(
+    hass: HomeAssistant,
+    config_data: dict,
+    model="dall-e-3",
+    size="1024x1024",
+    quality="standard",
+    style="vivid",
+    response_format=None,
+    refresh=False,
+    priority=PRIORITY_USER,
+) -> dict:
+    """Run scene extraction, prompt creation and image generation for one entry as one pipeline.
+
+    The prompt goes straight from ChatGPT to DALL-E instead of through the
+    prompts sensor, and storing, retention and thumbnails run alongside the
+    critical path. Returns the result with the duration of each stage.
+    Background callers pass PRIORITY_BACKGROUND, so user calls go first.
+    """
+    timings = {}
+    pipeline_start = time.monotonic()
+
+    # Stage 1: location, day segment, season and weather
+    stage_start = time.monotonic()
+    scene = await async_build_scene(hass, config_data)
+    timings["scene_s"] = round(time.monotonic() - stage_start, 3)
+
+    # Stage 2: the DALL-E prompt, from the prompt cache when the scene repeats
+    stage_start = time.monotonic()
+    chatgpt_out, scene_key, prompt_cache_hit = await async_get_dalle_prompt(hass, config_data, scene, refresh=refresh, priority=priority)
+    timings["prompt_s"] = round(time.monotonic() - stage_start, 3)
+
+    result = {
+        "chatgpt_in": scene["chatgpt_in"],
+        "chatgpt_out": chatgpt_out,
+        "scene_key": scene_key,
+        "prompt_cache_hit": prompt_cache_hit,
+        "image_url": None,
+        "local_path": None,
+        "timings": timings,
+    }
+    if not chatgpt_out or chatgpt_out.startswith("Error"):
+        _LOGGER.error(f"Scene generation stopped, no DALL-E prompt: {chatgpt_out}")
+        timings["total_s"] = round(time.monotonic() - pipeline_start, 3)
+        return result
+
+    # Keep the prompts sensor in sync; nothing below reads it back
+    async_publish_prompts(hass, config_data, {
+        "chatgpt_in": scene["chatgpt_in"],
+        "chatgpt_out": chatgpt_out,
+        "scene_key": scene_key,
+        "cache_hit": prompt_cache_hit,
+    })
+
+    # Stage 3: image generation, download and save
+    stage_start = time.monotonic()
+    if model == "dall-e-2":
+        image_url = await generate_dalle2_image(
+            hass, config_data, chatgpt_out, size, response_format,
+            scene_key=scene_key, refresh=refresh, timings=timings, priority=priority
+        )
+    else:
+        image_url = await generate_dalle3_image(
+            hass, config_data, chatgpt_out, size, quality, style, response_format,
+            scene_key=scene_key, refresh=refresh, timings=timings, priority=priority
+        )
+    timings["image_s"] = round(time.monotonic() - stage_start, 3)
+    timings["total_s"] = round(time.monotonic() - pipeline_start, 3)
+    async_observe(config_data.get('metrics'), STAGE_SCENE, time.monotonic() - pipeline_start)
+
+    if image_url:
+        result["image_url"] = image_url
+        result["local_path"] = config_data.get('latest_image_local_path')
+    else:
+        _LOGGER.error("Scene generation failed to produce an image")
+    _LOGGER.debug(f"Scene generated in {timings['total_s']}s: {timings}")
+    return result
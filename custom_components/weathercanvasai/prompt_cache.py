@@ -0,0 +1,123 @@
+import hashlib
+import json
+import logging
+import math
+import time
+from collections import OrderedDict
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.storage import Store
+
+from .const import (
+    DOMAIN,
+    PROMPT_CACHE_STORAGE_VERSION,
+    PROMPT_CACHE_SAVE_DELAY,
+    PROMPT_CACHE_MAX_ENTRIES,
+    PROMPT_CACHE_TEMPERATURE_BUCKET,
+    PROMPT_CACHE_CLOUD_BUCKET,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def scene_fingerprint(scene: dict, system_instruction: str, model: str) -> str:
+    """Return a normalized key for a scene, so nearly identical weather shares one key.
+
+    Temperature and cloud coverage are quantized into buckets; the system
+    instruction and model are hashed in, so changing either starts afresh.
+    """
+    weather = scene.get("weather") or {}
+    temperature = weather.get("temperature")
+    cloud_coverage = weather.get("cloud_coverage")
+    parts = [
+        (scene.get("location_name") or "").strip().lower(),
+        scene.get("day_segment"),
+        scene.get("season"),
+        (weather.get("condition") or "").lower(),
+        math.floor(temperature / PROMPT_CACHE_TEMPERATURE_BUCKET) if isinstance(temperature, (int, float)) else None,
+        round(cloud_coverage / PROMPT_CACHE_CLOUD_BUCKET) if isinstance(cloud_coverage, (int, float)) else None,
+        hashlib.sha256(f"{model}\n{system_instruction}".encode("utf-8")).hexdigest()[:16],
+    ]
+    return hashlib.sha256(json.dumps(parts).encode("utf-8")).hexdigest()[:24]
+
+
+class PromptCache:
+    """Persistent cache of generated DALL-E prompts, keyed by scene fingerprint.
+
+    Each key collects up to `variants` prompts before it starts serving hits,
+    and then rotates through them so repeated scenes still get some diversity.
+    Variants expire after `ttl` seconds and the least recently used keys are
+    dropped once the cache holds PROMPT_CACHE_MAX_ENTRIES keys.
+    """
+
+    def __init__(self, hass: HomeAssistant, ttl: float, variants: int, max_entries: int = PROMPT_CACHE_MAX_ENTRIES, storage_key=f"{DOMAIN}.prompt_cache"):
+        self.hass = hass
+        self.ttl = ttl
+        self.variants = max(1, variants)
+        self.max_entries = max_entries
+        self._store = Store(hass, PROMPT_CACHE_STORAGE_VERSION, storage_key)
+        self._entries = OrderedDict()  # key -> {"variants": [{"prompt", "created"}], "next": int}
+        self.hits = 0
+        self.misses = 0
+        self.api_seconds = 0.0  # time spent on the misses, to estimate what the hits saved
+
+    @property
+    def enabled(self):
+        return self.ttl > 0
+
+    async def async_load(self):
+        data = await self._store.async_load()
+        if data:
+            self._entries = OrderedDict(data.get("entries", []))
+
+    def _data_to_save(self):
+        return {"entries": list(self._entries.items())}
+
+    @callback
+    def async_get(self, key):
+        """Return a cached prompt for the key, or None on a miss."""
+        if not self.enabled:
+            return None
+        entry = self._entries.get(key)
+        if entry is not None:
+            now = time.time()
+            entry["variants"] = [variant for variant in entry["variants"] if now - variant["created"] < self.ttl]
+            if len(entry["variants"]) >= self.variants:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                index = entry["next"] % len(entry["variants"])
+                entry["next"] = index + 1
+                self._store.async_delay_save(self._data_to_save, PROMPT_CACHE_SAVE_DELAY)
+                return entry["variants"][index]["prompt"]
+        self.misses += 1
+        return None
+
+    @callback
+    def async_put(self, key, prompt, api_seconds=0.0):
+        """Add a freshly generated prompt as a variant for the key."""
+        self.api_seconds += api_seconds
+        if not self.enabled:
+            return
+        entry = self._entries.pop(key, None) or {"variants": [], "next": 0}
+        entry["variants"].append({"prompt": prompt, "created": time.time()})
+        # Keep the newest variants only
+        entry["variants"] = entry["variants"][-self.variants:]
+        self._entries[key] = entry
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        self._store.async_delay_save(self._data_to_save, PROMPT_CACHE_SAVE_DELAY)
+
+    async def async_flush(self):
+        await self._store.async_save(self._data_to_save())
+
+    def as_dict(self):
+        """Return hit/miss counts and the estimated API time saved."""
+        avg_api_seconds = self.api_seconds / self.misses if self.misses else None
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "api_calls_saved": self.hits,
+            "avg_api_seconds": round(avg_api_seconds, 3) if avg_api_seconds is not None else None,
+            "api_seconds_saved": round(self.hits * avg_api_seconds, 1) if avg_api_seconds is not None else None,
+        }
@@ -0,0 +1,100 @@
+import math
+import re
+
+from .const import PROMPT_MAX_TOKENS, PROMPT_TOKENS_PER_WORD, PROMPT_MAX_TOKENS_MARGIN
+from .day_segments import UNKNOWN_SEGMENT
+
+# Words, groups of up to three digits and single symbols; roughly how OpenAI's tokenizers split English
+_TOKEN_PATTERN = re.compile(r"[A-Za-z]+|\d{1,3}|[^\sA-Za-z\d]")
+# "under 100 words", "at most 60 words", ...
+_LENGTH_PATTERN = re.compile(
+    r"\b(?:under|below|within|up to|at most|max(?:imum)?(?: of)?|no more than|(?:fewer|less) than)\s+(\d+)\s+words\b",
+    re.IGNORECASE,
+)
+MESSAGE_TOKENS = 4  # per message, for its role and separators
+
+# Home Assistant weather conditions, in words
+CONDITION_NAMES = {
+    "partlycloudy": "partly cloudy",
+    "clear-night": "clear night",
+    "lightning-rainy": "thunderstorm with rain",
+    "snowy-rainy": "sleet",
+    "windy-variant": "windy and cloudy",
+    "exceptional": "extreme weather",
+}
+
+
+def estimate_tokens(text):
+    """Approximate token count of English text, without a tokenizer.
+
+    A token per short word, digit group or symbol, one more per eight letters
+    of longer words; usually within 10-15% of the real count.
+    """
+    count = 0
+    for piece in _TOKEN_PATTERN.findall(text or ""):
+        count += 1 + (len(piece) - 1) // 8 if piece.isalpha() else 1
+    return count
+
+
+def target_words(instruction):
+    """Return the prompt length the instruction asks for, in words, or None."""
+    match = _LENGTH_PATTERN.search(instruction or "")
+    return int(match.group(1)) if match else None
+
+
+def max_tokens_for(words):
+    """Return max_tokens for a prompt of at most `words` words."""
+    if not words:
+        return PROMPT_MAX_TOKENS
+    return math.ceil(words * PROMPT_TOKENS_PER_WORD) + PROMPT_MAX_TOKENS_MARGIN
+
+
+def compact_weather(weather):
+    """Describe the structured weather in a few words: "partly cloudy, 12.5°C, 70% cloud cover"."""
+    if not weather:
+        return "weather unknown, be creative"
+    condition = weather.get("condition") or "unknown"
+    parts = [CONDITION_NAMES.get(condition, condition.replace("-", " "))]
+    if weather.get("temperature") is not None:
+        parts.append(f"{weather['temperature']}°C")
+    if weather.get("cloud_coverage") is not None:
+        parts.append(f"{round(weather['cloud_coverage'])}% cloud cover")
+    return ", ".join(parts)
+
+
+def compact_scene(location_name, day_segment, season, weather):
+    """Return chatgpt_in: "Ghent, Belgium; autumn, late afternoon; partly cloudy, 12.5°C, 70% cloud cover"."""
+    time_of_day = season.lower() if day_segment == UNKNOWN_SEGMENT else f"{season.lower()}, {day_segment}"
+    return f"{location_name}; {time_of_day}; {compact_weather(weather)}"
+
+
+class PromptCompiler:
+    """Builds the chat completion messages and max_tokens from an entry's system instruction.
+
+    Built when the entry is set up, so once per options change: the
+    instruction's whitespace is collapsed, its tokens counted and max_tokens
+    taken from the length it asks for ("under 100 words") instead of a
+    fixed 256.
+    """
+
+    def __init__(self, system_instruction):
+        self.system_instruction = " ".join((system_instruction or "").split())
+        self.system_tokens = estimate_tokens(self.system_instruction) + MESSAGE_TOKENS if self.system_instruction else 0
+        self.target_words = target_words(self.system_instruction)
+        self.max_tokens = max_tokens_for(self.target_words)
+
+    def messages(self, chatgpt_in):
+        messages = [{"role": "system", "content": self.system_instruction}] if self.system_instruction else []
+        messages.append({"role": "user", "content": chatgpt_in})
+        return messages
+
+    def prompt_tokens(self, chatgpt_in):
+        """Estimated input tokens of a call."""
+        return self.system_tokens + estimate_tokens(chatgpt_in) + MESSAGE_TOKENS
+
+    def as_dict(self):
+        return {
+            "system_instruction_tokens": self.system_tokens,
+            "target_words": self.target_words,
+            "max_tokens": self.max_tokens,
+        }
@@ -0,0 +1,74 @@
+import logging
+import time
+from collections import deque
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.storage import Store
+from homeassistant.util import dt as dt_util
+
+from .const import DOMAIN, DEFAULT_PROMPT_HISTORY_SIZE, PROMPT_HISTORY_STORAGE_VERSION, PROMPT_HISTORY_SAVE_DELAY
+from .image_index import prompt_hash
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class PromptHistory:
+    """The last `size` prompts of an entry, in a ring buffer persisted to its own storage file.
+
+    The prompts sensor only shows the latest prompt and keeps the text out of
+    the recorder; the history lives here, bounded, and is read through the
+    get_prompt_history service or the weathercanvasai/prompt_history
+    websocket command.
+    """
+
+    def __init__(self, hass: HomeAssistant, size: int = DEFAULT_PROMPT_HISTORY_SIZE, storage_key=f"{DOMAIN}.prompt_history"):
+        self.hass = hass
+        self.size = max(0, size)
+        self._store = Store(hass, PROMPT_HISTORY_STORAGE_VERSION, storage_key)
+        self._entries = deque(maxlen=self.size)
+
+    @property
+    def enabled(self):
+        return self.size > 0
+
+    async def async_load(self):
+        data = await self._store.async_load()
+        if data:
+            # A smaller size in the options drops the oldest prompts
+            self._entries.extend(data.get("prompts", []))
+
+    def _data_to_save(self):
+        return {"prompts": list(self._entries)}
+
+    @callback
+    def async_add(self, chatgpt_in, chatgpt_out, scene_key=None, cache_hit=False):
+        """Append a prompt; the oldest one drops out once the history is full."""
+        if not self.enabled or not chatgpt_out:
+            return
+        self._entries.append({
+            "time": dt_util.utcnow().isoformat(),
+            "timestamp": time.time(),
+            "prompt_hash": prompt_hash(chatgpt_out),
+            "chatgpt_in": chatgpt_in,
+            "chatgpt_out": chatgpt_out,
+            "scene_key": scene_key,
+            "cache_hit": cache_hit,
+        })
+        self._store.async_delay_save(self._data_to_save, PROMPT_HISTORY_SAVE_DELAY)
+
+    @callback
+    def async_get(self, limit=None, since=None):
+        """Return the prompts, newest first; at most `limit`, and only newer than the `since` timestamp."""
+        prompts = []
+        for entry in reversed(self._entries):
+            if since is not None and entry["timestamp"] <= since:
+                break
+            prompts.append(entry)
+            if limit is not None and len(prompts) >= limit:
+                break
+        return prompts
+
+    async def async_flush(self):
+        await self._store.async_save(self._data_to_save())
+
+    def as_dict(self):
+        return {"enabled": self.enabled, "size": self.size, "prompts": len(self._entries)}
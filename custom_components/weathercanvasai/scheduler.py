@@ -0,0 +1,341 @@
+import asyncio
+import hashlib
+import heapq
+import itertools
+import logging
+import random
+import re
+import time
+from contextlib import asynccontextmanager
+import aiohttp
+
+from .const import (
+    SCHEDULER_MAX_ATTEMPTS,
+    SCHEDULER_BACKOFF_BASE,
+    SCHEDULER_BACKOFF_MAX,
+    SCHEDULER_RATE_WINDOW,
+    SCHEDULER_MAX_CONCURRENCY,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+# Lower goes first: service calls made by a user before background generation
+PRIORITY_USER = 0
+PRIORITY_BACKGROUND = 1
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+
+def parse_duration(value):
+    """Parse OpenAI's reset durations such as '20ms', '1s' or '6m0.5s' into seconds."""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        return None
+    return sum(float(number) * _DURATION_UNITS[unit] for number, unit in parts)
+
+
+def retry_after(headers):
+    """Return the delay the server asked for in retry-after(-ms), in seconds, or None."""
+    if headers.get("retry-after-ms"):
+        try:
+            return float(headers["retry-after-ms"]) / 1000
+        except ValueError:
+            pass
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None  # Absent, or an HTTP date
+
+
+def account_id(api_key):
+    """Short hash of an API key, to share its rate limits without keeping the key around."""
+    if not api_key:
+        return None
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:12]
+
+
+class TokenBucket:
+    """A bucket refilled continuously, sized from the x-ratelimit-* headers.
+
+    Until the server reported a limit the bucket doesn't hold anything back.
+    """
+
+    def __init__(self):
+        self.capacity = None
+        self.level = 0.0
+        self.rate = 0.0  # per second
+        self._updated = time.monotonic()
+
+    def _refill(self, now):
+        if self.capacity is not None:
+            self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def update(self, limit, remaining, reset):
+        """Take over the server's view of the limit.
+
+        remaining doesn't count the calls still in flight, so it can only lower
+        the level; raising it is left to the refill.
+        """
+        now = time.monotonic()
+        self._refill(now)
+        self.level = float(remaining) if self.capacity is None else min(self.level, float(remaining))
+        self.capacity = limit
+        if reset and limit > remaining:
+            # reset is when the bucket is full again
+            self.rate = (limit - remaining) / reset
+        else:
+            self.rate = limit / SCHEDULER_RATE_WINDOW
+        self._updated = now
+
+    def wait_time(self, amount):
+        """Return the seconds until amount is available."""
+        if self.capacity is None or amount <= 0:
+            return 0.0
+        self._refill(time.monotonic())
+        # Never ask for more than fits, or the request would wait forever
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        if self.rate <= 0:
+            return SCHEDULER_RATE_WINDOW
+        return (amount - self.level) / self.rate
+
+    def take(self, amount):
+        if self.capacity is not None:
+            self._refill(time.monotonic())
+            self.level -= amount
+
+
+class ModelLimiter:
+    """Request and token buckets of one model, and the calls waiting for them."""
+
+    def __init__(self):
+        self.requests = TokenBucket()
+        self.tokens = TokenBucket()
+        self.paused_until = 0.0  # monotonic, set after a 429
+        self.waiters = []  # heap of [priority, sequence]
+        self._changed = asyncio.Event()
+
+    def wait_time(self, tokens):
+        return max(
+            self.paused_until - time.monotonic(),
+            self.requests.wait_time(1),
+            self.tokens.wait_time(tokens),
+        )
+
+    def notify(self):
+        """Wake the waiting calls to re-check the buckets and their turn."""
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def async_wait(self, timeout):
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+
+class ConcurrencyLimit:
+    """Slots for the calls in flight, shared by all entries and models.
+
+    Waiting calls get a slot by priority, then in arrival order, so the
+    generations of several entries interleave instead of one entry's burst
+    taking all connections.
+    """
+
+    def __init__(self, limit):
+        self.limit = max(1, limit)
+        self.in_flight = 0
+        self.waiters = []  # heap of [priority, sequence]
+        self._changed = asyncio.Event()
+
+    def notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    @asynccontextmanager
+    async def async_slot(self, priority, sequence):
+        entry = [priority, sequence]
+        heapq.heappush(self.waiters, entry)
+        try:
+            while self.waiters[0] is not entry or self.in_flight >= self.limit:
+                await self._changed.wait()
+        finally:
+            self.waiters.remove(entry)
+            heapq.heapify(self.waiters)
+            self.notify()
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self.notify()
+
+
+class RequestScheduler:
+    """Sends all OpenAI API calls of all entries, within the accounts' rate limits.
+
+    A token bucket per account and model is kept in line with the
+    x-ratelimit-* headers of every response, and calls wait for their turn
+    when it runs dry, user calls before background ones. At most
+    max_concurrency calls are in flight at once, whichever entry they come
+    from. A 429 or 5xx pauses the model for the delay the server asked for,
+    or a jittered exponential backoff, and is retried up to
+    SCHEDULER_MAX_ATTEMPTS times in total. So is a connection that couldn't be
+    made; a connection lost later isn't retried, OpenAI may have the request
+    and an image generation would be paid twice.
+    """
+
+    def __init__(self, http_client, max_attempts=SCHEDULER_MAX_ATTEMPTS, backoff_base=SCHEDULER_BACKOFF_BASE, backoff_max=SCHEDULER_BACKOFF_MAX, max_concurrency=SCHEDULER_MAX_CONCURRENCY):
+        self.http_client = http_client
+        self.max_attempts = max(1, max_attempts)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._limiters = {}
+        self._slots = ConcurrencyLimit(max_concurrency)
+        self._sequence = itertools.count()
+        self.stats = {
+            "requests": 0,
+            "retries": 0,
+            "throttled": 0,
+            "server_errors": 0,
+            "connection_errors": 0,
+            "failed": 0,
+            "queued": 0,
+            "queue_wait_total_s": 0.0,
+        }
+
+    def _limiter(self, account, model):
+        # Rate limits are per account (API key) and model, not per entry
+        if (account, model) not in self._limiters:
+            self._limiters[(account, model)] = ModelLimiter()
+        return self._limiters[(account, model)]
+
+    @asynccontextmanager
+    async def async_request(self, method, path, model, priority=PRIORITY_USER, tokens=0, account=None, **kwargs):
+        """Send a request to the OpenAI API and yield its final response.
+
+        Use like session.request(): the response is either successful, or the
+        last failure once retrying is pointless or the attempts are used up.
+        tokens is the estimated token usage of the call, 0 for image calls.
+        account identifies the API key, calls with the same key share its limits.
+        """
+        limiter = self._limiter(account, model)
+        url = self.http_client.url(path)
+        attempt = 0
+        while True:
+            attempt += 1
+            await self._async_acquire(limiter, priority, tokens)
+            # The slot is only held for the call itself, not for the backoff
+            async with self._slots.async_slot(priority, next(self._sequence)):
+                self.stats["requests"] += 1
+                try:
+                    response = await self.http_client.session.request(method, url, **kwargs)
+                except aiohttp.ClientConnectionError as e:
+                    self.stats["connection_errors"] += 1
+                    # Only a failed connect surely never reached OpenAI
+                    if attempt >= self.max_attempts or not isinstance(e, aiohttp.ClientConnectorError):
+                        self.stats["failed"] += 1
+                        raise
+                    delay = self._backoff(attempt)
+                    _LOGGER.warning(f"OpenAI connection error ({e}), retrying in {delay:.1f}s")
+                else:
+                    self._update_limits(limiter, response.headers)
+                    if response.status in RETRY_STATUSES and attempt < self.max_attempts and await self._retryable(response):
+                        delay = max(retry_after(response.headers) or 0, self._backoff(attempt))
+                        if response.status == 429:
+                            self.stats["throttled"] += 1
+                            # Hold back every call to this model, not just this one
+                            limiter.paused_until = max(limiter.paused_until, time.monotonic() + delay)
+                            limiter.notify()
+                        else:
+                            self.stats["server_errors"] += 1
+                        _LOGGER.warning(
+                            f"OpenAI returned {response.status} for {model}, retrying in {delay:.1f}s "
+                            f"(attempt {attempt} of {self.max_attempts})"
+                        )
+                        response.release()
+                    else:
+                        if response.status != 200:
+                            self.stats["failed"] += 1
+                        try:
+                            yield response
+                        finally:
+                            response.release()
+                        return
+            self.stats["retries"] += 1
+            await asyncio.sleep(delay)
+
+    async def _async_acquire(self, limiter, priority, tokens):
+        """Wait until the buckets have room and no call with a higher priority is waiting."""
+        entry = [priority, next(self._sequence)]
+        heapq.heappush(limiter.waiters, entry)
+        start = time.monotonic()
+        queued = False
+        try:
+            while True:
+                if limiter.waiters[0] is entry:
+                    wait = limiter.wait_time(tokens)
+                    if wait <= 0:
+                        limiter.requests.take(1)
+                        limiter.tokens.take(tokens)
+                        return
+                else:
+                    wait = None  # Woken up when the call ahead is done
+                if not queued:
+                    queued = True
+                    self.stats["queued"] += 1
+                await limiter.async_wait(wait)
+        finally:
+            limiter.waiters.remove(entry)
+            heapq.heapify(limiter.waiters)
+            self.stats["queue_wait_total_s"] += time.monotonic() - start
+            limiter.notify()
+
+    async def _retryable(self, response):
+        if response.status != 429:
+            return True
+        # Out of credit is a 429 too, but waiting won't help
+        return "insufficient_quota" not in await response.text()
+
+    def _backoff(self, attempt):
+        # Full jitter, so calls throttled together don't come back together
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1)))
+
+    def _update_limits(self, limiter, headers):
+        for kind, bucket in (("requests", limiter.requests), ("tokens", limiter.tokens)):
+            try:
+                limit = int(headers[f"x-ratelimit-limit-{kind}"])
+                remaining = int(headers[f"x-ratelimit-remaining-{kind}"])
+            except (KeyError, ValueError):
+                continue
+            bucket.update(limit, remaining, parse_duration(headers.get(f"x-ratelimit-reset-{kind}")))
+        limiter.notify()
+
+    def as_dict(self):
+        return {
+            **self.stats,
+            "queue_wait_total_s": round(self.stats["queue_wait_total_s"], 3),
+            "max_concurrency": self._slots.limit,
+            "in_flight": self._slots.in_flight,
+            "waiting_for_slot": len(self._slots.waiters),
+            "models": {
+                # The account is a hash of the API key, never the key itself
+                f"{account}/{model}" if account else model: {
+                    "request_limit": limiter.requests.capacity,
+                    "token_limit": limiter.tokens.capacity,
+                    "waiting": len(limiter.waiters),
+                    "paused_s": round(max(0.0, limiter.paused_until - time.monotonic()), 1),
+                }
+                for (account, model), limiter in self._limiters.items()
+            },
+        }
@@ -1,19 +1,66 @@
-from homeassistant.components.sensor import SensorEntity
+from homeassistant.components.sensor import SensorEntity, SensorDeviceClass, SensorStateClass
 from homeassistant.helpers.dispatcher import async_dispatcher_connect
-from homeassistant.const import ATTR_ATTRIBUTION
-from .const import DOMAIN
-from datetime import datetime
+from homeassistant.helpers.entity import EntityCategory
+from homeassistant.helpers import entity_registry as er
+from homeassistant.helpers.restore_state import RestoreEntity
+from homeassistant.const import UnitOfTime, UnitOfInformation
+from homeassistant.core import callback
+from .const import DOMAIN, SIGNAL_PROMPTS_UPDATED, SIGNAL_PROMPTS_STREAMING, SIGNAL_IMAGE_UPDATED, SIGNAL_DAY_SEGMENT_UPDATED
+from .metrics import (
+    STAGE_PROMPT_API,
+    STAGE_PROMPT_TTFT,
+    STAGE_IMAGE_API,
+    STAGE_DOWNLOAD,
+    STAGE_DISK_WRITE,
+    STAGE_ENCODE,
+    STAGE_CLEAN_UP,
+    STAGE_SCENE,
+    STAGE_EXECUTOR_WAIT,
+)
+from .image_view import image_url_path
+from .image_index import prompt_hash
+from .entity import entry_device_info
+from datetime import datetime, timedelta
 import logging
+import os
 
 _LOGGER = logging.getLogger(__name__)
 
-class weathercanvasaiPromptsSensor(SensorEntity):
-    def __init__(self, hass, entry_id, name):
+# State of the prompts sensor while a prompt streams in
+PROMPT_STATE_STREAMING = "streaming"
+
+# The diagnostic sensors read in-memory counters, polled at this interval
+SCAN_INTERVAL = timedelta(seconds=60)
+
+# (stage, name) of the latency sensors
+LATENCY_SENSORS = [
+    (STAGE_PROMPT_API, "Prompt Latency"),
+    (STAGE_PROMPT_TTFT, "Prompt Time to First Token"),
+    (STAGE_IMAGE_API, "Image API Latency"),
+    (STAGE_DOWNLOAD, "Image Download Latency"),
+    (STAGE_DISK_WRITE, "Disk Write Latency"),
+    (STAGE_ENCODE, "Encode Latency"),
+    (STAGE_CLEAN_UP, "Clean Up Latency"),
+    (STAGE_SCENE, "Scene Latency"),
+    (STAGE_EXECUTOR_WAIT, "Executor Wait"),
+]
+
+def _entry_data(hass, entry_id):
+    """Return the runtime data of a config entry, or None once it's unloaded."""
+    return hass.data.get(DOMAIN, {}).get(entry_id)
+
+class weathercanvasaiPromptsSensor(SensorEntity, RestoreEntity):
+    # The prompt texts are hundreds of bytes per update; the prompt history keeps them instead of the recorder
+    _unrecorded_attributes = frozenset({"chatgpt_in", "chatgpt_out"})
+    _attr_has_entity_name = True
+
+    def __init__(self, hass, entry_id, name, device_info=None):
         #_LOGGER.info("Initializing weathercanvasaiPromptSensor")
         """Initialize the sensor."""
         self.hass = hass
         self.entry_id = entry_id
         self._attr_name = name
+        self._attr_device_info = device_info
         self._state = "Initial State"  # Default state
         self._attr_unique_id = f"{entry_id}_prompts"
 
@@ -23,6 +70,8 @@ class weathercanvasaiPromptsSensor(SensorEntity):
             "last_update": datetime.now().isoformat()
         }
         self._attr_icon = 'mdi:chat'  # Set the icon here
+        # State and attributes of the last complete prompt while the next one streams in
+        self._before_stream = None
         #_LOGGER.info(f"Initializing weathercanvasaiPeomptsSensor with unique ID: {self._attr_unique_id}")
 
 
@@ -42,28 +91,78 @@ class weathercanvasaiPromptsSensor(SensorEntity):
         return self._attributes
 
     async def async_added_to_hass(self):
-        """Register callbacks when entity is added."""
-        async_dispatcher_connect(
-            self.hass, 
-            "update_weathercanvasai_sensor", 
-            self._update_sensor
+        """Register callbacks when entity is added, and restore the prompts from before a restart."""
+        await super().async_added_to_hass()
+        last_state = await self.async_get_last_state()
+        if last_state is not None and last_state.state != PROMPT_STATE_STREAMING and last_state.attributes.get("chatgpt_out"):
+            self._state = last_state.state
+            for key in ("chatgpt_in", "chatgpt_out", "scene_key", "cache_hit", "last_update"):
+                if key in last_state.attributes:
+                    self._attributes[key] = last_state.attributes[key]
+            # The image services send the last prompt; it's only kept here
+            config_data = _entry_data(self.hass, self.entry_id)
+            if config_data is not None and not config_data.get('chatgpt_out'):
+                for key in ("chatgpt_in", "chatgpt_out", "scene_key"):
+                    config_data[key] = last_state.attributes.get(key)
+        self.async_on_remove(
+            async_dispatcher_connect(
+                self.hass,
+                SIGNAL_PROMPTS_UPDATED.format(self.entry_id),
+                self._update_sensor
+            )
+        )
+        self.async_on_remove(
+            async_dispatcher_connect(
+                self.hass,
+                SIGNAL_PROMPTS_STREAMING.format(self.entry_id),
+                self._update_streaming
+            )
         )
 
+    @callback
+    def _update_streaming(self, data):
+        """Show that a prompt streams in; the complete prompt replaces it.
+
+        The state is written once per prompt, with its first words. Every state
+        write is a recorder row, so the growing text only goes to the
+        weathercanvasai/subscribe_prompt_stream websocket subscribers.
+        """
+        if data.get("chatgpt_out") is None:
+            # The stream failed, show the last complete prompt again
+            if self._before_stream is not None:
+                self._state, self._attributes = self._before_stream
+                self._before_stream = None
+                self.async_write_ha_state()
+            return
+        if self._before_stream is not None:
+            return
+        self._before_stream = (self._state, dict(self._attributes))
+        self._state = PROMPT_STATE_STREAMING
+        self._attributes["chatgpt_in"] = data.get("chatgpt_in")
+        self._attributes["chatgpt_out"] = data.get("chatgpt_out")
+        self.async_write_ha_state()
+
     async def _update_sensor(self, data):
         """Update the sensor state and attributes."""
-        current_time = datetime.now().isoformat() # Format the current date and time
-        self._state = f"Updated at {current_time}" # Update the state to show it has been updated, along with the timestamp
+        self._before_stream = None
+        # A short hash of the prompt: stays the same when a cached prompt is used again
+        self._state = prompt_hash(data.get("chatgpt_out")) or "unknown"
         self._attributes["chatgpt_in"] = data.get("chatgpt_in")
         self._attributes["chatgpt_out"] = data.get("chatgpt_out")
+        self._attributes["scene_key"] = data.get("scene_key")
+        self._attributes["cache_hit"] = data.get("cache_hit", False)
         self._attributes["last_update"] = datetime.now().isoformat()
         self.async_write_ha_state()
 
 class weathercanvasaiImageSensor(SensorEntity):
-    def __init__(self, hass, entry_id, name):
+    _attr_has_entity_name = True
+
+    def __init__(self, hass, entry_id, name, device_info=None):
         """Initialize the image URL sensor."""
         self.hass = hass
         self.entry_id = entry_id
         self._attr_name = name
+        self._attr_device_info = device_info
         self._attr_unique_id = f"{entry_id}_image"
         self._state = None
 
@@ -77,24 +176,217 @@ class weathercanvasaiImageSensor(SensorEntity):
         """Return the state of the sensor (URL of the latest image)."""
         return self._state
 
+    @property
+    def extra_state_attributes(self):
+        """Return the format of the latest image, its /local path and its PNG master, if kept."""
+        config_data = _entry_data(self.hass, self.entry_id) or {}
+        if not self._state:
+            return {}
+        master_path = config_data.get('latest_image_master_path')
+        return {
+            "format": os.path.splitext(self._state)[1].lstrip("."),
+            "local_path": config_data.get('latest_image_local_path'),
+            "master": image_url_path(config_data, master_path) if master_path else None,
+        }
+
     async def async_added_to_hass(self):
         """Handle entity which will be added to Home Assistant."""
+        # The image shown before a restart, restored from the image index at setup
+        self._state = (_entry_data(self.hass, self.entry_id) or {}).get('latest_image_url', None)
+
         async def update_state():
-            # Retrieve the latest_image_url from DOMAIN
-            self._state = self.hass.data[DOMAIN].get('latest_image_local_path', None)
+            # Retrieve the latest_image_url from the entry's data
+            self._state = (_entry_data(self.hass, self.entry_id) or {}).get('latest_image_url', None)
             self.async_write_ha_state()
 
         # Set up a listener for dispatcher signal
         self.async_on_remove(
             async_dispatcher_connect(
-                self.hass, 
-                "update_weathercanvasai_image_sensor", 
+                self.hass,
+                SIGNAL_IMAGE_UPDATED.format(self.entry_id),
                 update_state
             )
         )
 
+class weathercanvasaiDaySegmentSensor(SensorEntity):
+    _attr_has_entity_name = True
+
+    def __init__(self, hass, entry_id, name, device_info=None):
+        """Initialize the day segment sensor."""
+        self.hass = hass
+        self.entry_id = entry_id
+        self._attr_name = name
+        self._attr_device_info = device_info
+        self._attr_unique_id = f"{entry_id}_day_segment"
+        self._attr_icon = 'mdi:weather-sunset'
+        self._attr_should_poll = False
+
+    @property
+    def state(self):
+        """Return the current day segment."""
+        tracker = (_entry_data(self.hass, self.entry_id) or {}).get('day_segments')
+        return tracker.segment if tracker else None
+
+    @property
+    def extra_state_attributes(self):
+        tracker = (_entry_data(self.hass, self.entry_id) or {}).get('day_segments')
+        if not tracker or not tracker.schedule:
+            return {}
+        next_transition = tracker.next_transition
+        return {
+            "period": tracker.schedule.period,
+            "next_change": next_transition.isoformat() if next_transition else None,
+        }
+
+    async def async_added_to_hass(self):
+        """Update whenever the tracker crosses a segment boundary."""
+        self.async_on_remove(
+            async_dispatcher_connect(
+                self.hass,
+                SIGNAL_DAY_SEGMENT_UPDATED.format(self.entry_id),
+                self.async_write_ha_state
+            )
+        )
+
+class weathercanvasaiLatencySensor(SensorEntity):
+    """p95 latency of one stage, in ms; p50, max and the sample count as attributes."""
+
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+    _attr_device_class = SensorDeviceClass.DURATION
+    _attr_state_class = SensorStateClass.MEASUREMENT
+    _attr_native_unit_of_measurement = UnitOfTime.MILLISECONDS
+    _attr_icon = 'mdi:timer-outline'
+    _attr_has_entity_name = True
+
+    def __init__(self, hass, entry_id, stage, name, device_info=None):
+        self.hass = hass
+        self.entry_id = entry_id
+        self.stage = stage
+        self._attr_name = name
+        self._attr_device_info = device_info
+        self._attr_unique_id = f"{entry_id}_latency_{stage}"
+
+    def _histogram(self):
+        metrics = (_entry_data(self.hass, self.entry_id) or {}).get('metrics')
+        return metrics.histogram(self.stage) if metrics else None
+
+    @property
+    def native_value(self):
+        histogram = self._histogram()
+        return histogram.as_dict()["p95_ms"] if histogram else None
+
+    @property
+    def extra_state_attributes(self):
+        histogram = self._histogram()
+        return histogram.as_dict() if histogram else {}
+
+class weathercanvasaiCounterSensor(SensorEntity):
+    """A running total: bytes downloaded, tokens, API retries or cache hits."""
+
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+    _attr_state_class = SensorStateClass.TOTAL_INCREASING
+    _attr_has_entity_name = True
+
+    def __init__(self, hass, entry_id, key, name, value_fn, attributes_fn=None, icon=None, device_class=None, unit=None, device_info=None):
+        self.hass = hass
+        self.entry_id = entry_id
+        self._value_fn = value_fn
+        self._attributes_fn = attributes_fn
+        self._attr_name = name
+        self._attr_device_info = device_info
+        self._attr_unique_id = f"{entry_id}_{key}"
+        self._attr_icon = icon
+        self._attr_device_class = device_class
+        self._attr_native_unit_of_measurement = unit
+
+    @property
+    def native_value(self):
+        config_data = _entry_data(self.hass, self.entry_id)
+        return self._value_fn(config_data) if config_data else None
+
+    @property
+    def extra_state_attributes(self):
+        config_data = _entry_data(self.hass, self.entry_id)
+        if not config_data or not self._attributes_fn:
+            return {}
+        return self._attributes_fn(config_data)
+
+class weathercanvasaiSchedulerSensor(weathercanvasaiCounterSensor):
+    """API retries of the request scheduler all entries share.
+
+    Added once, with the first entry set up, and not part of a location's device.
+    """
+
+    _attr_has_entity_name = False
+
+    def __init__(self, hass, entry_id):
+        super().__init__(
+            hass, entry_id, "api_retries", "weathercanvasai API Retries (all locations)",
+            lambda data: data['request_scheduler'].stats["retries"],
+            lambda data: {
+                key: value for key, value in data['request_scheduler'].as_dict().items() if key != "models"
+            },
+            icon='mdi:refresh',
+        )
+        self._attr_unique_id = f"{DOMAIN}_api_retries"
+
+def _metrics_sensors(hass, entry_id, device_info=None):
+    """Diagnostic sensors for alerting on regressions and capacity planning."""
+    sensors = [
+        weathercanvasaiLatencySensor(hass, entry_id, stage, name, device_info) for stage, name in LATENCY_SENSORS
+    ]
+    sensors.append(weathercanvasaiCounterSensor(
+        hass, entry_id, "bytes_downloaded", "Bytes Downloaded",
+        lambda data: data['metrics'].counters["bytes_downloaded"],
+        lambda data: data['metrics'].counters,
+        icon='mdi:download', device_class=SensorDeviceClass.DATA_SIZE, unit=UnitOfInformation.BYTES,
+        device_info=device_info,
+    ))
+    sensors.append(weathercanvasaiCounterSensor(
+        hass, entry_id, "bytes_saved", "Bytes Saved by Encoding",
+        lambda data: data['metrics'].counters["bytes_saved"],
+        lambda data: data['image_encoder'].as_dict(),
+        icon='mdi:zip-box', device_class=SensorDeviceClass.DATA_SIZE, unit=UnitOfInformation.BYTES,
+        device_info=device_info,
+    ))
+    sensors.append(weathercanvasaiCounterSensor(
+        hass, entry_id, "prompt_tokens", "Prompt Tokens",
+        lambda data: data['metrics'].tokens.prompt_tokens + data['metrics'].tokens.completion_tokens,
+        lambda data: data['metrics'].tokens.as_dict(),
+        icon='mdi:counter', device_info=device_info,
+    ))
+    sensors.append(weathercanvasaiCounterSensor(
+        hass, entry_id, "cache_hits", "Cache Hits",
+        lambda data: data['prompt_cache'].hits + data['image_store'].hits + data['thumbnail_cache'].hits,
+        lambda data: {
+            "prompt_cache_hits": data['prompt_cache'].hits,
+            "prompt_cache_misses": data['prompt_cache'].misses,
+            "image_store_hits": data['image_store'].hits,
+            "image_store_misses": data['image_store'].misses,
+            "thumbnail_cache_hits": data['thumbnail_cache'].hits,
+            "thumbnail_cache_misses": data['thumbnail_cache'].misses,
+        },
+        icon='mdi:cached', device_info=device_info,
+    ))
+    return sensors
+
 async def async_setup_entry(hass, config_entry, async_add_entities):
     """Set up the sensors upon entry setup."""
-    prompts_sensor = weathercanvasaiPromptsSensor(hass, config_entry.entry_id, "weathercanvasai Prompts")
-    image_sensor = weathercanvasaiImageSensor(hass, config_entry.entry_id, "weathercanvasai Image")
-    async_add_entities([prompts_sensor, image_sensor])
+    entry_id = config_entry.entry_id
+    device_info = entry_device_info(config_entry)
+    sensors = [
+        weathercanvasaiPromptsSensor(hass, entry_id, "Prompts", device_info),
+        weathercanvasaiImageSensor(hass, entry_id, "Image", device_info),
+        weathercanvasaiDaySegmentSensor(hass, entry_id, "Day Segment", device_info),
+        *_metrics_sensors(hass, entry_id, device_info),
+    ]
+    # The scheduler is shared, so its sensor comes with one entry only
+    domain_data = hass.data[DOMAIN]
+    if domain_data.setdefault("scheduler_sensor_entry", entry_id) == entry_id:
+        sensors.append(weathercanvasaiSchedulerSensor(hass, entry_id))
+    # Earlier versions added a copy of it to every entry
+    entity_registry = er.async_get(hass)
+    per_entry_id = entity_registry.async_get_entity_id("sensor", DOMAIN, f"{entry_id}_api_retries")
+    if per_entry_id:
+        entity_registry.async_remove(per_entry_id)
+    async_add_entities(sensors)
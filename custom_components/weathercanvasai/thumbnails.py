@@ -0,0 +1,148 @@
+import asyncio
+import bisect
+import io
+import logging
+import os
+from collections import OrderedDict
+from homeassistant.core import HomeAssistant
+
+from .const import (
+    THUMBNAIL_BUCKETS,
+    THUMBNAIL_EAGER_BUCKETS,
+    THUMBNAIL_CACHE_MAX_BYTES,
+    THUMBNAIL_ENTRY_BYTES,
+    THUMBNAIL_QUALITY,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+# Pillow format and options of a thumbnail, by the extension of its image.
+# Thumbnails keep their image's format, the camera reports one content type for both.
+THUMBNAIL_FORMATS = {
+    ".png": ("PNG", {"optimize": True}),
+    ".jpg": ("JPEG", {"quality": THUMBNAIL_QUALITY, "optimize": True}),
+    ".webp": ("WEBP", {"quality": THUMBNAIL_QUALITY}),
+    ".avif": ("AVIF", {"quality": THUMBNAIL_QUALITY}),
+}
+
+
+def size_bucket(width, height):
+    """Return (dimension, bucket) for a requested size, rounding up to a bucket.
+
+    Requests are bucketed on the width when given, else on the height, so that
+    dashboards asking for 300, 310 or 320 pixels share one cached thumbnail.
+    Returns None when no resize is needed.
+    """
+    if width:
+        dimension, requested = "width", width
+    elif height:
+        dimension, requested = "height", height
+    else:
+        return None
+    index = bisect.bisect_left(THUMBNAIL_BUCKETS, requested)
+    if index == len(THUMBNAIL_BUCKETS):
+        return None  # Larger than the largest bucket, serve the original
+    return dimension, THUMBNAIL_BUCKETS[index]
+
+
+def _resize_image(path, dimension, bucket):
+    """Resize the image file to the bucket, in the image's own format; runs in the executor."""
+    from PIL import Image  # Only needed once a dashboard asks for a smaller image
+
+    pil_format, options = THUMBNAIL_FORMATS.get(os.path.splitext(path)[1].lower(), THUMBNAIL_FORMATS[".png"])
+    with Image.open(path) as image:
+        source = image.width if dimension == "width" else image.height
+        if bucket >= source:
+            return None
+        scale = bucket / source
+        if pil_format == "JPEG":
+            mode = "RGB"
+        else:
+            mode = image.mode if image.mode in ("RGB", "RGBA") else "RGBA"
+        resized = image.convert(mode).resize(
+            (max(1, round(image.width * scale)), max(1, round(image.height * scale))),
+            Image.LANCZOS,
+        )
+    output = io.BytesIO()
+    resized.save(output, format=pil_format, **options)
+    return output.getvalue()
+
+
+def _entry_size(thumbnail):
+    return len(thumbnail or b"") + THUMBNAIL_ENTRY_BYTES
+
+
+class ThumbnailCache:
+    """Memory bounded LRU of resized camera images, keyed by (image path, size bucket)."""
+
+    def __init__(self, hass: HomeAssistant, max_bytes: int = THUMBNAIL_CACHE_MAX_BYTES):
+        self.hass = hass
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._in_flight = {}
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    async def async_get(self, path, width=None, height=None):
+        """Return a resized copy of the image, or None when the original should be served."""
+        bucket = size_bucket(width, height)
+        if bucket is None:
+            return None
+        key = (path, *bucket)
+        if key in self._entries:
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return self._entries[key]
+        self.misses += 1
+        return await self._async_resize(key)
+
+    async def async_prepare(self, path, buckets=THUMBNAIL_EAGER_BUCKETS):
+        """Resize a freshly saved image to the common dashboard tile sizes."""
+        for bucket in buckets:
+            key = (path, "width", bucket)
+            if key not in self._entries:
+                await self._async_resize(key)
+
+    async def _async_resize(self, key):
+        # Concurrent requests for the same thumbnail share one resize job
+        if key in self._in_flight:
+            try:
+                return await asyncio.shield(self._in_flight[key])
+            except Exception:
+                return None  # Already logged by the first caller
+        future = self.hass.async_add_executor_job(_resize_image, *key)
+        self._in_flight[key] = future
+        try:
+            thumbnail = await future
+        except Exception as err:
+            _LOGGER.error("Error resizing camera image %s: %s", key[0], err)
+            return None
+        finally:
+            self._in_flight.pop(key, None)
+        # None (image already smaller than the bucket) is cached as well
+        self._store(key, thumbnail)
+        return thumbnail
+
+    def _store(self, key, thumbnail):
+        # None entries have a size too, or the byte budget wouldn't bound their number
+        size = _entry_size(thumbnail)
+        if size > self.max_bytes:
+            return
+        self._entries[key] = thumbnail
+        self._bytes += size
+        while self._bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= _entry_size(evicted)
+
+    def as_dict(self):
+        """Return cache size and hit rate, e.g. for diagnostics."""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+        }
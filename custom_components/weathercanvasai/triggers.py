@@ -0,0 +1,183 @@
+import datetime
+import logging
+import math
+import time
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.dispatcher import async_dispatcher_connect
+from homeassistant.helpers.event import async_track_state_change_event, async_call_later
+
+from .const import (
+    SIGNAL_DAY_SEGMENT_UPDATED,
+    PROMPT_CACHE_TEMPERATURE_BUCKET,
+    PROMPT_CACHE_CLOUD_BUCKET,
+    AUTO_GENERATE_TEMPERATURE_HYSTERESIS,
+    AUTO_GENERATE_CLOUD_HYSTERESIS,
+)
+from .weather_processing import async_calculate_day_segment, async_get_weather_scene, get_season
+from .pipeline import async_generate_scene
+from .scheduler import PRIORITY_BACKGROUND
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def _temperature_band(temperature):
+    return math.floor(temperature / PROMPT_CACHE_TEMPERATURE_BUCKET)
+
+
+def _cloud_bucket(cloud_coverage):
+    return round(cloud_coverage / PROMPT_CACHE_CLOUD_BUCKET)
+
+
+def _with_hysteresis(value, committed, bucket, margin):
+    """Return the bucket of value, but stay on the committed bucket until value is margin past its edge."""
+    if not isinstance(value, (int, float)):
+        return None
+    new = bucket(value)
+    if committed is None or new == committed:
+        return new
+    # Moving up the value must still be out of the committed bucket margin lower, and vice versa
+    shifted = bucket(value - margin if new > committed else value + margin)
+    return new if shifted != committed else committed
+
+
+class SceneTrigger:
+    """Starts the generate_scene pipeline when the quantized scene changes.
+
+    Listens to the entry's weather and sun entities and day segment changes. The scene
+    is quantized into condition, cloud bucket, temperature band, day segment
+    and season, with the buckets of the prompt cache; temperature and clouds
+    only move to another bucket once they are a margin past its edge. A change
+    has to hold for `debounce` seconds and runs are at least `min_interval`
+    seconds apart; a change settling during a run is looked at after it.
+    Everything else is counted as suppressed.
+    """
+
+    def __init__(self, hass: HomeAssistant, config_data: dict, debounce: float, min_interval: float):
+        self.hass = hass
+        self.config_data = config_data
+        self.debounce = debounce
+        self.min_interval = min_interval
+        self.weather_entity_id = config_data['weather_entity']
+        self.sun_entity_id = config_data['sun_entity']
+        self.scene = None  # The quantized scene of the last run
+        self._last_run = None  # monotonic
+        self._running = False
+        self._pending = False  # A change settled during a run, looked at again once it's done
+        self._unsubs = []
+        self._unsub_timer = None
+        self.triggers = 0
+        self.runs = 0
+        self.suppressed = {"unchanged": 0, "debounced": 0, "min_interval": 0, "running": 0}
+        self.last_change = None
+        self.last_run_at = None
+
+    @callback
+    def async_start(self):
+        self._unsubs.append(async_track_state_change_event(
+            self.hass, [self.weather_entity_id, self.sun_entity_id], self._async_state_changed
+        ))
+        self._unsubs.append(async_dispatcher_connect(
+            self.hass, SIGNAL_DAY_SEGMENT_UPDATED.format(self.config_data['entry_id']), self._async_changed
+        ))
+        # Quantize the current scene as the baseline, so setting up doesn't generate
+        self.hass.async_create_task(self._async_set_baseline())
+
+    @callback
+    def async_stop(self):
+        while self._unsubs:
+            self._unsubs.pop()()
+        self._pending = False
+        self._cancel_timer()
+
+    async def _async_set_baseline(self):
+        if self.scene is None:
+            self.scene = await self.async_quantize()
+
+    async def async_quantize(self) -> dict:
+        """Return the scene reduced to the parts that should change the image."""
+        weather = await async_get_weather_scene(self.hass, self.config_data) or {}
+        committed = self.scene or {}
+        return {
+            "condition": weather.get("condition"),
+            "cloud_bucket": _with_hysteresis(
+                weather.get("cloud_coverage"), committed.get("cloud_bucket"), _cloud_bucket, AUTO_GENERATE_CLOUD_HYSTERESIS
+            ),
+            "temperature_band": _with_hysteresis(
+                weather.get("temperature"), committed.get("temperature_band"), _temperature_band, AUTO_GENERATE_TEMPERATURE_HYSTERESIS
+            ),
+            "day_segment": await async_calculate_day_segment(self.hass, self.config_data),
+            "season": get_season(datetime.datetime.now()),
+        }
+
+    @callback
+    def _async_state_changed(self, event):
+        old_state = event.data.get("old_state")
+        new_state = event.data.get("new_state")
+        if event.data.get("entity_id") == self.sun_entity_id and old_state and new_state and old_state.state == new_state.state:
+            return  # Elevation and azimuth updates; segment changes arrive from the day segment tracker
+        self._async_changed()
+
+    @callback
+    def _async_changed(self):
+        self.triggers += 1
+        if self._unsub_timer:
+            # The scene changed again before the previous change settled
+            self.suppressed["debounced"] += 1
+            self._cancel_timer()
+        self._unsub_timer = async_call_later(self.hass, self.debounce, self._async_settled)
+
+    async def _async_settled(self, _now=None):
+        self._unsub_timer = None
+        scene = await self.async_quantize()
+        if scene == self.scene:
+            self.suppressed["unchanged"] += 1
+            return
+        if self._running:
+            # Deferred, not dropped: the next state change may be hours away
+            self.suppressed["running"] += 1
+            self._pending = True
+            return
+        if self._last_run is not None:
+            wait = self.min_interval - (time.monotonic() - self._last_run)
+            if wait > 0:
+                # Try again once the interval has passed, with whatever the scene is then
+                self.suppressed["min_interval"] += 1
+                self._unsub_timer = async_call_later(self.hass, wait, self._async_settled)
+                return
+
+        self.last_change = sorted(k for k in scene if (self.scene or {}).get(k) != scene[k])
+        _LOGGER.debug(f"Scene changed ({', '.join(self.last_change)}), generating: {scene}")
+        self.scene = scene
+        self._last_run = time.monotonic()
+        self.last_run_at = datetime.datetime.now().isoformat()
+        self.runs += 1
+        self._running = True
+        try:
+            await async_generate_scene(self.hass, self.config_data, priority=PRIORITY_BACKGROUND)
+        except Exception as e:
+            _LOGGER.error(f"Automatic scene generation failed: {e}")
+        finally:
+            self._running = False
+        if self._pending:
+            self._pending = False
+            if self._unsub_timer is None:
+                # Compared with the scene just generated, and held back for min_interval like any change
+                self._unsub_timer = async_call_later(self.hass, 0, self._async_settled)
+
+    def _cancel_timer(self):
+        if self._unsub_timer:
+            self._unsub_timer()
+            self._unsub_timer = None
+
+    def as_dict(self):
+        return {
+            "debounce_s": self.debounce,
+            "min_interval_s": self.min_interval,
+            "triggers": self.triggers,
+            "runs": self.runs,
+            "suppressed": dict(self.suppressed),
+            "suppressed_total": sum(self.suppressed.values()),
+            "scene": self.scene,
+            "last_change": self.last_change,
+            "last_run": self.last_run_at,
+        }
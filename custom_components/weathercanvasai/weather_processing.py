@@ -1,19 +1,50 @@
 import logging
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, callback
 import datetime
+import time
 import asyncio
-import pytz
-from homeassistant.const import CONF_LATITUDE, CONF_LONGITUDE
-from homeassistant.helpers.network import get_url
-from homeassistant.helpers.dispatcher import dispatcher_send
+import json
+from homeassistant.helpers.network import get_url, NoURLAvailableError
+from homeassistant.helpers.dispatcher import async_dispatcher_send
+from homeassistant.util import dt as dt_util
 
-import openai
 import aiohttp
-import aiofiles.os
 import os
-from .const import DOMAIN
-import json
-
+from .const import (
+    DOMAIN,
+    IMAGE_CHUNK_SIZE,
+    DEFAULT_RESPONSE_FORMAT,
+    CHAT_COMPLETION_TIMEOUT,
+    DEFAULT_WEATHER_ENTITY,
+    DEFAULT_SUN_ENTITY,
+    SIGNAL_PROMPTS_UPDATED,
+    SIGNAL_PROMPTS_STREAMING,
+    PROMPT_STREAM_UPDATE_INTERVAL,
+    SIGNAL_IMAGE_UPDATED,
+    SIGNAL_CAMERA_UPDATED,
+    OUTPUT_FORMAT_PNG,
+    DEFAULT_OUTPUT_QUALITY,
+)
+from .prompt_cache import scene_fingerprint
+from .prompt_compiler import PromptCompiler, compact_scene, compact_weather
+from .image_store import image_key
+from .image_view import image_url_path
+from .http_client import async_iter_sse_data
+from .image_io import async_write_chunks_content_addressed, async_iter_b64_json_image, _remove_quietly
+from .day_segments import calculate_day_segment
+from .scheduler import PRIORITY_USER
+from .metrics import (
+    async_observe,
+    async_increment,
+    async_executor_job,
+    async_observe_tokens,
+    STAGE_ENCODE,
+    STAGE_PROMPT_API,
+    STAGE_PROMPT_TTFT,
+    STAGE_IMAGE_API,
+    STAGE_DOWNLOAD,
+    STAGE_CLEAN_UP,
+)
 
 
 _LOGGER = logging.getLogger(__name__)
@@ -30,197 +61,237 @@ def get_season(now):
     else:
         return 'Winter'
 
-async def async_calculate_day_segment(hass: HomeAssistant) -> str:
+async def async_calculate_day_segment(hass: HomeAssistant, config_data: dict) -> str:
     """Calculate the current segment of the day based on sunrise and sunset times."""
+    tracker = config_data.get('day_segments')
+    if tracker is not None:
+        # Precomputed boundaries, rebuilt only when the sun entity changes
+        return tracker.async_current_segment()
+    return calculate_day_segment(hass.states.get(config_data.get('sun_entity', DEFAULT_SUN_ENTITY)))
+
+async def async_get_weather_scene(hass: HomeAssistant, config_data: dict):
+    """Return the structured weather (condition, temperature, cloud coverage), or None."""
+    # Get the state of the entry's weather entity
+    weather_data = hass.states.get(config_data.get('weather_entity', DEFAULT_WEATHER_ENTITY))
+    _LOGGER.debug("Weather Data %s", weather_data)
 
-    # Internal lookup table for time of day
-    day_lookup_table = {
-            # ... [your time segments for the day] ...
+    if not weather_data:
+        return None
+    # Extract required attributes
+    return {
+        "condition": weather_data.state,  # 'sunny' for example
+        "temperature": weather_data.attributes.get('temperature'),
+        "cloud_coverage": weather_data.attributes.get('cloud_coverage', 0),  # Default to 0 if not available
     }
 
-    # Internal lookup table for time of night
-    night_lookup_table = {
-            # ... [your time segments for the night] ...
-    }
-    
-    # Internal lookup table for time of day
-    day_lookup_table = {
-        "0.0-0.1": "sunrise",
-        "0.1-0.2": "early morning",
-        "0.2-0.3": "mid-morning",
-        "0.3-0.4": "late morning",
-        "0.4-0.5": "noon",
-        "0.5-0.6": "early afternoon",
-        "0.6-0.7": "mid-afternoon",
-        "0.7-0.8": "late afternoon",
-        "0.8-0.9": "dusk",
-        "0.9-1.0": "sunset",
-        }
-    night_lookup_table = {
-    "0.0-0.1": "twilight",
-    "0.1-0.2": "early night",
-    "0.2-0.3": "nightfall",
-    "0.3-0.4": "midnight hours",
-    "0.4-0.5": "late night",
-    "0.5-0.6": "deep night",
-    "0.6-0.7": "quiet hours",
-    "0.7-0.8": "pre-dawn",
-    "0.8-0.9": "dawn's first light",
-    "0.9-1.0": "dawn",
+async def async_get_weather_conditions(hass: HomeAssistant, config_data: dict) -> str:
+    weather = await async_get_weather_scene(hass, config_data)
+    if weather is None:
+        _LOGGER.info("Weather data could not be retrieved.")
+    return compact_weather(weather)
+
+async def async_build_scene(hass: HomeAssistant, config_data: dict) -> dict:
+    """Collect location, day segment, season and weather, and the chatgpt_in text built from them."""
+    # Get daypart and season
+    day_segment = await async_calculate_day_segment(hass, config_data)
+    season = get_season(datetime.datetime.now())
+    # Retrieve the stored location name from the configuration
+    location_name = config_data.get('location_name', 'Unknown Location')
+    # Get weather conditions
+    weather = await async_get_weather_scene(hass, config_data)
+    if weather is None:
+        _LOGGER.info("Weather data could not be retrieved.")
+
+    # Combine the information into chatgpt_in, to be sent to chatgpt next and receive chatgpt_out.
+    # Compact, as every input token adds to the latency and cost of the call
+    chatgpt_in = compact_scene(location_name, day_segment, season, weather)
+    return {
+        "location_name": location_name,
+        "day_segment": day_segment,
+        "season": season,
+        "weather": weather,
+        "chatgpt_in": chatgpt_in,
     }
 
-    now = datetime.datetime.now(datetime.timezone.utc)
-    current_time = now.time()  # Extracting only the time component
-
-    sun_state = hass.states.get('sun.sun').state
-    sun_attrs = hass.states.get('sun.sun').attributes
-    sunrise_time = datetime.datetime.fromisoformat(sun_attrs['next_rising']).time()
-    sunset_time = datetime.datetime.fromisoformat(sun_attrs['next_setting']).time()
-
-    # Calculate the duration of the day
-    day_length = datetime.datetime.combine(datetime.date.min, sunset_time) - \
-                 datetime.datetime.combine(datetime.date.min, sunrise_time)
-    # Calculate the duration of the night
-    night_length = datetime.timedelta(hours=24) - day_length
-
-    if sun_state == 'above_horizon':
-        # It's daytime
-        time_passed = datetime.datetime.combine(datetime.date.min, current_time) - \
-                      datetime.datetime.combine(datetime.date.min, sunrise_time)
-        period_length = day_length
-        lookup_table = day_lookup_table
+async def async_get_dalle_prompt(hass: HomeAssistant, config_data: dict, scene: dict, refresh=False, priority=PRIORITY_USER):
+    """Return (chatgpt_out, scene_key, cache_hit) for a scene, asking ChatGPT only on a cache miss."""
+    prompt_cache = config_data['prompt_cache']
+    scene_key = scene_fingerprint(
+        scene, config_data.get("system_instruction"), config_data.get("gpt_model_name")
+    )
+    if not refresh:
+        cached_prompt = prompt_cache.async_get(scene_key)
+        if cached_prompt:
+            _LOGGER.debug(f"Prompt cache hit for scene {scene_key}")
+            return cached_prompt, scene_key, True
+
+    start_time = time.monotonic()
+    chatgpt_out = await async_create_dalle_prompt(hass, scene["chatgpt_in"], config_data, priority)
+    async_observe(config_data.get('metrics'), STAGE_PROMPT_API, time.monotonic() - start_time)
+    if chatgpt_out and not chatgpt_out.startswith("Error"):
+        prompt_cache.async_put(scene_key, chatgpt_out, time.monotonic() - start_time)
     else:
-        # It's nighttime
-        time_passed = datetime.datetime.combine(datetime.date.min, current_time) - \
-                      datetime.datetime.combine(datetime.date.min, sunset_time)
-        period_length = night_length
-        lookup_table = night_lookup_table
-    fraction = time_passed.total_seconds() / period_length.total_seconds()
-
-    #_LOGGER.debug(f"Day Length: {day_length}, Night Length: {night_length}, Time Passed: {time_passed}, Fraction of Period Passed: {fraction}")
-
-    # Find the matching description in the lookup table
-    for key, description in lookup_table.items():
-        if '+' in key:
-            lower_bound = key[:-1]
-            if fraction >= float(lower_bound):
-                return description
-        else:
-            lower_bound, upper_bound = key.split('-')
-            if float(lower_bound) <= fraction < float(upper_bound):
-                return description
-
-    return "Unknown time"
-
-async def async_get_weather_conditions(hass: HomeAssistant) -> str:
-    # Get the state of the weather entity
-    weather_data = hass.states.get('weather.forecast_home')
-    _LOGGER.debug("Weather Data %s", weather_data)
-    
-    if weather_data:
-        # Extract required attributes
-        temperature = weather_data.attributes.get('temperature')
-        cloud_coverage = weather_data.attributes.get('cloud_coverage', 0)  # Default to 0 if not available
-        weather_conditions = weather_data.state  # 'sunny' in this case
-
-        # Cloudiness description table
-        cloudiness_descriptions = {
-            0: "The sky is completely clear.",
-            10: "A few wisps of clouds dot the sky.",
-            20: "Scattered clouds gently float by.",
-            30: "A patchwork of clouds adorns the sky.",
-            40: "Partly cloudy with blue sky peeking through.",
-            50: "A balanced mix of sun and clouds.",
-            60: "More clouds than sun overhead.",
-            70: "The sky is mostly cloudy.",
-            80: "Thick clouds blanket most of the sky.",
-            90: "The sky is grey and heavily clouded.",
-            100: "Clouds completely cover the sky.",
-        }
-
-        # Find the closest key in the dictionary to the cloud coverage value
-        closest_cloudiness = min(cloudiness_descriptions.keys(), key=lambda k: abs(k - cloud_coverage))
-        cloudiness_desc = cloudiness_descriptions[closest_cloudiness]
-
-        # Construct your prompt using the weather data
-        prompt = f"It's a {weather_conditions} day with a temperature of {temperature}°C. {cloudiness_desc}"
-
-        return prompt
-    else:
-        _LOGGER.info("Weather data could not be retrieved.")
-        return "Be creative about the weather."
-
-async def clean_up_images(directory, max_images):
-    _LOGGER.debug(f"Starting cleanup of images in {directory}. Retaining {max_images} most recent images.")
-    # List all image files in the directory
-    files = [os.path.join(directory, f) for f in os.listdir(directory) if f.endswith('.png')]
-    _LOGGER.debug(f"Found {len(files)} image(s) in the directory.")
-    # Sort files by modification time in ascending order (oldest first)
-    files.sort(key=os.path.getmtime)
-    # Calculate the number of files to remove
-    files_to_remove = len(files) - max_images
-    _LOGGER.debug(f"Preparing to remove {files_to_remove} old image(s).")
-
-    # Remove older files, only keep the 'max_images' most recent files
-    for file in files[:-max_images]:
-        try:
-            await aiofiles.os.remove(file)
-            _LOGGER.debug(f"Removed old image file: {file}")
-        except Exception as e:
-            _LOGGER.error(f"Error removing file {file}: {e}")
-
-async def async_create_dalle_prompt(hass: HomeAssistant, chatgpt_in: str, config_data: dict) -> str:
+        async_increment(config_data.get('metrics'), "prompt_errors")
+    return chatgpt_out, scene_key, False
+
+async def clean_up_images(hass, config_data, max_images, max_bytes=0):
+    """Remove the entry's oldest generated images beyond the retention count and byte budget."""
+    image_index = config_data['image_index']
+    _LOGGER.debug(f"Starting cleanup of images. Retaining {max_images} most recent images within {max_bytes or 'unlimited'} bytes.")
+    start_time = time.monotonic()
+    evicted = await image_index.async_evict(max_images, max_bytes)
+    async_observe(config_data.get('metrics'), STAGE_CLEAN_UP, time.monotonic() - start_time)
+    _LOGGER.debug(f"Removed {len(evicted)} old image(s), {image_index.count} image(s) retained.")
+
+async def async_create_dalle_prompt(hass: HomeAssistant, chatgpt_in: str, config_data: dict, priority=PRIORITY_USER) -> str:
     openai_api_key = config_data.get("openai_api_key")
     chatgpt_model = config_data.get("gpt_model_name", 'gpt-3.5-turbo')
-    system_instruction = config_data.get("system_instruction")
-    
+
     # Check if OpenAI API key is available
     if not openai_api_key:
         _LOGGER.error("OpenAI API key is not configured.")
         return "Error: OpenAI API key is not configured."
 
-    # System instruction for DALL-E prompt creation
-    # system_instruction = "Create a succinct DALL-E prompt under 100 words, that will create an artistic image, focusing on the most visually striking aspects of the given city/region, weather, and time of day. Highlight key elements that define the scene's character, such as specific landmarks, weather effects, folkore or cultural features, in a direct and vivid manner. Avoid elaborate descriptions; instead, aim for a prompt that vividly captures the essence of the scene in a concise format, suitable for generating a distinct and compelling image."
-
-    def make_api_call():
-        openai.api_key = openai_api_key
-        return openai.ChatCompletion.create(
-            model=chatgpt_model,
-            messages=[
-                {"role": "system", "content": system_instruction},
-                {"role": "user", "content": chatgpt_in}
-            ],
-            temperature=1,
-            max_tokens=256,
-            top_p=1,
-            frequency_penalty=0,
-            presence_penalty=0
-        )
+    # The system instruction, its token count and max_tokens, compiled once per options change
+    compiler = config_data.get("prompt_compiler")
+    if compiler is None:
+        compiler = config_data["prompt_compiler"] = PromptCompiler(config_data.get("system_instruction"))
 
-    try:
-        response = await hass.async_add_executor_job(make_api_call)
+    # Native asyncio request on the pooled HTTP client: no executor thread is held
+    # while ChatGPT answers, the key is sent per request instead of set globally,
+    # and cancelling the calling task aborts the request. The scheduler keeps it
+    # within the rate limits and retries throttled and failed calls.
+    scheduler = config_data['request_scheduler']
+    headers = {
+        "Authorization": f"Bearer {openai_api_key}",
+        "Content-Type": "application/json"
+    }
+    payload = {
+        "model": chatgpt_model,
+        "messages": compiler.messages(chatgpt_in),
+        "temperature": 1,
+        # Room for the length the instruction asks for, fewer tokens to reserve and generate
+        "max_tokens": compiler.max_tokens,
+        "top_p": 1,
+        "frequency_penalty": 0,
+        "presence_penalty": 0
+    }
+    stream = config_data.get("stream_prompts", False)
+    if stream:
+        payload["stream"] = True
+        # The usage comes in a last chunk of its own
+        payload["stream_options"] = {"include_usage": True}
+    prompt_tokens = compiler.prompt_tokens(chatgpt_in)
 
-        # Check if the response is valid and contains choices
-        if response and response.choices and len(response.choices) > 0:
-            chatgpt_prompt = response.choices[0].message.content
+    try:
+        start_time = time.monotonic()
+        async with scheduler.async_request(
+            "POST",
+            "/chat/completions",
+            chatgpt_model,
+            priority=priority,
+            account=config_data.get("account"),
+            tokens=prompt_tokens + compiler.max_tokens,
+            json=payload,
+            headers=headers,
+            timeout=aiohttp.ClientTimeout(total=CHAT_COMPLETION_TIMEOUT),
+        ) as response:
+            if response.status != 200:
+                response_text = await response.text()
+                _LOGGER.error(f"Error calling OpenAI API: {response.status} {response_text}")
+                return f"Error: OpenAI API returned status {response.status}"
+            if stream:
+                chatgpt_prompt, finish_reason, usage, seconds = await _async_read_prompt_stream(
+                    hass, config_data, response, chatgpt_in, start_time
+                )
+            else:
+                result = await response.json()
+                choice = (result.get("choices") or [{}])[0]
+                chatgpt_prompt = choice.get("message", {}).get("content")
+                finish_reason = choice.get("finish_reason")
+                usage = result.get("usage")
+                # OpenAI's own processing time, without the queueing and retries on our side
+                seconds = _processing_seconds(response.headers) or time.monotonic() - start_time
+
+        _record_token_usage(config_data, usage, seconds, prompt_tokens, finish_reason == "length")
+        if finish_reason == "length":
+            _LOGGER.warning(f"ChatGPT's prompt was cut off at max_tokens={compiler.max_tokens}")
+        if chatgpt_prompt:
             return chatgpt_prompt.strip()
+    except asyncio.TimeoutError:
+        _LOGGER.error(f"Timeout calling OpenAI API after {CHAT_COMPLETION_TIMEOUT} seconds")
+        return "Error: Timeout waiting for ChatGPT."
     except Exception as e:
         _LOGGER.error(f"Error calling OpenAI API: {e}")
         return f"Error: {str(e)}"
 
     return "Error: No response from ChatGPT."
 
-async def generate_dalle2_image(hass, prompt, size):
+async def _async_read_prompt_stream(hass, config_data, response, chatgpt_in, start_time):
+    """Read a streamed chat completion, publishing the prompt as it grows.
+
+    Published at most every PROMPT_STREAM_UPDATE_INTERVAL. Returns
+    (prompt, finish_reason, usage, seconds from the first token to the last).
+    """
+    parts = []
+    finish_reason = usage = first_token_time = None
+    last_update = 0.0
+    try:
+        async for event in async_iter_sse_data(response.content):
+            chunk = json.loads(event)
+            usage = chunk.get("usage") or usage
+            for choice in chunk.get("choices") or []:
+                finish_reason = choice.get("finish_reason") or finish_reason
+                content = (choice.get("delta") or {}).get("content")
+                if not content:
+                    continue
+                now = time.monotonic()
+                if first_token_time is None:
+                    first_token_time = now
+                    async_observe(config_data.get('metrics'), STAGE_PROMPT_TTFT, now - start_time)
+                parts.append(content)
+                if now - last_update >= PROMPT_STREAM_UPDATE_INTERVAL:
+                    last_update = now
+                    async_publish_streaming_prompt(hass, config_data, chatgpt_in, "".join(parts))
+    except BaseException:
+        if last_update:
+            # Back to the last complete prompt
+            async_publish_streaming_prompt(hass, config_data, chatgpt_in, None)
+        raise
+    end_time = time.monotonic()
+    return "".join(parts), finish_reason, usage, end_time - (first_token_time or start_time)
+
+def _processing_seconds(headers):
+    try:
+        return int(headers.get("openai-processing-ms")) / 1000
+    except (TypeError, ValueError):
+        return None
+
+def _record_token_usage(config_data, usage, seconds, estimated_prompt_tokens, truncated):
+    """Record the tokens a chat completion used and its completion tokens per second."""
+    if not usage:
+        return
+    async_observe_tokens(
+        config_data.get('metrics'),
+        usage.get("prompt_tokens", 0),
+        usage.get("completion_tokens", 0),
+        seconds,
+        estimated_prompt_tokens,
+        truncated,
+    )
+
+async def generate_dalle2_image(hass, config_data, prompt, size, response_format=None, scene_key=None, refresh=False, timings=None, priority=PRIORITY_USER):
     # Payload for Dalle-2
     payload = {
         "prompt": prompt,
         "n": 1,
         "model": "dall-e-2",
-        "size": size
+        "size": size,
+        "response_format": response_format or config_data.get('response_format', DEFAULT_RESPONSE_FORMAT)
     }
-    return await post_request_and_save_image(hass, payload)
+    return await async_generate_image(hass, config_data, payload, scene_key, refresh, timings, priority)
 
-async def generate_dalle3_image(hass, prompt, size, quality, style):
+async def generate_dalle3_image(hass, config_data, prompt, size, quality, style, response_format=None, scene_key=None, refresh=False, timings=None, priority=PRIORITY_USER):
     # Payload for Dalle-3
     payload = {
         "prompt": prompt,
@@ -228,80 +299,273 @@ async def generate_dalle3_image(hass, prompt, size, quality, style):
         "model": "dall-e-3",
         "size": size,
         "quality": quality,
-        "style": style
+        "style": style,
+        "response_format": response_format or config_data.get('response_format', DEFAULT_RESPONSE_FORMAT)
     }
-    return await post_request_and_save_image(hass, payload)
-
-async def post_request_and_save_image(hass, payload):
+    return await async_generate_image(hass, config_data, payload, scene_key, refresh, timings, priority)
+
+async def async_generate_image(hass, config_data, payload, scene_key=None, refresh=False, timings=None, priority=PRIORITY_USER):
+    """Generate an image, coalescing identical requests that arrive together.
+
+    Concurrent callers with the same prompt, model, size, quality and style share
+    one generation, and within the configured cooldown the last result is
+    returned again, so bursty triggers don't pay or churn the disk twice.
+    Stage durations are added to the timings dict, if given, by the caller
+    that actually runs the generation.
+    """
+    flight_key = (payload["prompt"], payload["model"], payload["size"], payload.get("quality"), payload.get("style"))
+    return await config_data['image_flights'].async_run(
+        flight_key,
+        lambda: _async_generate_or_reuse_image(hass, config_data, payload, scene_key, refresh, timings, priority),
+        replay=not refresh,
+    )
+
+async def _async_generate_or_reuse_image(hass, config_data, payload, scene_key=None, refresh=False, timings=None, priority=PRIORITY_USER):
+    """Serve a repeated scene from the image store, and only call DALL-E on a miss."""
+    image_store = config_data['image_store']
+    store_key = image_key(
+        scene_key or payload["prompt"], payload["model"], payload["size"], payload.get("quality"), payload.get("style")
+    )
+    if not refresh:
+        cached_path = await image_store.async_get(store_key, _published_path(config_data))
+        if cached_path:
+            _LOGGER.debug(f"Image store hit for {store_key}: {cached_path}")
+            if timings is not None:
+                timings["image_source"] = "store"
+            return async_publish_image(hass, config_data, cached_path)
+    full_image_url = await post_request_and_save_image(hass, config_data, payload, store_key, timings, priority)
+    if full_image_url is None:
+        async_increment(config_data.get('metrics'), "image_errors")
+    return full_image_url
+
+def _published_path(config_data):
+    """Path of the image being shown, kept by the image store's removals."""
+    published = config_data['image_index'].published
+    return published["path"] if published else None
+
+@callback
+def async_publish_prompts(hass, config_data, data):
+    """Keep the entry's latest prompts for the image services and update its prompts sensor."""
+    config_data['chatgpt_in'] = data.get("chatgpt_in")
+    config_data['chatgpt_out'] = data.get("chatgpt_out")
+    config_data['scene_key'] = data.get("scene_key")
+    # The prompt history keeps the text, the sensor keeps it out of the recorder
+    prompt_history = config_data.get('prompt_history')
+    chatgpt_out = data.get("chatgpt_out")
+    if prompt_history and chatgpt_out and not chatgpt_out.startswith("Error"):
+        prompt_history.async_add(data.get("chatgpt_in"), chatgpt_out, data.get("scene_key"), data.get("cache_hit", False))
+    async_dispatcher_send(hass, SIGNAL_PROMPTS_UPDATED.format(config_data['entry_id']), data)
+
+@callback
+def async_publish_streaming_prompt(hass, config_data, chatgpt_in, chatgpt_out):
+    """Send a prompt while it streams in, None when the stream failed.
+
+    Goes to the prompts sensor and the websocket subscribers only: config_data
+    and the prompt history get the complete prompt from async_publish_prompts.
+    """
+    async_dispatcher_send(hass, SIGNAL_PROMPTS_STREAMING.format(config_data['entry_id']), {
+        "chatgpt_in": chatgpt_in,
+        "chatgpt_out": chatgpt_out,
+    })
+
+@callback
+def async_publish_image(hass, config_data, file_path, master_path=None):
+    """Make a saved image the latest one and hand it to the camera and image sensor.
+
+    The camera receives the file path itself, so it reads the image from disk
+    instead of fetching it back from Home Assistant's own web server.
+    """
+    full_image_url = _set_latest_image(hass, config_data, file_path, master_path, dt_util.utcnow())
+    # Kept in the image index, so a restart shows this image again
+    image_index = config_data.get('image_index')
+    if image_index:
+        image_index.async_set_published(file_path, master_path)
+    # Send dispatcher signals to notify the entry's sensor and camera that the image has been updated
+    entry_id = config_data['entry_id']
+    async_dispatcher_send(hass, SIGNAL_IMAGE_UPDATED.format(entry_id))
+    async_dispatcher_send(hass, SIGNAL_CAMERA_UPDATED.format(entry_id), file_path)
+    # Resize to the common tile sizes before the dashboards ask for them
+    thumbnail_cache = config_data.get('thumbnail_cache')
+    if thumbnail_cache:
+        hass.async_create_task(thumbnail_cache.async_prepare(file_path))
+    return full_image_url
+
+async def async_restore_latest_image(hass, config_data):
+    """Show the image shown before the restart again, straight from disk.
+
+    Called at setup, before the camera and sensors are added; they pick it up
+    from the entry's data. No API call and no directory listing.
+    """
+    record = await config_data['image_index'].async_get_published()
+    if record is None:
+        return
+    _set_latest_image(
+        hass, config_data, record["path"], record.get("master"), dt_util.utc_from_timestamp(record["published"])
+    )
+    _LOGGER.debug(f"Restored the latest image: {record['path']}")
+
+def _set_latest_image(hass, config_data, file_path, master_path, published):
+    relative_path = os.path.relpath(file_path, hass.config.path("www")).replace(os.sep, "/")
+    # Local path, served by Home Assistant from the www directory
+    local_image_path = f"/local/{relative_path}"
+    # Served by the integration's image view, cacheable for good as the name is content hashed
+    image_url = image_url_path(config_data, file_path)
+    try:
+        # Full URL, convenient for notifications and external use
+        full_image_url = f"{get_url(hass, allow_internal=True)}{image_url}"
+    except NoURLAvailableError:
+        full_image_url = image_url
+    config_data['latest_image_path'] = file_path
+    config_data['latest_image_url'] = image_url
+    config_data['latest_image_full_url'] = full_image_url
+    config_data['latest_image_local_path'] = local_image_path
+    config_data['latest_image_master_path'] = master_path
+    config_data['latest_image_published'] = published
+    return full_image_url
+
+def _record_generation_latency(config_data, response_format, seconds):
+    """Keep per response format latency totals, reported in the diagnostics."""
+    stats = config_data.setdefault('generation_stats', {})
+    mode_stats = stats.setdefault(response_format, {"count": 0, "total_s": 0.0, "last_s": None})
+    mode_stats["count"] += 1
+    mode_stats["total_s"] += seconds
+    mode_stats["last_s"] = round(seconds, 3)
+
+async def post_request_and_save_image(hass, config_data, payload, store_key=None, timings=None, priority=PRIORITY_USER):
     # Retrieve the OpenAI API key from the configuration
-    config_data = hass.data[DOMAIN]
     openai_api_key = config_data['openai_api_key']
-    # Endpoint
-    openai_url = "https://api.openai.com/v1/images/generations"
+    response_format = payload.get("response_format", DEFAULT_RESPONSE_FORMAT)
+    # The API call goes through the scheduler, the CDN download straight to the pooled client
+    scheduler = config_data['request_scheduler']
+    session = config_data['http_client'].session
+    metrics = config_data.get('metrics')
     # Headers
     headers = {
         "Authorization": f"Bearer {openai_api_key}",
         "Content-Type": "application/json"
     }
     _LOGGER.debug("Payload for DALL-E API: %s", payload)
+    if timings is None:
+        timings = {}
+    timings["image_source"] = "api"
 
-    async with aiohttp.ClientSession() as session:
-            try:
-                async with session.post(openai_url, json=payload, headers=headers) as response:
-                    #_LOGGER.debug("Received response status: %s", response.status)
-                    response_text = await response.text()
-                    _LOGGER.debug("Received response text: %s", response_text)
-                    if response.status == 200:
-                        result = await response.json()
-                        # Check if 'data' is present in the response and it is not empty
-                        if 'data' in result and result['data']:
-                            # Extract the image URL directly from the data array
-                            image_url = result['data'][0].get('url')
-                            if image_url:
-                                async with session.get(image_url) as image_response:
-                                    if image_response.status == 200:
-                                        image_data = await image_response.read()
-                                        try:
-                                            os.makedirs('/config/www', exist_ok=True)  # Create the directory if it doesn't exist
-                                            # Generate a timestamped filename
-                                            timestamp = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
-                                            filename = f"dalle_{timestamp}.png"
-                                            file_path = f"/config/www/{filename}"
-                                            # Save the image with the timestamped filename
-                                            with open(file_path, 'wb') as file:
-                                                file.write(image_data)
-                                                #_LOGGER.debug(f"Image saved as {filename} in the directory: /config/www")
-                                                # Convert the file path to a URL accessible within Home Assistant
-                                                # Full URL
-                                                full_image_url = f"{get_url(hass, allow_internal=True)}/local/{filename}"
-                                                hass.data[DOMAIN]['latest_image_full_url'] = full_image_url
-                                                # Local path
-                                                local_image_path = f"/local/{filename}"
-                                                hass.data[DOMAIN]['latest_image_local_path'] = local_image_path
-                                                # Log the URL that was saved to the domain
-                                                #_LOGGER.debug(f"Latest image URL saved in domain: {full_image_url}")
-                                                # Send a dispatcher signal to notify that the image URL has been updated
-                                                dispatcher_send(hass, "update_weathercanvasai_image_sensor")
-                                                # Retrieve the max_images_retained value from your configuration
-                                                max_images_retained = hass.data[DOMAIN].get('max_images_retained', 5)  # Default to 5 if not set
-                                                # Call the function to clean up old images
-                                                await clean_up_images('/config/www', max_images_retained)
-                                                return full_image_url
-                                        except Exception as e:
-                                            _LOGGER.error("Error saving the image: %s", str(e))
-                                            return None  # Return None if there's an error
-                                    else:
-                                        _LOGGER.error("Failed to download image: %s", image_response.status)
-                                        return None  # Return None if the image download failed
-                            else:
-                                _LOGGER.error("No 'url' key in the response data.")
-                                return None
-                        else:
-                            _LOGGER.error("The 'data' key is missing or empty in the response.")
-                            return None
-                    else:
-                        _LOGGER.error("Failed to generate image with DALL-E: %s", response.status)
-                        return None
-            except Exception as e:
-                _LOGGER.error("Exception occurred while generating image with DALL-E: %s", str(e))
-                return None
\ No newline at end of file
+    # Timestamped filename, completed with the hash of the image once it is written,
+    # so each URL always serves the same bytes and can be cached forever
+    timestamp = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
+    filename_prefix = f"dalle_{timestamp}_"
+    image_dir = config_data.get('image_directory') or hass.config.path("www")
+
+    start_time = time.monotonic()
+    try:
+        async with scheduler.async_request(
+            "POST", "/images/generations", payload["model"], priority=priority,
+            account=config_data.get("account"), json=payload, headers=headers
+        ) as response:
+            #_LOGGER.debug("Received response status: %s", response.status)
+            if response.status != 200:
+                response_text = await response.text()
+                _LOGGER.error("Failed to generate image with DALL-E: %s %s", response.status, response_text)
+                return None
+            if response_format == "b64_json":
+                # The image is inline in the response, decode it straight to disk
+                try:
+                    file_path, image_size = await async_write_chunks_content_addressed(
+                        hass, async_iter_b64_json_image(response.content, IMAGE_CHUNK_SIZE), image_dir, filename_prefix, ".png", metrics
+                    )
+                except Exception as e:
+                    _LOGGER.error("Error saving the image: %s", str(e))
+                    return None  # Return None if there's an error
+            else:
+                # Decode the API body once
+                result = await response.json()
+                _LOGGER.debug("Received response: %s", result)
+        # For b64_json this includes receiving and saving the image
+        timings["image_api_s"] = round(time.monotonic() - start_time, 3)
+        async_observe(metrics, STAGE_IMAGE_API, time.monotonic() - start_time)
+
+        if response_format != "b64_json":
+            # Check if 'data' is present in the response and it is not empty
+            if not ('data' in result and result['data']):
+                _LOGGER.error("The 'data' key is missing or empty in the response.")
+                return None
+            # Extract the image URL directly from the data array
+            image_url = result['data'][0].get('url')
+            if not image_url:
+                _LOGGER.error("No 'url' key in the response data.")
+                return None
+
+            download_start = time.monotonic()
+            async with session.get(image_url) as image_response:
+                if image_response.status != 200:
+                    _LOGGER.error("Failed to download image: %s", image_response.status)
+                    return None  # Return None if the image download failed
+                try:
+                    # Stream the image to disk in fixed-size chunks, off the event loop
+                    file_path, image_size = await async_write_chunks_content_addressed(
+                        hass, image_response.content.iter_chunked(IMAGE_CHUNK_SIZE), image_dir, filename_prefix, ".png", metrics
+                    )
+                except Exception as e:
+                    _LOGGER.error("Error saving the image: %s", str(e))
+                    return None  # Return None if there's an error
+            timings["download_s"] = round(time.monotonic() - download_start, 3)
+            async_observe(metrics, STAGE_DOWNLOAD, time.monotonic() - download_start)
+        _LOGGER.debug(f"Image saved as {os.path.basename(file_path)} ({image_size} bytes) in the directory: {image_dir}")
+    except Exception as e:
+        _LOGGER.error("Exception occurred while generating image with DALL-E: %s", str(e))
+        return None
+    _record_generation_latency(config_data, response_format, time.monotonic() - start_time)
+    async_increment(metrics, "images_saved")
+    async_increment(metrics, "bytes_downloaded", image_size)
+
+    # Dashboards get the compact variant, if one is configured
+    published_path, published_size, master_path = await _async_encode_image(hass, config_data, file_path, image_size)
+    config_data['image_index'].async_add(
+        published_path, published_size, payload.get("prompt"), master=master_path, master_size=image_size if master_path else 0
+    )
+    full_image_url = async_publish_image(hass, config_data, published_path, master_path)
+    # Storing and retention don't hold up the caller, they run alongside
+    hass.async_create_task(_async_store_and_clean_up(hass, config_data, published_path, published_size, store_key))
+    return full_image_url
+
+async def _async_encode_image(hass, config_data, file_path, image_size):
+    """Transcode a saved PNG to the configured output format.
+
+    Returns (path, size, master path) of the image to publish; the PNG itself
+    when no other format is configured, encoding fails or doesn't make it smaller.
+    """
+    output_format = config_data.get('output_format', OUTPUT_FORMAT_PNG)
+    if output_format == OUTPUT_FORMAT_PNG:
+        return file_path, image_size, None
+    metrics = config_data.get('metrics')
+    start_time = time.monotonic()
+    try:
+        encoded_path, encoded_size = await config_data['image_encoder'].async_transcode(
+            file_path, output_format, config_data.get('output_quality', DEFAULT_OUTPUT_QUALITY)
+        )
+    except Exception as e:
+        _LOGGER.error(f"Error encoding the image as {output_format}, keeping the PNG: {e}")
+        return file_path, image_size, None
+    async_observe(metrics, STAGE_ENCODE, time.monotonic() - start_time)
+    if encoded_size >= image_size:
+        # Flat images can come out larger at a high quality; the PNG is the better file then
+        _LOGGER.debug(f"Image as {output_format} isn't smaller ({image_size} -> {encoded_size} bytes), keeping the PNG")
+        await async_executor_job(hass, metrics, _remove_quietly, encoded_path)
+        return file_path, image_size, None
+    async_increment(metrics, "bytes_saved", image_size - encoded_size)
+    _LOGGER.debug(f"Image encoded as {output_format}: {image_size} -> {encoded_size} bytes")
+    if config_data.get('keep_png_master'):
+        return encoded_path, encoded_size, file_path
+    await async_executor_job(hass, metrics, _remove_quietly, file_path)
+    return encoded_path, encoded_size, None
+
+async def _async_store_and_clean_up(hass, config_data, file_path, image_size, store_key):
+    if hass.data.get(DOMAIN, {}).get(config_data['entry_id']) is not config_data:
+        return  # Unloaded in the meantime
+    if store_key:
+        # Keep the image for repeated scenes
+        await config_data['image_store'].async_add(store_key, file_path, image_size, _published_path(config_data))
+    # Retrieve the retention settings from your configuration
+    max_images_retained = config_data.get('max_images_retained', 5)  # Default to 5 if not set
+    max_images_bytes = config_data.get('max_images_bytes', 0)
+    # Call the function to clean up old images
+    await clean_up_images(hass, config_data, max_images_retained, max_images_bytes)
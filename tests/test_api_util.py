@@ -0,0 +1,50 @@
+"""The Google Maps key is always checked against the API, the geocode cache only saves name lookups."""
+import asyncio
+
+from homeassistant.core import HomeAssistant
+
+from weathercanvasai import api_util
+from weathercanvasai.api_util import GeocodeError, test_googlemaps_api as googlemaps_api
+
+
+GHENT = [{"address_components": [{"long_name": "Ghent", "types": ["locality"]}]}]
+
+
+def _run(tmp_path, monkeypatch, refresh, geocode):
+    """Geocode the home location with a good key, then call again with another key."""
+    calls = []
+
+    async def reverse_geocode(hass, key, latitude, longitude):
+        calls.append(key)
+        return GHENT if key == "good" else await geocode(key)
+
+    monkeypatch.setattr(api_util, "async_reverse_geocode", reverse_geocode)
+
+    async def run():
+        hass = HomeAssistant(str(tmp_path))
+        hass.config.latitude, hass.config.longitude = 51.05, 3.72
+        assert (await googlemaps_api(hass, "good", refresh=True))[0]
+        calls.clear()
+        result = await googlemaps_api(hass, "other", refresh=refresh)
+        await hass.async_stop(force=True)
+        return result
+
+    return asyncio.run(run()), calls
+
+
+def test_validation_calls_the_api_despite_the_cache(tmp_path, monkeypatch):
+    async def revoked(key):
+        raise GeocodeError("REQUEST_DENIED")
+
+    (success, error, name), calls = _run(tmp_path, monkeypatch, True, revoked)
+    assert calls == ["other"]
+    assert not success and error == "REQUEST_DENIED"
+
+
+def test_name_lookup_uses_the_cache(tmp_path, monkeypatch):
+    async def unused(key):
+        raise AssertionError("cached location looked up again")
+
+    (success, error, name), calls = _run(tmp_path, monkeypatch, False, unused)
+    assert success and calls == []
+    assert "Ghent" in name
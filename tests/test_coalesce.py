@@ -0,0 +1,97 @@
+"""SingleFlight runs identical concurrent calls once and shares the result."""
+import asyncio
+
+import pytest
+
+from weathercanvasai.coalesce import SingleFlight
+
+
+def test_concurrent_calls_share_one_run():
+    runs = []
+
+    async def generate():
+        runs.append(1)
+        await asyncio.sleep(0.02)
+        return "image.png"
+
+    async def run():
+        flights = SingleFlight(cooldown=0)
+        results = await asyncio.gather(*[flights.async_run("scene", generate) for _ in range(3)])
+        other = await flights.async_run("other scene", generate)
+        return results, other, flights.as_dict()
+
+    results, other, stats = asyncio.run(run())
+    assert results == ["image.png"] * 3 and other == "image.png"
+    assert len(runs) == 2
+    assert (stats["executed"], stats["coalesced"], stats["in_flight"]) == (2, 2, 0)
+
+
+def test_result_is_replayed_within_the_cooldown():
+    runs = []
+
+    async def generate():
+        runs.append(1)
+        return f"image_{len(runs)}.png"
+
+    async def run():
+        flights = SingleFlight(cooldown=60)
+        first = await flights.async_run("scene", generate)
+        replayed = await flights.async_run("scene", generate)
+        # A refresh still starts a new run
+        refreshed = await flights.async_run("scene", generate, replay=False)
+        return first, replayed, refreshed, flights.replayed
+
+    assert asyncio.run(run()) == ("image_1.png", "image_1.png", "image_2.png", 1)
+
+
+def test_failures_are_not_replayed():
+    runs = []
+
+    async def generate():
+        runs.append(1)
+        return None
+
+    async def run():
+        flights = SingleFlight(cooldown=60)
+        return [await flights.async_run("scene", generate) for _ in range(2)]
+
+    assert asyncio.run(run()) == [None, None]
+    assert len(runs) == 2
+
+
+def test_errors_reach_every_caller():
+    async def generate():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("API down")
+
+    async def run():
+        flights = SingleFlight(cooldown=60)
+        results = await asyncio.gather(*[flights.async_run("scene", generate) for _ in range(2)], return_exceptions=True)
+        return results, flights.as_dict()
+
+    results, stats = asyncio.run(run())
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert stats["in_flight"] == 0
+
+
+def test_cancelled_caller_doesnt_cancel_the_others():
+    async def generate():
+        await asyncio.sleep(0.05)
+        return "image.png"
+
+    async def run():
+        flights = SingleFlight(cooldown=0)
+        first = asyncio.ensure_future(flights.async_run("scene", generate))
+        await asyncio.sleep(0)
+        second = asyncio.ensure_future(flights.async_run("scene", generate))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        result = await second
+        await asyncio.sleep(0)
+        return result, flights.as_dict()
+
+    result, stats = asyncio.run(run())
+    assert result == "image.png"
+    assert (stats["executed"], stats["in_flight"]) == (1, 0)
@@ -0,0 +1,54 @@
+"""DaySegmentTracker keeps a single boundary timer and cancels it when stopped."""
+import asyncio
+import datetime
+
+from homeassistant.core import HomeAssistant
+from homeassistant.util import dt as dt_util
+
+from weathercanvasai import day_segments
+from weathercanvasai.day_segments import DaySegmentTracker
+
+
+def _set_sun(hass, rising, setting):
+    hass.states.async_set("sun.sun", "above_horizon", {
+        "next_rising": rising.isoformat(),
+        "next_setting": setting.isoformat(),
+    })
+
+
+def test_rebuilds_leave_no_timers_after_stop(tmp_path, monkeypatch):
+    live_timers = set()
+    track_point_in_utc_time = day_segments.async_track_point_in_utc_time
+
+    def tracked(hass, action, point_in_time):
+        unsub = track_point_in_utc_time(hass, action, point_in_time)
+        token = object()
+        live_timers.add(token)
+
+        def cancel():
+            live_timers.discard(token)
+            unsub()
+
+        return cancel
+
+    monkeypatch.setattr(day_segments, "async_track_point_in_utc_time", tracked)
+
+    async def run():
+        hass = HomeAssistant(str(tmp_path))
+        now = dt_util.utcnow()
+        _set_sun(hass, now + datetime.timedelta(hours=14), now + datetime.timedelta(hours=4))
+        tracker = DaySegmentTracker(hass, "entry")
+        tracker.async_start()
+        assert len(live_timers) == 1
+
+        # Each change of the next rising/setting rebuilds the schedule
+        for minutes in range(1, 6):
+            _set_sun(hass, now + datetime.timedelta(hours=14, minutes=minutes), now + datetime.timedelta(hours=4, minutes=minutes))
+            await hass.async_block_till_done()
+            assert len(live_timers) == 1
+
+        tracker.async_stop()
+        assert not live_timers
+        await hass.async_stop(force=True)
+
+    asyncio.run(run())
@@ -0,0 +1,50 @@
+"""An encoded image that isn't smaller than its PNG is dropped for the PNG."""
+import asyncio
+import os
+
+from homeassistant.core import HomeAssistant
+
+from weathercanvasai.metrics import Metrics
+from weathercanvasai.weather_processing import _async_encode_image
+
+
+class _Encoder:
+    def __init__(self, size):
+        self.size = size
+
+    async def async_transcode(self, source_path, output_format, quality):
+        path = source_path[:-len(".png")] + ".jpg"
+        with open(path, "wb") as file:
+            file.write(b"\xff" * self.size)
+        return path, self.size
+
+
+def _encode(tmp_path, png_size, encoded_size):
+    async def run():
+        hass = HomeAssistant(str(tmp_path))
+        png_path = os.path.join(tmp_path, "dalle_1.png")
+        with open(png_path, "wb") as file:
+            file.write(b"\x89PNG" + b"\0" * (png_size - 4))
+        metrics = Metrics(hass)
+        config_data = {"output_format": "jpeg", "output_quality": 100, "metrics": metrics, "image_encoder": _Encoder(encoded_size)}
+        result = await _async_encode_image(hass, config_data, png_path, png_size)
+        await hass.async_stop(force=True)
+        return result, metrics.counters["bytes_saved"], sorted(os.listdir(tmp_path))
+
+    return asyncio.run(run())
+
+
+def test_larger_encoding_keeps_the_png(tmp_path):
+    (path, size, master), bytes_saved, files = _encode(tmp_path, 1000, 1500)
+    assert os.path.basename(path) == "dalle_1.png"
+    assert size == 1000 and master is None
+    assert bytes_saved == 0
+    assert "dalle_1.jpg" not in files
+
+
+def test_smaller_encoding_replaces_the_png(tmp_path):
+    (path, size, master), bytes_saved, files = _encode(tmp_path, 1000, 400)
+    assert os.path.basename(path) == "dalle_1.jpg"
+    assert size == 400 and master is None
+    assert bytes_saved == 600
+    assert "dalle_1.png" not in files
@@ -0,0 +1,58 @@
+"""The b64_json decoder gets the same bytes however the response is split into chunks."""
+import asyncio
+import base64
+import json
+import os
+
+import pytest
+
+from weathercanvasai.image_io import async_iter_b64_json_image
+
+IMAGE = os.urandom(3000) + b"\xfb\xff\xbf"  # base64 with '+' and '/'
+
+
+class _Stream:
+    def __init__(self, body):
+        self.body = body
+
+    async def iter_chunked(self, chunk_size):
+        for index in range(0, len(self.body), chunk_size):
+            yield self.body[index:index + chunk_size]
+
+
+def _decode(body, chunk_size):
+    async def run():
+        return b"".join([chunk async for chunk in async_iter_b64_json_image(_Stream(body), chunk_size)])
+
+    return asyncio.run(run())
+
+
+def _response(b64):
+    # The quotes of a "b64_json" in the revised prompt are escaped, it isn't the key
+    return json.dumps({"created": 1, "data": [{"revised_prompt": 'a "b64_json" lookalike', "b64_json": b64}]})
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 5, 7, 64, 4096, 1 << 20])
+def test_decodes_across_chunk_boundaries(chunk_size):
+    body = _response(base64.b64encode(IMAGE).decode()).encode()
+    assert _decode(body, chunk_size) == IMAGE
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 64])
+def test_decodes_escaped_slashes_and_line_breaks(chunk_size):
+    b64 = base64.b64encode(IMAGE).decode()
+    escaped = "\\n".join(b64[i:i + 76] for i in range(0, len(b64), 76)).replace("/", "\\/")
+    body = ('{"data": [{"b64_json" : "%s"}]}' % escaped).encode()
+    assert _decode(body, chunk_size) == IMAGE
+
+
+@pytest.mark.parametrize("body, error", [
+    (b'{"data": [{"url": "https://example.com/image.png"}]}', "No 'b64_json'"),
+    (b'{"data": [{"b64_json": "QUJD', "Truncated"),
+    (b'{"data": [{"b64_json": "QUJDRA"}]}', "Truncated"),
+    (b'{"data": [{"b64_json": "QU*DRA=="}]}', "Invalid base64"),
+    (b'{"data": [{"b64_json": 12}]}', "Malformed"),
+])
+def test_rejects_bad_responses(body, error):
+    with pytest.raises(ValueError, match=error):
+        _decode(body, 4)
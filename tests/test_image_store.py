@@ -0,0 +1,88 @@
+"""The image store reuses images for repeated scenes, and never removes the one being shown."""
+import asyncio
+import hashlib
+import os
+import time
+
+from homeassistant.core import HomeAssistant
+
+from weathercanvasai.image_store import ImageStore
+
+
+def _image(tmp_path, name, size=100):
+    """A saved image, named after its content like the generated ones."""
+    stem, extension = os.path.splitext(name)
+    path = tmp_path / "www" / f"{stem}_{hashlib.sha256(name.encode()).hexdigest()[:16]}{extension}"
+    path.parent.mkdir(exist_ok=True)
+    path.write_bytes(b"x" * size)
+    return str(path)
+
+
+def _run(tmp_path, test, **options):
+    async def run():
+        hass = HomeAssistant(str(tmp_path))
+        options.setdefault("max_age", 3600)
+        options.setdefault("variants", 1)
+        options.setdefault("max_bytes", 10_000)
+        store = ImageStore(hass, str(tmp_path / "store"), storage_key="test.image_store", **options)
+        await test(store)
+        await hass.async_stop(force=True)
+
+    asyncio.run(run())
+
+
+def test_collects_variants_then_rotates(tmp_path):
+    async def test(store):
+        assert await store.async_get("scene") is None
+        await store.async_add("scene", _image(tmp_path, "a.png"), 100)
+        assert await store.async_get("scene") is None
+        await store.async_add("scene", _image(tmp_path, "b.png"), 100)
+        first, second, third = [await store.async_get("scene") for _ in range(3)]
+        assert first != second and third == first
+        assert (store.hits, store.misses) == (3, 2)
+
+    _run(tmp_path, test, variants=2)
+
+
+def test_evicts_least_recently_used(tmp_path):
+    async def test(store):
+        await store.async_add("old", _image(tmp_path, "a.png"), 100)
+        await store.async_add("new", _image(tmp_path, "b.png"), 100)
+        old_path = await store.async_get("old")
+        await store.async_add("newest", _image(tmp_path, "c.png"), 100)
+        # "old" was used after "new"
+        assert await store.async_get("new") is None
+        assert await store.async_get("old") == old_path
+        assert store.as_dict()["bytes"] == 200
+
+    _run(tmp_path, test, max_bytes=250)
+
+
+def test_keeps_the_shown_image_when_evicted(tmp_path):
+    async def test(store):
+        await store.async_add("shown", _image(tmp_path, "a.png"), 100)
+        shown = await store.async_get("shown")
+        await store.async_add("next", _image(tmp_path, "b.png"), 100, protected=shown)
+        assert await store.async_get("shown", protected=shown) is None
+        assert os.path.isfile(shown)
+        assert store.as_dict()["pending_removal"] == 1
+
+        # Removed once another image is shown
+        last = _image(tmp_path, "c.png")
+        await store.async_add("last", last, 100, protected=last)
+        assert not os.path.isfile(shown)
+        assert store.as_dict()["pending_removal"] == 0
+
+    _run(tmp_path, test, max_bytes=150)
+
+
+def test_keeps_the_shown_image_when_expired(tmp_path):
+    async def test(store):
+        await store.async_add("shown", _image(tmp_path, "a.png"), 100)
+        shown = await store.async_get("shown")
+        store._entries["shown"]["variants"][0]["created"] = time.time() - 7200
+        assert await store.async_get("shown", protected=shown) is None
+        assert os.path.isfile(shown)
+        assert store.as_dict()["bytes"] == 100
+
+    _run(tmp_path, test)
@@ -0,0 +1,89 @@
+"""The image view serves an entry's images only, and answers repeated requests with 304."""
+import asyncio
+from http import HTTPStatus
+
+from aiohttp import web
+from aiohttp.test_utils import make_mocked_request
+from homeassistant.core import HomeAssistant
+
+from weathercanvasai.const import DOMAIN, IMAGE_CACHE_CONTROL
+from weathercanvasai.image_view import WeathercanvasaiImageView
+
+IMAGE = "dalle_image_0123456789abcdef.webp"
+ETAG = '"0123456789abcdef.webp"'
+
+
+def _get(tmp_path, paths, entry_id="entry", headers=None):
+    """Responses of the view to the paths, with a saved image in the entry's directory and others around it."""
+    www = tmp_path / "www"
+    directory = www / "weathercanvasai" / "entry"
+    (directory / "store").mkdir(parents=True, exist_ok=True)
+    (directory / IMAGE).write_bytes(b"RIFF image")
+    (directory / "store" / IMAGE).write_bytes(b"RIFF stored")
+    (directory / ".dalle_tmp.png").write_bytes(b"half written")
+    (directory / "notes.txt").write_bytes(b"not an image")
+    (www / "weathercanvasai" / "entry2").mkdir(exist_ok=True)
+    (www / "weathercanvasai" / "entry2" / "other.png").write_bytes(b"another entry")
+    (www / "secret.png").write_bytes(b"outside")
+    (tmp_path / "secrets.yaml").write_bytes(b"api_key: sk")
+
+    async def run():
+        hass = HomeAssistant(str(tmp_path))
+        hass.data[DOMAIN] = {
+            "entry": {"entry_id": "entry", "image_directory": str(directory)},
+            "http_client": object(),
+            "scheduler_sensor_entry": "entry",
+        }
+        app = web.Application()
+        app["hass"] = hass
+        view = WeathercanvasaiImageView()
+        responses = []
+        for path in paths:
+            request = make_mocked_request("GET", f"/api/weathercanvasai/images/{entry_id}/{path}", headers=headers or {}, app=app)
+            responses.append(await view.get(request, entry_id, path))
+        await hass.async_stop(force=True)
+        return responses
+
+    return asyncio.run(run())
+
+
+def test_serves_the_entry_images_with_long_lived_caching(tmp_path):
+    image, stored = _get(tmp_path, [IMAGE, f"store/{IMAGE}"])
+    assert image.status == HTTPStatus.OK and image.body == b"RIFF image"
+    assert image.content_type == "image/webp"
+    assert image.headers["ETag"] == ETAG and image.headers["Cache-Control"] == IMAGE_CACHE_CONTROL
+    assert stored.status == HTTPStatus.OK and stored.body == b"RIFF stored"
+
+
+def test_stays_in_the_entry_directory(tmp_path):
+    paths = [
+        "../../secret.png",
+        "../entry2/other.png",
+        "store/../../../secret.png",
+        f"{tmp_path}/www/secret.png",
+        "../../../secrets.yaml",
+        "notes.txt",
+        ".dalle_tmp.png",
+        "missing.png",
+    ]
+    for path, response in zip(paths, _get(tmp_path, paths)):
+        assert response.status == HTTPStatus.NOT_FOUND, path
+        assert response.body is None, path
+
+
+def test_only_entries_have_images(tmp_path):
+    for entry_id in ("entry2", "http_client", "scheduler_sensor_entry", ".."):
+        (response,) = _get(tmp_path, [IMAGE], entry_id=entry_id)
+        assert response.status == HTTPStatus.NOT_FOUND, entry_id
+
+
+def test_not_modified_for_a_known_etag(tmp_path):
+    for if_none_match in (ETAG, f"W/{ETAG}", f'"other", {ETAG}', "*"):
+        (response,) = _get(tmp_path, [IMAGE], headers={"If-None-Match": if_none_match})
+        assert response.status == HTTPStatus.NOT_MODIFIED, if_none_match
+        assert response.body is None and response.headers["ETag"] == ETAG
+
+
+def test_changed_etag_gets_the_image(tmp_path):
+    (response,) = _get(tmp_path, [IMAGE], headers={"If-None-Match": '"fedcba9876543210.webp"'})
+    assert response.status == HTTPStatus.OK and response.body == b"RIFF image"
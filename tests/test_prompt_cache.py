@@ -0,0 +1,86 @@
+"""The prompt cache shares prompts between nearly identical scenes, for a while."""
+import asyncio
+import time
+
+from homeassistant.core import HomeAssistant
+
+from weathercanvasai.prompt_cache import PromptCache, scene_fingerprint
+
+
+def _scene(condition="cloudy", temperature=12.5, cloud_coverage=70, location_name="Ghent, Belgium"):
+    return {
+        "location_name": location_name,
+        "day_segment": "dusk",
+        "season": "Autumn",
+        "weather": {"condition": condition, "temperature": temperature, "cloud_coverage": cloud_coverage},
+    }
+
+
+def _key(scene, system_instruction="Describe the scene", model="gpt-4"):
+    return scene_fingerprint(scene, system_instruction, model)
+
+
+def _run(tmp_path, test, **options):
+    async def run():
+        hass = HomeAssistant(str(tmp_path))
+        options.setdefault("ttl", 3600)
+        options.setdefault("variants", 1)
+        await test(PromptCache(hass, storage_key="test.prompt_cache", **options))
+        await hass.async_stop(force=True)
+
+    asyncio.run(run())
+
+
+def test_fingerprint_buckets_nearly_identical_weather():
+    assert _key(_scene(temperature=11.0, cloud_coverage=65)) == _key(_scene(temperature=14.9, cloud_coverage=74))
+    assert _key(_scene(location_name=" ghent, belgium ")) == _key(_scene())
+    assert _key(_scene(temperature=15.0)) != _key(_scene())
+    assert _key(_scene(condition="rainy")) != _key(_scene())
+    # Another instruction or model asks for other prompts
+    assert _key(_scene(), system_instruction="Paint it") != _key(_scene())
+    assert _key(_scene(), model="gpt-3.5-turbo") != _key(_scene())
+
+
+def test_collects_variants_then_rotates(tmp_path):
+    async def test(cache):
+        key = _key(_scene())
+        cache.async_put(key, "first")
+        assert cache.async_get(key) is None
+        cache.async_put(key, "second")
+        assert [cache.async_get(key) for _ in range(3)] == ["first", "second", "first"]
+        cache.async_put(key, "third")
+        # Only the newest variants are kept
+        assert {cache.async_get(key) for _ in range(2)} == {"second", "third"}
+
+    _run(tmp_path, test, variants=2)
+
+
+def test_variants_expire(tmp_path):
+    async def test(cache):
+        key = _key(_scene())
+        cache.async_put(key, "old")
+        cache._entries[key]["variants"][0]["created"] = time.time() - 7200
+        assert cache.async_get(key) is None
+
+    _run(tmp_path, test)
+
+
+def test_least_recently_used_keys_are_dropped(tmp_path):
+    async def test(cache):
+        cache.async_put("a", "prompt a")
+        cache.async_put("b", "prompt b")
+        assert cache.async_get("a") == "prompt a"
+        cache.async_put("c", "prompt c")
+        assert cache.async_get("b") is None
+        assert cache.async_get("a") == "prompt a" and cache.async_get("c") == "prompt c"
+
+    _run(tmp_path, test, max_entries=2)
+
+
+def test_disabled_without_ttl(tmp_path):
+    async def test(cache):
+        cache.async_put("a", "prompt a", api_seconds=1.5)
+        assert cache.async_get("a") is None
+        assert cache.as_dict()["entries"] == 0
+
+    _run(tmp_path, test, ttl=0)
@@ -0,0 +1,83 @@
+"""A streamed prompt writes the prompts sensor once; the websocket subscribers get every update."""
+import asyncio
+
+from homeassistant.const import EVENT_STATE_CHANGED
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers import restore_state
+
+from weathercanvasai import websocket_subscribe_prompt_stream
+from weathercanvasai.const import DOMAIN
+from weathercanvasai.sensor import weathercanvasaiPromptsSensor, PROMPT_STATE_STREAMING
+from weathercanvasai.weather_processing import async_publish_prompts, async_publish_streaming_prompt
+
+WORDS = ["A", "misty", "harbour", "at", "dawn"]
+
+
+class _Connection:
+    def __init__(self):
+        self.subscriptions = {}
+        self.messages = []
+
+    def send_message(self, message):
+        self.messages.append(message)
+
+    def send_result(self, msg_id, result=None):
+        self.messages.append({"id": msg_id, "type": "result", "result": result})
+
+
+async def _async_add_sensor(hass):
+    await restore_state.async_load(hass)
+    config_data = {"entry_id": "entry", "prompt_history": None}
+    hass.data[DOMAIN] = {"entry": config_data}
+    sensor = weathercanvasaiPromptsSensor(hass, "entry", "Prompts")
+    sensor.entity_id = "sensor.weathercanvasai_prompts"
+    await sensor.async_added_to_hass()
+    return config_data, sensor
+
+
+def test_stream_writes_the_sensor_once(tmp_path):
+    async def run():
+        hass = HomeAssistant(str(tmp_path))
+        config_data, sensor = await _async_add_sensor(hass)
+        connection = _Connection()
+        websocket_subscribe_prompt_stream(hass, connection, {"id": 7, "type": f"{DOMAIN}/subscribe_prompt_stream", "entry_id": "entry"})
+
+        states = []
+        hass.bus.async_listen(EVENT_STATE_CHANGED, lambda event: states.append(event.data["new_state"]))
+        for count in range(1, len(WORDS) + 1):
+            async_publish_streaming_prompt(hass, config_data, "Ghent; autumn", " ".join(WORDS[:count]))
+        async_publish_prompts(hass, config_data, {"chatgpt_in": "Ghent; autumn", "chatgpt_out": " ".join(WORDS)})
+        await hass.async_block_till_done()
+
+        assert [state.state for state in states] == [PROMPT_STATE_STREAMING, sensor.state]
+        assert states[0].attributes["chatgpt_out"] == "A"
+        assert states[1].attributes["chatgpt_out"] == "A misty harbour at dawn"
+        events = [message["event"]["chatgpt_out"] for message in connection.messages if message["type"] == "event"]
+        assert events == ["A", "A misty", "A misty harbour", "A misty harbour at", "A misty harbour at dawn"]
+
+        # Unsubscribed, no more events
+        connection.subscriptions.pop(7)()
+        async_publish_streaming_prompt(hass, config_data, "Ghent; autumn", "Another")
+        assert len(connection.messages) == len(events) + 1
+        await hass.async_stop(force=True)
+
+    asyncio.run(run())
+
+
+def test_failed_stream_restores_the_last_prompt(tmp_path):
+    async def run():
+        hass = HomeAssistant(str(tmp_path))
+        config_data, sensor = await _async_add_sensor(hass)
+        async_publish_prompts(hass, config_data, {"chatgpt_in": "Ghent; autumn", "chatgpt_out": "A quiet square"})
+        await hass.async_block_till_done()
+        before = sensor.state
+
+        async_publish_streaming_prompt(hass, config_data, "Ghent; winter", "Snow")
+        async_publish_streaming_prompt(hass, config_data, "Ghent; winter", "Snow on")
+        assert hass.states.get(sensor.entity_id).attributes["chatgpt_out"] == "Snow"
+        async_publish_streaming_prompt(hass, config_data, "Ghent; winter", None)
+        state = hass.states.get(sensor.entity_id)
+        assert state.state == before and state.attributes["chatgpt_out"] == "A quiet square"
+        await hass.async_stop(force=True)
+
+    asyncio.run(run())
@@ -0,0 +1,173 @@
+"""The request scheduler keeps calls within the rate limits and retries what's safe to retry."""
+import asyncio
+import random
+import time
+import types
+
+import aiohttp
+import pytest
+
+from weathercanvasai.scheduler import RequestScheduler, PRIORITY_BACKGROUND, PRIORITY_USER, parse_duration, retry_after
+
+
+class _Response:
+    def __init__(self, status=200, headers=None, text=""):
+        self.status = status
+        self.headers = headers or {}
+        self._text = text
+        self.released = False
+
+    async def text(self):
+        return self._text
+
+    def release(self):
+        self.released = True
+
+
+class _HttpClient:
+    """Hands out the given responses in turn, raising the exceptions among them."""
+
+    def __init__(self, *results):
+        self.results = list(results)
+        self.calls = 0
+        self.session = self
+
+    def url(self, path):
+        return f"https://api.openai.test{path}"
+
+    async def request(self, method, url, **kwargs):
+        self.calls += 1
+        result = self.results.pop(0)
+        if isinstance(result, asyncio.Event):
+            # Held until the test lets it go
+            await result.wait()
+            return _Response(200)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+
+def _connect_error():
+    connection_key = types.SimpleNamespace(host="api.openai.test", port=443, ssl=True)
+    return aiohttp.ClientConnectorError(connection_key, OSError(111, "Connection refused"))
+
+
+def _request(client, **options):
+    async def run():
+        scheduler = RequestScheduler(client, backoff_base=0.001, backoff_max=0.001, **options)
+        async with scheduler.async_request("POST", "/images/generations", "dall-e-3") as response:
+            return response.status, scheduler.stats
+
+    return asyncio.run(run())
+
+
+def test_parse_durations():
+    assert parse_duration("20ms") == 0.02
+    assert parse_duration("6m0.5s") == 360.5
+    assert parse_duration("1.5") == 1.5
+    assert parse_duration("soon") is None and parse_duration(None) is None
+    assert retry_after({"retry-after-ms": "250", "retry-after": "9"}) == 0.25
+    assert retry_after({"retry-after": "Wed, 21 Oct 2026 07:28:00 GMT"}) is None
+
+
+def test_waits_for_the_reported_rate_limit():
+    # Out of requests; two per 200 ms come back
+    limited = {"x-ratelimit-limit-requests": "2", "x-ratelimit-remaining-requests": "0", "x-ratelimit-reset-requests": "200ms"}
+    client = _HttpClient(_Response(200, limited), _Response(200))
+
+    async def run():
+        scheduler = RequestScheduler(client)
+        async with scheduler.async_request("POST", "/chat/completions", "gpt-4", account="a"):
+            pass
+        start = time.monotonic()
+        async with scheduler.async_request("POST", "/chat/completions", "gpt-4", account="a"):
+            pass
+        waited = time.monotonic() - start
+        # Another account has its own limits
+        client.results.append(_Response(200))
+        start = time.monotonic()
+        async with scheduler.async_request("POST", "/chat/completions", "gpt-4", account="b"):
+            pass
+        return waited, time.monotonic() - start, scheduler.stats
+
+    waited, other_account, stats = asyncio.run(run())
+    assert waited >= 0.08 and other_account < 0.05
+    assert stats["queued"] == 1 and stats["retries"] == 0
+
+
+def test_retries_after_the_delay_asked_for():
+    client = _HttpClient(_Response(429, {"retry-after-ms": "150"}), _Response(200))
+
+    async def run():
+        scheduler = RequestScheduler(client, backoff_base=0.001, backoff_max=0.001)
+        start = time.monotonic()
+        async with scheduler.async_request("POST", "/images/generations", "dall-e-3") as response:
+            return response.status, time.monotonic() - start, scheduler.stats
+
+    status, seconds, stats = asyncio.run(run())
+    assert status == 200 and seconds >= 0.15
+    assert stats["throttled"] == 1 and stats["retries"] == 1
+
+
+def test_exhausted_quota_is_not_retried():
+    client = _HttpClient(_Response(429, text='{"error": {"code": "insufficient_quota"}}'), _Response(200))
+    status, stats = _request(client)
+    assert status == 429 and client.calls == 1
+    assert stats["failed"] == 1
+
+
+def test_server_errors_are_retried_up_to_max_attempts():
+    client = _HttpClient(*[_Response(503) for _ in range(3)])
+    status, stats = _request(client, max_attempts=3)
+    # The last failure goes to the caller
+    assert status == 503 and client.calls == 3
+    assert stats["server_errors"] == 2 and stats["retries"] == 2 and stats["failed"] == 1
+
+
+def test_backoff_is_jittered_and_capped():
+    scheduler = RequestScheduler(_HttpClient(), backoff_base=1.0, backoff_max=8.0)
+    random.seed(1)
+    for attempt in range(1, 8):
+        delays = [scheduler._backoff(attempt) for _ in range(200)]
+        cap = min(8.0, 2 ** (attempt - 1))
+        assert all(0 <= delay <= cap for delay in delays)
+        assert max(delays) > cap * 0.8 and len(set(delays)) > 1
+
+
+def test_user_calls_go_before_background_ones():
+    release = asyncio.Event()
+    client = _HttpClient(release, _Response(200), _Response(200))
+    order = []
+
+    async def call(scheduler, name, priority):
+        async with scheduler.async_request("POST", "/images/generations", "dall-e-3", priority=priority):
+            order.append(name)
+
+    async def run():
+        scheduler = RequestScheduler(client, max_concurrency=1)
+        busy = asyncio.ensure_future(call(scheduler, "busy", PRIORITY_USER))
+        await asyncio.sleep(0.01)
+        background = asyncio.ensure_future(call(scheduler, "background", PRIORITY_BACKGROUND))
+        await asyncio.sleep(0.01)
+        user = asyncio.ensure_future(call(scheduler, "user", PRIORITY_USER))
+        await asyncio.sleep(0.01)
+        release.set()
+        await asyncio.gather(busy, background, user)
+
+    asyncio.run(run())
+    assert order == ["busy", "user", "background"]
+
+
+def test_failed_connect_is_retried():
+    client = _HttpClient(_connect_error(), _Response(200))
+    status, stats = _request(client)
+    assert status == 200 and client.calls == 2
+    assert stats["connection_errors"] == 1 and stats["retries"] == 1
+
+
+def test_lost_connection_is_not_retried():
+    client = _HttpClient(aiohttp.ServerDisconnectedError(), _Response(200))
+    with pytest.raises(aiohttp.ServerDisconnectedError):
+        _request(client)
+    # OpenAI may have the request already
+    assert client.calls == 1
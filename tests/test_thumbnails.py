@@ -0,0 +1,42 @@
+"""The thumbnail cache stays within its byte budget, "no resize needed" entries included."""
+import asyncio
+
+from homeassistant.core import HomeAssistant
+from PIL import Image
+
+from weathercanvasai.const import THUMBNAIL_ENTRY_BYTES
+from weathercanvasai.thumbnails import ThumbnailCache
+
+
+def test_small_images_dont_grow_the_cache(tmp_path):
+    async def run():
+        hass = HomeAssistant(str(tmp_path))
+        cache = ThumbnailCache(hass, max_bytes=10 * THUMBNAIL_ENTRY_BYTES)
+        for index in range(50):
+            # Already smaller than the bucket, served as is
+            path = tmp_path / f"small_{index}.png"
+            Image.new("RGB", (100, 100)).save(path)
+            assert await cache.async_get(str(path), width=320) is None
+        stats = cache.as_dict()
+        await hass.async_stop(force=True)
+        return stats
+
+    stats = asyncio.run(run())
+    assert stats["entries"] == 10
+    assert stats["bytes"] <= stats["max_bytes"]
+
+
+def test_thumbnails_keep_the_image_format(tmp_path):
+    async def run():
+        hass = HomeAssistant(str(tmp_path))
+        cache = ThumbnailCache(hass)
+        path = tmp_path / "image.webp"
+        Image.new("RGB", (1024, 1024), "navy").save(path)
+        thumbnail = await cache.async_get(str(path), width=300)
+        again = await cache.async_get(str(path), width=310)
+        await hass.async_stop(force=True)
+        return thumbnail, again, cache
+
+    thumbnail, again, cache = asyncio.run(run())
+    assert thumbnail[8:12] == b"WEBP" and again is thumbnail
+    assert (cache.hits, cache.misses) == (1, 1)
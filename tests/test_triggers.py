@@ -0,0 +1,47 @@
+"""SceneTrigger looks at a scene change that settles during a run once the run is done."""
+import asyncio
+
+from homeassistant.core import HomeAssistant
+
+from weathercanvasai import triggers
+from weathercanvasai.triggers import SceneTrigger
+
+
+def test_change_during_run_is_generated_after_it(tmp_path, monkeypatch):
+    async def run():
+        hass = HomeAssistant(str(tmp_path))
+        release = asyncio.Event()
+        scenes = []
+
+        async def generate_scene(hass, config_data, priority=None):
+            scenes.append(hass.states.get("weather.home").state)
+            await release.wait()
+
+        monkeypatch.setattr(triggers, "async_generate_scene", generate_scene)
+        hass.states.async_set("weather.home", "cloudy", {"temperature": 12, "cloud_coverage": 70})
+        trigger = SceneTrigger(
+            hass, {"entry_id": "entry", "weather_entity": "weather.home", "sun_entity": "sun.sun"}, debounce=0, min_interval=0
+        )
+        trigger.async_start()
+        await hass.async_block_till_done()
+
+        hass.states.async_set("weather.home", "rainy", {"temperature": 12, "cloud_coverage": 70})
+        for _ in range(20):
+            await asyncio.sleep(0.01)
+        assert scenes == ["rainy"]
+
+        # Settles while the first run is still going
+        hass.states.async_set("weather.home", "snowy", {"temperature": 12, "cloud_coverage": 70})
+        for _ in range(20):
+            await asyncio.sleep(0.01)
+        assert trigger.suppressed["running"] == 1
+        release.set()
+        for _ in range(20):
+            await asyncio.sleep(0.01)
+        assert scenes == ["rainy", "snowy"]
+        assert trigger.runs == 2
+
+        trigger.async_stop()
+        await hass.async_stop(force=True)
+
+    asyncio.run(run())